@@ -1,20 +1,33 @@
 """
 Authentication utilities for JWT token handling and password hashing.
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Deque, Optional, Tuple
+from uuid import UUID
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
+from collections import OrderedDict, deque
+import asyncio
+import math
 import os
+import threading
+import time
 
 from .database import get_db
 from . import models
+from .metrics import record_cache
 
-# Password hashing
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Password hashing; hashes with other parameters are upgraded on the next login
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__rounds=PASSWORD_HASH_ROUNDS
+)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -28,6 +41,64 @@ DEFAULT_USERNAME = os.getenv("DEFAULT_USERNAME", "local")
 DEFAULT_EMAIL = os.getenv("DEFAULT_EMAIL", "local@nomisma.local")
 DEFAULT_PASSWORD = os.getenv("DEFAULT_PASSWORD", "local")
 
+_USER_FIELDS = ("id", "username", "email", "hashed_password", "is_active", "token_version", "created_at", "updated_at")
+_DEFAULT_USER_KEY = object()
+
+
+class TokenUserCache:
+    """
+    Short-lived, bounded cache of users by token user id (or subject, for older
+    tokens).
+
+    Values are detached snapshots, so they can be shared between requests and
+    sessions. A snapshot's token_version and is_active act as the revocation
+    state: tokens are checked against them without touching the database, and
+    the TTL bounds how long a revocation made by another process can go
+    unnoticed.
+    """
+
+    def __init__(self):
+        self.max_entries = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+        self.ttl_seconds = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[models.User]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache("auth_user", entry is not None)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, user: models.User) -> models.User:
+        """Store a detached snapshot of the user and return it."""
+        snapshot = models.User(**{field: getattr(user, field) for field in _USER_FIELDS})
+        make_transient_to_detached(snapshot)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id) -> None:
+        """Drop every entry for a user (call after updating or deactivating it)."""
+        with self._lock:
+            for key in [key for key, (_, user) in self._entries.items() if user.id == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_user_cache = TokenUserCache()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -39,6 +110,101 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def token_claims(user: models.User) -> dict:
+    """Claims identifying a user: the id survives renames, the version allows revocation."""
+    return {"sub": user.username, "uid": str(user.id), "ver": user.token_version or 0}
+
+
+class PasswordHasher:
+    """
+    Password hashing and verification on a dedicated, bounded thread pool.
+
+    Hashing is deliberately slow; running it here keeps a burst of logins from
+    occupying the threadpool that serves every other request. When more than
+    max_pending operations are waiting, new ones are refused with 503.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+        self.max_pending = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0  # Only touched from the event loop
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Return (valid, new hash); the new hash is set when the stored one uses outdated parameters."""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def shutdown(self) -> None:
+        """Stop the pool; safe to call twice, and the next operation starts a new one."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoginThrottle:
+    """Sliding-window limit on login and registration attempts per client key (address and username)"""
+
+    def __init__(self):
+        self.max_attempts = int(os.getenv("LOGIN_MAX_ATTEMPTS", "10"))
+        self.window_seconds = float(os.getenv("LOGIN_WINDOW_SECONDS", "60"))
+        self.max_clients = int(os.getenv("LOGIN_THROTTLE_MAX_CLIENTS", "10000"))
+        self._attempts: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, client: str) -> Optional[float]:
+        """Record an attempt; returns seconds to wait if the client is over the limit."""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.get(client)
+            if attempts is None:
+                attempts = self._attempts[client] = deque()
+                while len(self._attempts) > self.max_clients:
+                    self._attempts.popitem(last=False)
+            self._attempts.move_to_end(client)
+            while attempts and attempts[0] <= now - self.window_seconds:
+                attempts.popleft()
+            if len(attempts) >= self.max_attempts:
+                return attempts[0] + self.window_seconds - now
+            attempts.append(now)
+            return None
+
+    def reset(self, client: str) -> None:
+        with self._lock:
+            self._attempts.pop(client, None)
+
+    def check(self, client: str) -> None:
+        """Raise 429 when the client is over the limit."""
+        retry_after = self.hit(client)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -62,14 +228,36 @@ def _get_user_from_token(token: str, db: Session) -> models.User:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        user_id = UUID(payload["uid"]) if payload.get("uid") else None
+        if username is None and user_id is None:
             raise credentials_exception
-    except JWTError:
+    except (JWTError, ValueError):
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
-        raise credentials_exception
+    if user_id is not None:
+        # Stable id claim: one primary-key lookup at most, none while cached
+        user = token_user_cache.get(user_id)
+        if user is None:
+            user = db.get(models.User, user_id)
+            if user is None:
+                raise credentials_exception
+            user = token_user_cache.set(user_id, user)
+    else:
+        # Tokens issued before the id claim existed
+        user = token_user_cache.get(username)
+        if user is None:
+            user = db.query(models.User).filter(models.User.username == username).first()
+            if user is None:
+                raise credentials_exception
+            user = token_user_cache.set(username, user)
+
+    # Tokens without a version claim are version 0, so logout-all revokes them too
+    if payload.get("ver", 0) != (user.token_version or 0):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
     if not user.is_active:
         raise HTTPException(
@@ -109,6 +297,14 @@ def _get_or_create_default_user(db: Session) -> models.User:
     return user
 
 
+def _get_default_user(db: Session) -> models.User:
+    """The local default user, memoized as a detached snapshot."""
+    user = token_user_cache.get(_DEFAULT_USER_KEY)
+    if user is None:
+        user = token_user_cache.set(_DEFAULT_USER_KEY, _get_or_create_default_user(db))
+    return user
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
@@ -116,8 +312,9 @@ def get_current_user(
     """
     Dependency to get the current authenticated user from JWT token.
     Raises HTTPException if token is invalid or user not found.
+    The user is attached to the request session, so it can be modified.
     """
-    return _get_user_from_token(token, db)
+    return db.merge(_get_user_from_token(token, db), load=False)
 
 
 def get_request_user(
@@ -126,11 +323,12 @@ def get_request_user(
 ) -> models.User:
     """
     Dependency to get the current user if authenticated, or a local default user.
+    Returns a cached, detached user; only read its attributes.
     """
     if token:
         return _get_user_from_token(token, db)
 
-    return _get_or_create_default_user(db)
+    return _get_default_user(db)
 
 
 def get_current_active_user(
@@ -0,0 +1,187 @@
+"""
+Per-user cache for computed responses.
+
+Entries are stored under version counters instead of being deleted one by one:
+
+- a user version, bumped by ``invalidate(user)``, covers everything cached for
+  the user;
+- a coin version, bumped by ``invalidate(user, coin_id)``, covers responses
+  about that coin (e.g. ``GET /api/coins/{id}``);
+- a collection version, bumped by every coin invalidation, covers responses
+  computed over the whole collection (e.g. analytics).
+
+Bumping a counter makes the older entries unreachable at once; they then age
+out of the LRU (or expire in the backend). Values must be JSON-serializable so
+that any backend can hold them.
+
+The default backend is an in-process LRU. ``RESPONSE_CACHE_BACKEND=redis``
+shares entries and counters between worker processes (requires the optional
+``redis`` package).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import record_cache
+
+try:
+    import redis
+except ImportError:  # Optional dependency
+    redis = None
+
+COLLECTION = "*"
+
+
+class MemoryBackend:
+    """Bounded in-process LRU with TTL"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counters(self, *keys: str) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._counters.get(key, 0) for key in keys)
+
+    def incr(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Entries and counters in Redis, shared by every worker"""
+
+    def __init__(self, url: str, prefix: str = "nomisma:cache:"):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self.client.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, int(ttl_seconds)))
+
+    def counters(self, *keys: str) -> Tuple[int, ...]:
+        values = self.client.mget([self.prefix + key for key in keys])
+        return tuple(int(value or 0) for value in values)
+
+    def incr(self, *keys: str) -> None:
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.incr(self.prefix + key)
+        pipe.execute()
+
+    def close(self) -> None:
+        # Shared entries stay in Redis; only this process's connections go
+        self.client.close()
+
+
+def create_backend(max_entries: int):
+    name = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+    if name == "redis":
+        if redis is None:
+            print("Response cache: redis package not installed, using the in-process cache")
+        else:
+            try:
+                return RedisBackend(os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+            except Exception as e:
+                print(f"Response cache: Redis unavailable, using the in-process cache: {str(e)}")
+    return MemoryBackend(max_entries)
+
+
+class UserCache:
+    """Versioned response cache keyed by (user, coin or collection, key)"""
+
+    def __init__(self, backend=None):
+        self.max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+        self.ttl_seconds = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+        self.backend = backend or create_backend(self.max_entries)
+
+    def entry_key(self, user_id: Any, key: str, coin_id: Any = None) -> str:
+        """Key of an entry under the current versions.
+
+        Take the key before reading from the database and store under it, so a
+        write that lands in between leaves the stored value unreachable.
+        """
+        user = str(user_id)
+        scope = str(coin_id) if coin_id is not None else COLLECTION
+        versions = self.backend.counters(f"v:{user}", f"v:{user}:{scope}")
+        return f"e:{user}:{versions[0]}:{scope}:{versions[1]}:{key}"
+
+    def lookup(self, user_id: Any, key: str, coin_id: Any = None) -> Tuple[Optional[str], Optional[Any]]:
+        """Return (entry key, cached value or None)."""
+        try:
+            entry_key = self.entry_key(user_id, key, coin_id)
+            value = self.backend.get(entry_key)
+            record_cache("response", value is not None)
+            return entry_key, value
+        except Exception as e:
+            print(f"Response cache read error: {str(e)}")
+            return None, None
+
+    def store(self, entry_key: Optional[str], value: Any) -> None:
+        if entry_key is None:
+            return
+        try:
+            self.backend.set(entry_key, value, self.ttl_seconds)
+        except Exception as e:
+            print(f"Response cache write error: {str(e)}")
+
+    def invalidate(self, user_id: Any, coin_id: Any = None) -> None:
+        """Drop cached responses after a write.
+
+        With a coin id, only that coin's entries and collection-wide entries are
+        dropped; without one, everything cached for the user is.
+        """
+        user = str(user_id)
+        keys = (f"v:{user}:{coin_id}", f"v:{user}:{COLLECTION}") if coin_id is not None else (f"v:{user}",)
+        try:
+            self.backend.incr(*keys)
+        except Exception as e:
+            print(f"Response cache invalidation error: {str(e)}")
+
+    def close(self) -> None:
+        """Flush the in-process cache or disconnect from Redis."""
+        try:
+            self.backend.close()
+        except Exception as e:
+            print(f"Response cache close error: {str(e)}")
+
+
+# Global instance
+user_cache = UserCache()
@@ -0,0 +1,66 @@
+"""
+Command-line tools.
+
+    python -m app.cli import-coins inventory.csv [--user USERNAME] [--idempotency-key KEY]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import models
+from .auth import _get_or_create_default_user
+from .database import SessionLocal
+from .services.coin_import import FORMATS, coin_importer
+
+
+def import_coins(args: argparse.Namespace) -> int:
+    import_format = (args.format or os.path.splitext(args.file)[1]).lower().lstrip(".")
+    if import_format not in FORMATS:
+        print("Import must be a .csv or .jsonl file (or pass --format)", file=sys.stderr)
+        return 2
+
+    db = SessionLocal()
+    try:
+        if args.user:
+            user = db.query(models.User).filter(models.User.username == args.user).first()
+            if user is None:
+                print(f"User not found: {args.user}", file=sys.stderr)
+                return 2
+        else:
+            user = _get_or_create_default_user(db)
+
+        started = time.perf_counter()
+        with open(args.file, "rb") as stream:
+            report = coin_importer.import_file(db, user.id, stream, import_format, args.idempotency_key)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed) if elapsed > 0 else None
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import-coins", help="Bulk import coins from CSV or JSON Lines")
+    importer.add_argument("file")
+    importer.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    importer.add_argument("--user", help="Username to import for (default: the local default user)")
+    importer.add_argument("--idempotency-key", help="Re-running with the same key skips rows already imported")
+    importer.add_argument("--batch-size", type=int, help="Rows per transaction")
+    importer.set_defaults(handler=import_coins)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "batch_size", None):
+        coin_importer.batch_size = args.batch_size
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Service lifecycle for the application lifespan.
+
+Services are still built on first use (``services.lazy``); the container
+builds the ones every worker needs before the worker accepts traffic, so the
+first requests do not pay for client construction, TLS handshakes, model
+discovery or opening the camera. Warm-up steps run in parallel, each bounded by
+``WARMUP_TIMEOUT_SECONDS``; a failed step is logged and the service falls back
+to building on first use.
+
+On shutdown the container closes what the services hold open: HTTP pools,
+the eBay call pool, the camera, the password hashing pool, caches and the
+database pool. Both halves are idempotent and the container can be started
+again afterwards, as happens when tests run the lifespan more than once.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import text
+
+from .auth import password_hasher, token_user_cache
+from .cache import user_cache
+from .database import engine
+
+
+def _camera_index(value: str):
+    return int(value) if value.isdigit() else value
+
+
+class ServiceContainer:
+    """Builds and warms services at startup and releases them at shutdown"""
+
+    def __init__(self):
+        self.enabled = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+        self.db_connections = int(os.getenv("WARMUP_DB_CONNECTIONS", "2"))
+        self.timeout = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10"))
+        # Camera opened at startup by the primary worker, e.g. 0 or /dev/video2
+        self.preopen_camera = os.getenv("MICROSCOPE_PREOPEN_CAMERA", "").strip()
+        self.features: Dict[str, bool] = {}
+        self.primary = False
+        # Last warm-up: step -> {"ok", "seconds", "detail" or "error"}
+        self.warmup: Dict[str, Dict[str, Any]] = {}
+
+    def _steps(self) -> List[Tuple[str, Callable[[], Any]]]:
+        steps = [("gemini", self._warm_vision)]
+        if self.db_connections > 0:
+            steps.append(("database", self._warm_database))
+        if self.features.get("ebay"):
+            steps.append(("ebay", self._warm_ebay))
+        if self.features.get("microscope") and self.primary and self.preopen_camera:
+            steps.append(("camera", self._warm_camera))
+        return steps
+
+    def _warm_database(self) -> int:
+        # Held together so the pool keeps that many connections afterwards
+        connections = []
+        try:
+            for _ in range(self.db_connections):
+                connection = engine.connect()
+                connections.append(connection)
+                connection.execute(text("SELECT 1"))
+        finally:
+            for connection in connections:
+                connection.close()
+        return len(connections)
+
+    def _warm_vision(self):
+        from .services.vision_ai import vision_ai_service
+        return vision_ai_service.warm_up()
+
+    def _warm_ebay(self) -> bool:
+        from .services.ebay_service import ebay_service
+        return ebay_service.resolve().pool is not None
+
+    def _warm_camera(self) -> bool:
+        from .services.microscope import microscope_service
+        if not microscope_service.open_camera(_camera_index(self.preopen_camera)):
+            raise RuntimeError(f"could not open camera {self.preopen_camera}")
+        return True
+
+    async def _run_step(self, name: str, func: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(asyncio.to_thread(func), self.timeout)
+            result = {"ok": True, "detail": detail}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timed out after {self.timeout:.0f}s"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        if not result["ok"]:
+            print(f"Warm-up {name} error: {result['error']}")
+        self.warmup[name] = result
+
+    async def start(self, features: Dict[str, bool], primary: bool) -> Dict[str, Dict[str, Any]]:
+        """Build and warm services in parallel; returns the per-step report."""
+        self.features = dict(features)
+        self.primary = primary
+        self.warmup = {}
+        if self.enabled:
+            await asyncio.gather(*(self._run_step(name, func) for name, func in self._steps()))
+        return self.warmup
+
+    async def stop(self) -> None:
+        """Release pooled clients, devices and caches."""
+        password_hasher.shutdown()
+        await asyncio.to_thread(self._close)
+
+    def _close(self) -> None:
+        from .services.vision_ai import vision_ai_service
+        if vision_ai_service.is_built:
+            vision_ai_service.close()
+            vision_ai_service.reset()
+        if self.features.get("ebay"):
+            from .services.ebay_service import ebay_service
+            if ebay_service.is_built:
+                ebay_service.shutdown()
+                ebay_service.reset()
+        if self.features.get("microscope"):
+            from .services.microscope import microscope_service
+            # Release the device so a restarted primary can open it
+            if microscope_service.is_built:
+                microscope_service.close_camera()
+        token_user_cache.clear()
+        user_cache.close()
+        engine.dispose()
+
+
+# Global instance
+service_container = ServiceContainer()
@@ -1,16 +1,96 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 
-from .routes import coins, microscope, ai, ebay, auth
+from . import metrics, profiling
+from .database import engine
+from .lifecycle import service_container
+from .routes import coins, ai, auth, admin
+from .services.captures import capture_store
+from .services.revaluation import revaluation_service
+from .workers import worker_role
+
+# Optional feature areas. A disabled one's router is not mounted and its
+# services (OpenCV, ebaysdk, ...) are never imported.
+features = {
+    name: os.getenv(f"FEATURE_{name.upper()}", "true").lower() == "true"
+    for name in ("microscope", "ebay", "comparables")
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # With several workers one primary runs the background jobs and owns the camera
+    background = []
+    primary = worker_role.acquire()
+    if primary and features["microscope"]:
+        # Background janitor for abandoned microscope captures
+        background.append(asyncio.create_task(capture_store.run_janitor()))
+        # Other workers reach the microscope through this process
+        try:
+            await worker_role.start_camera_host()
+        except Exception as e:
+            print(f"Could not start camera host: {str(e)}")
+    if primary and features["ebay"]:
+        from .services.ebay_sync import ebay_status_sync
+        # Incremental eBay listing status sync (no-op without eBay credentials)
+        background.append(asyncio.create_task(ebay_status_sync.run()))
+    if primary and features["comparables"]:
+        from .services.comparables import comparables_service
+        # Daily comparable-sales ingestion and rolling-window refresh
+        background.append(asyncio.create_task(comparables_service.run()))
+    # Event loop lag sampling for /metrics
+    if metrics_enabled:
+        background.append(asyncio.create_task(metrics.loop_lag_monitor.run()))
+        # Other workers' /metrics include this worker's values through its snapshots
+        if metrics.multiprocess.enabled:
+            background.append(asyncio.create_task(metrics.multiprocess.run()))
+    # Build and warm clients before taking traffic
+    await service_container.start(features, primary)
+    # Pick up revaluation jobs interrupted by a restart
+    if primary:
+        try:
+            revaluation_service.resume_interrupted()
+        except Exception as e:
+            print(f"Could not resume revaluation jobs: {str(e)}")
+    try:
+        yield
+    finally:
+        await revaluation_service.drain()
+        for task in background:
+            task.cancel()
+        if primary and features["microscope"]:
+            await worker_role.stop_camera_host()
+        await service_container.stop()
+        if metrics_enabled and metrics.multiprocess.enabled:
+            # Final counts, so totals keep them after this worker exits
+            metrics.multiprocess.write()
+        worker_role.release()
+
 
 app = FastAPI(
     title="Nomisma API",
     description="Coin analysis and cataloging system with AI-powered valuation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Request metrics and tracing (GET /metrics, optional OTLP export)
+metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+if metrics_enabled:
+    metrics.instrument_engine(engine)
+    metrics.configure_tracing()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Opt-in request profiling (X-Profile header or PROFILING_SAMPLE_RATE)
+if profiling.request_profiler.enabled:
+    profiling.instrument_engine(engine)
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 # CORS configuration
 frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
 app.add_middleware(
@@ -29,9 +109,17 @@ app.mount("/images", StaticFiles(directory=images_path), name="images")
 # Include routers
 app.include_router(auth.router)  # Auth routes (no prefix, already has /api/auth)
 app.include_router(coins.router, prefix="/api/coins", tags=["Coins"])
-app.include_router(microscope.router, prefix="/api/microscope", tags=["Microscope"])
+if features["microscope"]:
+    from .routes import microscope
+    app.include_router(microscope.router, prefix="/api/microscope", tags=["Microscope"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI Analysis"])
-app.include_router(ebay.router, prefix="/api/ebay", tags=["eBay"])
+if features["ebay"]:
+    from .routes import ebay
+    app.include_router(ebay.router, prefix="/api/ebay", tags=["eBay"])
+if features["comparables"]:
+    from .routes import comparables
+    app.include_router(comparables.router, prefix="/api/comparables", tags=["Comparables"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 @app.get("/")
 async def root():
@@ -44,3 +132,14 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not metrics_enabled:
+        return PlainTextResponse("Metrics are disabled\n", status_code=404)
+    if metrics.multiprocess.enabled:
+        # Summed over all server workers
+        body = await asyncio.to_thread(metrics.multiprocess.render)
+    else:
+        body = metrics.registry.render()
+    return PlainTextResponse(body, media_type=metrics.CONTENT_TYPE)
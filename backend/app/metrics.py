@@ -0,0 +1,597 @@
+"""
+Prometheus metrics and request tracing.
+
+The registry is self-contained and renders the Prometheus text exposition
+format at ``GET /metrics``, so no client library is needed. What is recorded:
+
+- HTTP requests by route template: count, latency histogram, in-flight gauge;
+- database queries per request and time spent in them;
+- external calls (Gemini, eBay) by operation and model: latency and errors;
+- camera frame-read latency and the frame rate actually achieved;
+- cache lookups by cache and result, with a derived hit ratio;
+- event loop lag: how late a periodic timer fires, i.e. how long the loop was
+  blocked by synchronous work.
+
+With several server workers each process has its own registry. When
+``WEB_CONCURRENCY`` is above 1 (or ``METRICS_MULTIPROC_DIR`` is set) every
+worker writes a snapshot to a shared directory every few seconds, and
+``/metrics`` merges them. Counters and histograms are summed over all
+workers, including ones that have exited, so they never go backwards; gauges
+are summed over the live workers only.
+
+Tracing uses the OpenTelemetry API: every request, and every external call
+made inside it, gets a span. Spans are only exported when
+``OTEL_EXPORTER_OTLP_ENDPOINT`` is set and the OpenTelemetry SDK and OTLP
+exporter packages are installed; otherwise the API's no-op tracer is used.
+"""
+import asyncio
+import contextvars
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace
+except ImportError:  # Optional dependency
+    trace = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25, 0.5, 1.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def items(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return dict(self._values)
+
+    def _values_from(self, merged: Optional[Dict[str, Dict[Tuple[str, ...], Any]]]) -> Dict[Tuple[str, ...], Any]:
+        return self.items() if merged is None else merged.get(self.name, {})
+
+    def samples(self, merged: Optional[Dict[str, Dict[Tuple[str, ...], Any]]] = None) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self, merged: Optional[Dict[str, Dict[Tuple[str, ...], Any]]] = None) -> List[str]:
+        """Text exposition of this process's values, or of ``merged`` (values by metric name)."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples(merged))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self, merged=None) -> List[Tuple[str, str, float]]:
+        items = sorted(self._values_from(merged).items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class FunctionGauge(_Metric):
+    """Gauge whose samples are computed at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], function: Callable[..., Dict[Tuple[str, ...], float]], source: Optional[_Metric] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        # With a source metric the function derives its samples from that metric's values
+        self.source = source
+
+    def samples(self, merged=None) -> List[Tuple[str, str, float]]:
+        values = self.function() if self.source is None else self.function(self.source._values_from(merged))
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[1] if entry else 0
+
+    def items(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return {key: [[*counts], count, total] for key, (counts, count, total) in self._values.items()}
+
+    def samples(self, merged=None) -> List[Tuple[str, str, float]]:
+        items = sorted(self._values_from(merged).items())
+        samples = []
+        for key, (counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"'), cumulative))
+            samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, 'le="+Inf"'), count))
+            samples.append((f"{self.name}_sum", _format_labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.labelnames, key), count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def gauge_function(self, name: str, documentation: str, labelnames: Sequence[str], function: Callable[..., Dict[Tuple[str, ...], float]], source: Optional[_Metric] = None) -> FunctionGauge:
+        return self._register(FunctionGauge(name, documentation, labelnames, function, source))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Recorded values in a JSON-serializable form (computed gauges are left out)."""
+        return {
+            metric.name: {"kind": metric.kind, "values": [[list(key), value] for key, value in metric.items().items()]}
+            for metric in self.metrics() if not isinstance(metric, FunctionGauge)
+        }
+
+    def render(self, merged: Optional[Dict[str, Dict[Tuple[str, ...], Any]]] = None) -> str:
+        lines: List[str] = []
+        for metric in self.metrics():
+            lines.extend(metric.render(merged))
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add(total: Any, value: Any) -> Any:
+    if total is None:
+        return value
+    if isinstance(value, list):  # Histogram entry: [bucket counts, count, sum]
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+    return total + value
+
+
+def multiprocess_dir() -> Optional[str]:
+    """Shared snapshot directory, or None for a single worker."""
+    directory = os.getenv("METRICS_MULTIPROC_DIR")
+    if directory:
+        return directory
+    if int(os.getenv("WEB_CONCURRENCY") or 1) > 1:
+        # Keyed by the server process, like the primary-worker lock
+        return os.path.join(tempfile.gettempdir(), f"nomisma-{os.getppid()}-metrics")
+    return None
+
+
+class MultiprocessMetrics:
+    """Shares a registry between server workers through snapshot files"""
+
+    def __init__(self, registry: MetricsRegistry, directory: Optional[str]):
+        self.registry = registry
+        self.directory = directory
+        self.interval = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def write(self) -> None:
+        """Write this process's snapshot."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(self.registry.snapshot(), handle)
+        os.replace(tmp_path, path)
+
+    def merged(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """Values by metric name, summed over the workers' snapshots."""
+        merged: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as handle:
+                    snapshot = json.load(handle)
+                pid = int(os.path.basename(path)[:-len(".json")])
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(pid)
+            for name, metric in snapshot.items():
+                # A gauge is current state: an exited worker no longer has any
+                if metric["kind"] == "gauge" and not alive:
+                    continue
+                values = merged.setdefault(name, {})
+                for key, value in metric["values"]:
+                    key = tuple(key)
+                    values[key] = _add(values.get(key), value)
+        return merged
+
+    def render(self) -> str:
+        self.write()
+        return self.registry.render(self.merged())
+
+    async def run(self) -> None:
+        """Write snapshots periodically until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.write)
+            except OSError as e:
+                print(f"Metrics snapshot error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+# Global instance
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "nomisma_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "nomisma_http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+http_in_flight = registry.gauge(
+    "nomisma_http_requests_in_flight", "HTTP requests being served", ("method",)
+)
+db_queries = registry.counter(
+    "nomisma_db_queries_total", "Database statements executed"
+)
+db_query_duration = registry.histogram(
+    "nomisma_db_query_duration_seconds", "Database statement latency"
+)
+db_queries_per_request = registry.histogram(
+    "nomisma_db_queries_per_request", "Database statements executed per HTTP request", ("route",), QUERY_COUNT_BUCKETS
+)
+db_time_per_request = registry.histogram(
+    "nomisma_db_time_per_request_seconds", "Time spent in database statements per HTTP request", ("route",)
+)
+external_call_duration = registry.histogram(
+    "nomisma_external_call_duration_seconds", "Latency of calls to external services", ("service", "operation", "model")
+)
+external_call_errors = registry.counter(
+    "nomisma_external_call_errors_total", "Failed calls to external services", ("service", "operation", "model", "error")
+)
+camera_frame_read = registry.histogram(
+    "nomisma_camera_frame_read_seconds", "Latency of reading one frame from the camera", ("mode",), FRAME_BUCKETS
+)
+camera_frames = registry.counter(
+    "nomisma_camera_frames_total", "Frames read from the camera", ("mode", "result")
+)
+camera_fps = registry.gauge(
+    "nomisma_camera_fps", "Smoothed rate of frames read from the camera"
+)
+event_loop_lag = registry.histogram(
+    "nomisma_event_loop_lag_seconds", "Delay of a periodic event loop timer beyond its due time", (), LAG_BUCKETS
+)
+cache_requests = registry.counter(
+    "nomisma_cache_requests_total", "Cache lookups by cache and result", ("cache", "result")
+)
+
+
+def _cache_hit_ratios(requests: Dict[Tuple[str, ...], float]) -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in requests.items():
+        entry = totals.setdefault(cache, [0.0, 0.0])
+        entry[1] += value
+        if result == "hit":
+            entry[0] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+registry.gauge_function(
+    "nomisma_cache_hit_ratio", "Share of cache lookups that were hits since startup", ("cache",), _cache_hit_ratios, cache_requests
+)
+
+
+multiprocess = MultiprocessMetrics(registry, multiprocess_dir())
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class FrameRateMeter:
+    """Exponentially smoothed rate of successful camera reads"""
+
+    def __init__(self, smoothing: float = 0.1, idle_seconds: float = 5.0):
+        self.smoothing = smoothing
+        self.idle_seconds = idle_seconds
+        self._last: Optional[float] = None
+        self._fps = 0.0
+        self._lock = threading.Lock()
+
+    def tick(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last is not None:
+                interval = now - self._last
+                # A gap longer than idle_seconds is a new session, not a slow frame
+                if 0 < interval < self.idle_seconds:
+                    rate = 1.0 / interval
+                    self._fps = rate if self._fps == 0 else self._fps + self.smoothing * (rate - self._fps)
+            self._last = now
+            return self._fps
+
+
+_frame_rate = FrameRateMeter()
+
+
+def record_frame(mode: str, seconds: float, success: bool) -> None:
+    """Record one camera read (mode is "decoded" or "passthrough")."""
+    camera_frame_read.observe(seconds, mode=mode)
+    camera_frames.inc(mode=mode, result="ok" if success else "failed")
+    if success:
+        camera_fps.set(_frame_rate.tick())
+
+
+class LoopLagMonitor:
+    """Measures event loop lag with a timer that should fire every `interval` seconds"""
+
+    def __init__(self):
+        self.interval = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_MS", "100")) / 1000
+        self._recent: List[float] = []
+        self._lock = threading.Lock()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            event_loop_lag.observe(lag)
+            with self._lock:
+                self._recent.append(lag)
+                # Keep roughly the last ten minutes between drains
+                if len(self._recent) > 6000:
+                    del self._recent[:1000]
+
+    def drain(self) -> Dict[str, Any]:
+        """Lag statistics (milliseconds) since the previous drain."""
+        with self._lock:
+            values, self._recent = sorted(self._recent), []
+        if not values:
+            return {"samples": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+
+        def at(fraction: float) -> float:
+            return round(values[max(0, math.ceil(fraction * len(values)) - 1)] * 1000, 2)
+
+        return {"samples": len(values), "p50_ms": at(0.5), "p99_ms": at(0.99), "max_ms": round(values[-1] * 1000, 2)}
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+# Per-request database statistics: [statements, seconds]. The list is shared
+# with threads the request hands work to (contextvars are copied, the list is not).
+_request_db_stats: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("request_db_stats", default=None)
+
+
+def instrument_engine(engine) -> None:
+    """Count and time every statement executed on a SQLAlchemy engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries.inc()
+        db_query_duration.observe(elapsed)
+        stats = _request_db_stats.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+@contextmanager
+def track_db() -> Iterator[List[float]]:
+    """Collect [statement count, seconds] for the statements run inside the block."""
+    stats = [0, 0.0]
+    token = _request_db_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_db_stats.reset(token)
+
+
+def _tracer():
+    return trace.get_tracer("nomisma") if trace is not None else None
+
+
+@contextmanager
+def _span(name: str, kind: str = "INTERNAL", attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    tracer = _tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(
+        name,
+        kind=getattr(trace.SpanKind, kind),
+        attributes={key: value for key, value in (attributes or {}).items() if value is not None},
+        record_exception=True,
+        set_status_on_exception=True,
+    ) as span:
+        yield span
+
+
+@contextmanager
+def observe_call(service: str, operation: str, model: Optional[str] = None) -> Iterator[Any]:
+    """Time a call to an external service, count its failures and trace it."""
+    model_label = model or ""
+    started = time.perf_counter()
+    with _span(f"{service} {operation}", "CLIENT", {"peer.service": service, "nomisma.operation": operation, "nomisma.model": model}) as span:
+        try:
+            yield span
+        except BaseException as e:
+            external_call_errors.inc(service=service, operation=operation, model=model_label, error=type(e).__name__)
+            raise
+        finally:
+            external_call_duration.observe(time.perf_counter() - started, service=service, operation=operation, model=model_label)
+
+
+def configure_tracing() -> bool:
+    """Export spans over OTLP/HTTP when OTEL_EXPORTER_OTLP_ENDPOINT is set; returns whether it is on."""
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not endpoint or trace is None:
+        return False
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("Tracing: install opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http to export spans")
+        return False
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "nomisma-backend")}))
+    # The exporter reads OTEL_EXPORTER_OTLP_ENDPOINT and related settings itself
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    route = scope.get("route")
+    # Unmatched paths are grouped so that scanners cannot blow up label cardinality
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request metrics, per-request DB usage and a server span"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method=method)
+        started = time.perf_counter()
+        with _span(f"{method} {scope['path']}", "SERVER", {"http.request.method": method, "url.path": scope["path"]}) as span, track_db() as db_stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - started
+                route = _route_template(scope)
+                http_in_flight.dec(method=method)
+                http_requests.inc(method=method, route=route, status=status["code"])
+                http_request_duration.observe(elapsed, method=method, route=route)
+                db_queries_per_request.observe(db_stats[0], route=route)
+                db_time_per_request.observe(db_stats[1], route=route)
+                if span is not None:
+                    span.update_name(f"{method} {route}")
+                    span.set_attribute("http.route", route)
+                    span.set_attribute("http.response.status_code", status["code"])
+                    span.set_attribute("db.statement_count", db_stats[0])
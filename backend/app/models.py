@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Numeric, Boolean, DateTime, Text, ForeignKey, JSON, text
+from sqlalchemy import Column, String, Integer, Numeric, Boolean, DateTime, Text, ForeignKey, JSON, text, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,6 +15,8 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False, index=True)
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
+    # Bumped to revoke every token issued so far
+    token_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -24,6 +26,9 @@ class User(Base):
 
 class Coin(Base):
     __tablename__ = "coins"
+    __table_args__ = (
+        UniqueConstraint("user_id", "import_key", name="uq_coins_user_import_key"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -67,11 +72,30 @@ class Coin(Base):
     is_for_sale = Column(Boolean, default=False)
     location = Column(String(200))
     
+    # Row identity from a bulk import; re-importing the same row is a no-op
+    import_key = Column(String(100))
+    
+    # Newest analysis and valuation, maintained by database triggers
+    latest_analysis_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("ai_analyses.id", ondelete="SET NULL", use_alter=True, name="fk_coins_latest_analysis")
+    )
+    latest_valuation_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("valuations.id", ondelete="SET NULL", use_alter=True, name="fk_coins_latest_valuation")
+    )
+    
     # Relationships
     user = relationship("User", back_populates="coins")
     images = relationship("CoinImage", back_populates="coin", cascade="all, delete-orphan")
-    analyses = relationship("AIAnalysis", back_populates="coin", cascade="all, delete-orphan")
-    valuations = relationship("Valuation", back_populates="coin", cascade="all, delete-orphan")
+    analyses = relationship(
+        "AIAnalysis", back_populates="coin", cascade="all, delete-orphan", foreign_keys="AIAnalysis.coin_id"
+    )
+    valuations = relationship(
+        "Valuation", back_populates="coin", cascade="all, delete-orphan", foreign_keys="Valuation.coin_id"
+    )
+    latest_analysis = relationship("AIAnalysis", foreign_keys=[latest_analysis_id], viewonly=True)
+    latest_valuation = relationship("Valuation", foreign_keys=[latest_valuation_id], viewonly=True)
     ebay_listings = relationship("EbayListing", back_populates="coin", cascade="all, delete-orphan")
 
 
@@ -129,7 +153,7 @@ class AIAnalysis(Base):
     model_version = Column(String(50))
     
     # Relationship
-    coin = relationship("Coin", back_populates="analyses")
+    coin = relationship("Coin", back_populates="analyses", foreign_keys=[coin_id])
 
 
 class Valuation(Base):
@@ -159,7 +183,7 @@ class Valuation(Base):
     confidence_level = Column(String(50))
     
     # Relationship
-    coin = relationship("Coin", back_populates="valuations")
+    coin = relationship("Coin", back_populates="valuations", foreign_keys=[coin_id])
 
 
 class EbayListing(Base):
@@ -180,6 +204,8 @@ class EbayListing(Base):
     status = Column(String(50))  # 'draft', 'active', 'sold', 'ended', 'cancelled'
     listed_at = Column(DateTime)
     ended_at = Column(DateTime)
+    current_price = Column(Numeric(10, 2))
+    last_synced_at = Column(DateTime)  # last time status was confirmed with eBay
     
     # Sale information
     sold_price = Column(Numeric(10, 2))
@@ -191,3 +217,95 @@ class EbayListing(Base):
     
     # Relationship
     coin = relationship("Coin", back_populates="ebay_listings")
+
+
+class ComparableSale(Base):
+    __tablename__ = "comparable_sales"
+    __table_args__ = (
+        UniqueConstraint("source", "source_ref", name="uq_comparable_sales_source_ref"),
+        Index("idx_comparable_sales_key", "country_key", "denomination_key", "year", "mint_key", "sold_at"),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Provenance: 'ebay' for our own sold listings, 'feed:<name>' for imports
+    source = Column(String(100), nullable=False)
+    source_ref = Column(String(255), nullable=False)
+    title = Column(String(255))
+    
+    # Coin as described by the source
+    country = Column(String(100))
+    denomination = Column(String(100))
+    mint_mark = Column(String(20))
+    grade = Column(String(50))
+    
+    # Normalized comparison key
+    country_key = Column(String(100), nullable=False)
+    denomination_key = Column(String(100), nullable=False)
+    year = Column(Integer, nullable=False)
+    mint_key = Column(String(20), nullable=False, default="")
+    grade_numeric = Column(Integer)  # Sheldon scale, 1-70
+    grade_bucket = Column(Integer)
+    
+    # Sale
+    price = Column(Numeric(10, 2), nullable=False)
+    currency = Column(String(3), default="USD")
+    sold_at = Column(DateTime, nullable=False)
+
+
+class ComparablePrice(Base):
+    __tablename__ = "comparable_price_index"
+    __table_args__ = (
+        UniqueConstraint(
+            "country_key", "denomination_key", "year", "mint_key", "grade_bucket",
+            name="uq_comparable_price_index_key"
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    country_key = Column(String(100), nullable=False)
+    denomination_key = Column(String(100), nullable=False)
+    year = Column(Integer, nullable=False)
+    mint_key = Column(String(20), nullable=False)
+    grade_bucket = Column(Integer, nullable=False)  # 0 = all grades
+    
+    # Rolling-window price statistics
+    sample_count = Column(Integer, nullable=False)
+    price_p10 = Column(Numeric(10, 2))
+    price_p25 = Column(Numeric(10, 2))
+    price_median = Column(Numeric(10, 2))
+    price_p75 = Column(Numeric(10, 2))
+    price_p90 = Column(Numeric(10, 2))
+    price_mean = Column(Numeric(10, 2))
+    grade_mean = Column(Numeric(4, 1))  # average Sheldon grade of the graded samples
+    last_sold_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RevaluationJob(Base):
+    __tablename__ = "revaluation_jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    # 'pending', 'running', 'completed', 'cancelled', 'failed'
+    status = Column(String(20), nullable=False, default="pending")
+    error = Column(Text)
+    use_ai = Column(Boolean, default=True)
+    
+    # Progress; coins are processed in id order and the checkpoint is the last finished id
+    total_coins = Column(Integer, default=0)
+    processed_coins = Column(Integer, default=0)
+    local_valuations = Column(Integer, default=0)
+    ai_valuations = Column(Integer, default=0)
+    skipped_coins = Column(Integer, default=0)
+    checkpoint_coin_id = Column(UUID(as_uuid=True))
+    
+    # Gemini spend
+    budget_usd = Column(Numeric(10, 4), default=0)
+    spent_usd = Column(Numeric(10, 4), default=0)
@@ -0,0 +1,286 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries ``X-Profile: 1`` together with the admin
+token, or when it is picked by ``PROFILING_SAMPLE_RATE``. While it runs, a
+sampler thread records the Python stacks of every busy thread (the event loop
+and the worker threads it hands blocking work to) and every SQL statement the
+request executes is captured with its duration. Finished profiles go into a
+bounded ring buffer read through ``/api/admin/profiles``; the response carries
+``X-Profile-Id`` to find it.
+
+Stacks of all busy threads are sampled, so work done for other requests running
+at the same time shows up too; ``concurrent_requests`` in the profile says
+whether that happened. With ``PROFILING_ENGINE=pyinstrument`` (and the package
+installed) pyinstrument's report of the event loop thread is stored instead of
+the built-in sampler's stacks.
+"""
+import contextvars
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # Optional dependency
+    PyinstrumentProfiler = None
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Innermost frames of threads that are waiting rather than working
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _frame_label(frame) -> str:
+    filename = frame.f_code.co_filename
+    if filename.startswith(_APP_ROOT):
+        filename = os.path.relpath(filename, _APP_ROOT)
+    elif "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[-1]
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{frame.f_code.co_name}"
+
+
+def _is_idle(frame) -> bool:
+    filename = frame.f_code.co_filename
+    return filename.endswith(_IDLE_FILES) or (filename.endswith(os.path.join("futures", "thread.py")) and frame.f_code.co_name == "_worker")
+
+
+class StackSampler:
+    """Samples the stacks of busy threads at a fixed interval on a daemon thread"""
+
+    def __init__(self, interval: float, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def summary(self, max_stacks: int) -> Dict[str, Any]:
+        """Folded stacks plus self and total samples per function (in milliseconds)."""
+        per_sample_ms = self.interval * 1000
+        self_time: Counter = Counter()
+        total_time: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_time[frames[-1]] += count
+            for label in set(frames):
+                total_time[label] += count
+
+        def ranked(counter: Counter) -> List[Dict[str, Any]]:
+            return [{"function": label, "samples": count, "ms": round(count * per_sample_ms, 1)} for label, count in counter.most_common(30)]
+
+        return {
+            "interval_ms": per_sample_ms,
+            "samples": self.samples,
+            "self": ranked(self_time),
+            "total": ranked(total_time),
+            "stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(max_stacks)],
+        }
+
+
+class _Capture:
+    """State of one profiled request"""
+
+    def __init__(self, max_statements: int):
+        self.max_statements = max_statements
+        self.statements: List[Dict[str, Any]] = []
+        self.statement_count = 0
+        self.sql_seconds = 0.0
+
+    def add_statement(self, statement: str, seconds: float, executemany: bool) -> None:
+        self.statement_count += 1
+        self.sql_seconds += seconds
+        if len(self.statements) < self.max_statements:
+            self.statements.append({
+                "sql": statement if len(statement) <= 2000 else statement[:2000] + "...",
+                "ms": round(seconds * 1000, 3),
+                "executemany": executemany,
+            })
+
+
+_capture: contextvars.ContextVar[Optional[_Capture]] = contextvars.ContextVar("profile_capture", default=None)
+
+
+class RequestProfiler:
+    """Decides which requests to profile and keeps the most recent profiles"""
+
+    def __init__(self):
+        self.enabled = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+        self.sample_rate = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+        self.admin_token = os.getenv("PROFILING_ADMIN_TOKEN") or None
+        self.interval = float(os.getenv("PROFILING_INTERVAL_MS", "5")) / 1000
+        self.min_duration = float(os.getenv("PROFILING_MIN_DURATION_MS", "0")) / 1000
+        self.max_statements = int(os.getenv("PROFILING_MAX_STATEMENTS", "200"))
+        self.max_stacks = int(os.getenv("PROFILING_MAX_STACKS", "100"))
+        self.engine = os.getenv("PROFILING_ENGINE", "sampling").lower()
+        self._profiles: deque = deque(maxlen=int(os.getenv("PROFILING_BUFFER_SIZE", "50")))
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def token_matches(self, token: Optional[str]) -> bool:
+        return bool(self.admin_token and token and hmac.compare_digest(token, self.admin_token))
+
+    def trigger(self, headers: Dict[str, str]) -> Optional[str]:
+        """Why this request should be profiled ("header" or "sample"), or None."""
+        if not self.enabled:
+            return None
+        if headers.get("x-profile") in ("1", "true") and self.token_matches(headers.get("x-admin-token")):
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def start_engine(self):
+        if self.engine == "pyinstrument" and PyinstrumentProfiler is not None:
+            profiler = PyinstrumentProfiler(interval=self.interval, async_mode="disabled")
+        else:
+            profiler = StackSampler(self.interval)
+        profiler.start()
+        return profiler
+
+    def finish_engine(self, profiler) -> Dict[str, Any]:
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+            return {"engine": "sampling", **profiler.summary(self.max_stacks)}
+        profiler.stop()
+        return {"engine": "pyinstrument", "report": profiler.output_text(unicode=False, color=False)}
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of stored profiles, newest first."""
+        with self._lock:
+            profiles = list(self._profiles)
+        keys = ("id", "method", "path", "route", "status", "trigger", "started_at", "duration_ms", "sql_count", "sql_ms", "concurrent_requests")
+        return [{key: profile[key] for key in keys} for profile in reversed(profiles)]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile["id"] == profile_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+# Global instance
+request_profiler = RequestProfiler()
+
+
+def instrument_engine(engine) -> None:
+    """Capture the statements run by profiled requests on a SQLAlchemy engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _capture.get() is not None:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        capture = _capture.get()
+        started = conn.info.get("profile_started")
+        if capture is not None and started:
+            capture.add_statement(statement, time.perf_counter() - started.pop(), executemany)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("profile_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests selected by ``request_profiler``"""
+
+    def __init__(self, app, profiler: RequestProfiler = None):
+        self.app = app
+        self.profiler = profiler or request_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        trigger = self.profiler.trigger(headers)
+        self.profiler.in_flight += 1
+        if trigger is None:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.profiler.in_flight -= 1
+            return
+
+        profile_id = uuid.uuid4().hex
+        status = {"code": 500}
+        concurrent = self.profiler.in_flight - 1
+
+        async def send_wrapper(message):
+            nonlocal concurrent
+            concurrent = max(concurrent, self.profiler.in_flight - 1)
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        capture = _Capture(self.profiler.max_statements)
+        token = _capture.set(capture)
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        engine = self.profiler.start_engine()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _capture.reset(token)
+            self.profiler.in_flight -= 1
+            report = self.profiler.finish_engine(engine)
+            if trigger == "header" or elapsed >= self.profiler.min_duration:
+                route = scope.get("route")
+                self.profiler.add({
+                    "id": profile_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(route, "path", None),
+                    "status": status["code"],
+                    "trigger": trigger,
+                    "started_at": started_at.isoformat(),
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "sql_count": capture.statement_count,
+                    "sql_ms": round(capture.sql_seconds * 1000, 1),
+                    "concurrent_requests": concurrent,
+                    "sql": capture.statements,
+                    "profile": report,
+                })
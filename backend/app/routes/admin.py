@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+
+from ..profiling import request_profiler
+
+router = APIRouter()
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Admin endpoints answer only when PROFILING_ADMIN_TOKEN is set and sent as X-Admin-Token"""
+    if not request_profiler.admin_token:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not request_profiler.token_matches(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin_token)])
+async def list_profiles():
+    """Most recent request profiles, newest first"""
+    return {
+        "enabled": request_profiler.enabled,
+        "sample_rate": request_profiler.sample_rate,
+        "profiles": request_profiler.list()
+    }
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin_token)])
+async def get_profile(profile_id: str):
+    """Stack samples and SQL statements of one profiled request"""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@router.delete("/profiles", status_code=204, dependencies=[Depends(require_admin_token)])
+async def clear_profiles():
+    """Drop all stored profiles"""
+    request_profiler.clear()
@@ -1,19 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from uuid import UUID
 import asyncio
 import os
 
 from ..database import get_db
-from ..models import Coin, AIAnalysis, Valuation, User
-from ..schemas import AnalyzeImageRequest
+from ..models import Coin, AIAnalysis, Valuation, User, RevaluationJob
+from ..schemas import AnalyzeImageRequest, RevaluationJobCreate, RevaluationJobSchema
 from ..services.vision_ai import vision_ai_service
+from ..services.valuation_engine import valuation_engine
+from ..services.revaluation import revaluation_service, coin_valuation_data, analysis_valuation_data
 from ..auth import get_request_user
+from ..cache import user_cache
 
 router = APIRouter()
 
 IMAGES_PATH = os.getenv("IMAGES_PATH", "/app/images")
 
+
+def _use_local_valuation(local: dict) -> bool:
+    """Use the local estimate when it is confident, or when Gemini is not configured."""
+    return bool(local.get("success")) and (local.get("confident") or not vision_ai_service.api_key)
+
+
+def _local_valuation(coin_id, local: dict) -> Valuation:
+    valuation_data = local["valuation"]
+    return Valuation(
+        coin_id=coin_id,
+        estimated_value_low=valuation_data.get("estimated_value_low"),
+        estimated_value_high=valuation_data.get("estimated_value_high"),
+        estimated_value_avg=valuation_data.get("estimated_value_avg"),
+        rarity_score=valuation_data.get("rarity_score"),
+        condition_multiplier=valuation_data.get("condition_multiplier"),
+        market_demand=valuation_data.get("market_demand"),
+        confidence_level=valuation_data.get("confidence_level"),
+        recent_sales_data=local.get("recent_sales_data"),
+        comparable_listings=local.get("comparable_listings"),
+        valuation_source=f"Local - {local.get('method')}"
+    )
+
 @router.post("/analyze")
 async def analyze_coin_image(
     request: AnalyzeImageRequest,
@@ -60,14 +85,24 @@ async def analyze_coin_image(
             "error_type": None
         }
 
-        valuation_result = vision_ai_service.estimate_value_from_image(
-            image_path_abs,
-            analysis_data,
-            coin_data_for_estimate
-        )
+        # Local valuation first; Gemini only when it is not confident
+        local = valuation_engine.estimate(db, coin_data_for_estimate, {
+            "grade": analysis_data.get("condition", {}).get("grade"),
+            "rarity": analysis_data.get("rarity_estimate"),
+            "defects": analysis_data.get("defects")
+        })
+        if _use_local_valuation(local):
+            valuation_result = local
+        else:
+            valuation_result = vision_ai_service.estimate_value_from_image(
+                image_path_abs,
+                analysis_data,
+                coin_data_for_estimate
+            )
         if valuation_result.get("success"):
             valuation_data = valuation_result.get("valuation")
-            valuation_text = valuation_result.get("formatted_response")
+            # The local engine has no formatted response; its notes serve as the text
+            valuation_text = valuation_result.get("formatted_response") or (valuation_data or {}).get("valuation_notes")
             valuation_model = valuation_result.get("model_version")
         
         # If coin_id provided, save analysis to database
@@ -119,9 +154,14 @@ async def analyze_coin_image(
                 coin.condition_grade = analysis_data["condition"].get("grade")
             
             db.commit()
+            user_cache.invalidate(current_user.id, request.coin_id)
             db.refresh(ai_analysis)
 
-            if valuation_data:
+            if valuation_data and valuation_result is local:
+                db.add(_local_valuation(request.coin_id, local))
+                db.commit()
+                user_cache.invalidate(current_user.id, request.coin_id)
+            elif valuation_data:
                 valuation = Valuation(
                     coin_id=request.coin_id,
                     estimated_value_low=valuation_data.get("estimated_value_low"),
@@ -140,6 +180,7 @@ async def analyze_coin_image(
                 )
                 db.add(valuation)
                 db.commit()
+                user_cache.invalidate(current_user.id, request.coin_id)
                 db.refresh(valuation)
             
             return {
@@ -171,7 +212,7 @@ async def estimate_coin_value(
     current_user: User = Depends(get_request_user),
     db: Session = Depends(get_db)
 ):
-    """Estimate the value of a coin based on AI analysis"""
+    """Estimate the value of a coin from comparable sales, falling back to AI analysis"""
     try:
         coin = db.query(Coin).filter(
             Coin.id == coin_id,
@@ -180,39 +221,35 @@ async def estimate_coin_value(
         if not coin:
             raise HTTPException(status_code=404, detail="Coin not found")
         
-        # Get latest AI analysis
-        if not coin.analyses:
+        coin_data = coin_valuation_data(coin)
+        latest_analysis = coin.latest_analysis
+        analysis_data = analysis_valuation_data(latest_analysis)
+        
+        # Local valuation (comparables, grade curve, rarity); Gemini only when it is not confident
+        local = valuation_engine.estimate(db, coin_data, analysis_data)
+        if _use_local_valuation(local):
+            valuation = _local_valuation(coin_id, local)
+            db.add(valuation)
+            db.commit()
+            user_cache.invalidate(current_user.id, coin_id)
+            db.refresh(valuation)
+            
+            return {
+                "success": True,
+                "valuation": local["valuation"],
+                "valuation_id": valuation.id,
+                "formatted_response": local["valuation"]["valuation_notes"],
+                "raw_response": None,
+                "model_version": local["model_version"],
+                "comparable_sales": local["comparable_listings"]
+            }
+        
+        if not latest_analysis:
             raise HTTPException(
                 status_code=400, 
                 detail="No AI analysis found. Please analyze the coin first."
             )
         
-        latest_analysis = max(coin.analyses, key=lambda a: a.created_at)
-        
-        # Prepare coin data
-        coin_data = {
-            "country": coin.country,
-            "denomination": coin.denomination,
-            "year": coin.year,
-            "mint_mark": coin.mint_mark,
-            "composition": coin.composition,
-            "condition_grade": coin.condition_grade,
-            "catalog_number": coin.catalog_number,
-            "variety": coin.variety,
-            "error_type": coin.error_type
-        }
-        
-        # Prepare analysis data
-        analysis_data = {
-            "grade": latest_analysis.ai_grade,
-            "wear_level": latest_analysis.wear_level,
-            "surface_quality": latest_analysis.surface_quality,
-            "defects": latest_analysis.detected_defects,
-            "errors": latest_analysis.detected_errors,
-            "authenticity": latest_analysis.authenticity_assessment,
-            "rarity": latest_analysis.raw_response.get("analysis", {}).get("rarity_estimate") if latest_analysis.raw_response else None
-        }
-        
         primary_image = next((img.file_path for img in coin.images if img.is_primary), None)
         if not primary_image and coin.images:
             primary_image = coin.images[0].file_path
@@ -261,6 +298,7 @@ async def estimate_coin_value(
         
         db.add(valuation)
         db.commit()
+        user_cache.invalidate(current_user.id, coin_id)
         db.refresh(valuation)
         
         return {
@@ -277,6 +315,89 @@ async def estimate_coin_value(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/revaluations", response_model=RevaluationJobSchema)
+async def start_revaluation(
+    request: RevaluationJobCreate,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Revalue the whole collection in the background"""
+    try:
+        running = db.query(RevaluationJob).filter(
+            RevaluationJob.user_id == current_user.id,
+            RevaluationJob.status.in_(("pending", "running"))
+        ).first()
+        if running:
+            raise HTTPException(status_code=409, detail=f"Revaluation {running.id} is already in progress")
+        
+        job = revaluation_service.create_job(db, current_user.id, request.budget_usd, request.use_ai)
+        revaluation_service.start(job.id)
+        return job
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _get_revaluation_job(db: Session, job_id: UUID, user: User) -> RevaluationJob:
+    job = db.query(RevaluationJob).filter(
+        RevaluationJob.id == job_id,
+        RevaluationJob.user_id == user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Revaluation job not found")
+    return job
+
+@router.get("/revaluations/{job_id}", response_model=RevaluationJobSchema)
+async def get_revaluation(
+    job_id: UUID,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Progress of a revaluation job"""
+    return _get_revaluation_job(db, job_id, current_user)
+
+@router.post("/revaluations/{job_id}/cancel", response_model=RevaluationJobSchema)
+async def cancel_revaluation(
+    job_id: UUID,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Stop a revaluation job after its current chunk"""
+    try:
+        job = _get_revaluation_job(db, job_id, current_user)
+        revaluation_service.cancel(db, job)
+        db.refresh(job)
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/revaluations/{job_id}/resume", response_model=RevaluationJobSchema)
+async def resume_revaluation(
+    job_id: UUID,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Continue a cancelled or failed job from its checkpoint"""
+    try:
+        job = _get_revaluation_job(db, job_id, current_user)
+        if job.status == "completed":
+            raise HTTPException(status_code=409, detail="Revaluation already completed")
+        if job.status not in ("pending", "running"):
+            job.status = "running"
+            job.error = None
+            job.finished_at = None
+            db.commit()
+            db.refresh(job)
+        revaluation_service.start(job.id)
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/similar/{coin_id}")
 async def find_similar_coins(
     coin_id: UUID,
@@ -307,7 +428,10 @@ async def find_similar_coins(
         if coin.year:
             query = query.filter(Coin.year.between(coin.year - 5, coin.year + 5))
         
-        similar_coins = query.limit(limit).all()
+        similar_coins = query.options(
+            selectinload(Coin.images),
+            joinedload(Coin.latest_valuation)
+        ).limit(limit).all()
         
         # Format response
         results = []
@@ -317,9 +441,9 @@ async def find_similar_coins(
                 primary_image = similar_coin.images[0].file_path
             
             estimated_value = None
-            if similar_coin.valuations:
-                latest_val = max(similar_coin.valuations, key=lambda v: v.created_at)
-                estimated_value = float(latest_val.estimated_value_avg) if latest_val.estimated_value_avg else None
+            latest_val = similar_coin.latest_valuation
+            if latest_val and latest_val.estimated_value_avg is not None:
+                estimated_value = float(latest_val.estimated_value_avg)
             
             results.append({
                 "id": similar_coin.id,
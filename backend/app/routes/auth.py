@@ -1,7 +1,7 @@
 """
 Authentication routes for user registration and login.
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
@@ -12,11 +12,23 @@ from ..database import get_db
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
 
+def _client_address(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _throttle_key(request: Request, username: str) -> str:
+    # Per account as well as per address, so clients behind one proxy address
+    # do not share a single budget
+    return f"{_client_address(request)}|{username.strip().lower()}"
+
+
 @router.post("/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(request: Request, user_data: schemas.UserCreate, db: Session = Depends(get_db)):
     """
     Register a new user.
     """
+    auth.login_throttle.check(_throttle_key(request, user_data.username))
+    
     # Check if username already exists
     existing_user = db.query(models.User).filter(models.User.username == user_data.username).first()
     if existing_user:
@@ -34,7 +46,7 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = auth.get_password_hash(user_data.password)
+    hashed_password = await auth.password_hasher.hash(user_data.password)
     new_user = models.User(
         username=user_data.username,
         email=user_data.email,
@@ -49,18 +61,26 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """
     Login and get access token.
     """
+    # Attempts are limited per client and username before any hashing work is done
+    client = _throttle_key(request, form_data.username)
+    auth.login_throttle.check(client)
+    
     # Find user
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
     
     # Verify user and password
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await auth.password_hasher.verify(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -73,16 +93,37 @@ def login(
             detail="Inactive user"
         )
     
+    # Upgrade the stored hash when the hashing parameters have changed
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+        auth.token_user_cache.invalidate(user.id)
+    auth.login_throttle.reset(client)
+    
     # Create access token
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username},
+        data=auth.token_claims(user),
         expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+def logout_all(
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Revoke every token issued to the current user, including this one.
+    """
+    current_user.token_version = (current_user.token_version or 0) + 1
+    db.commit()
+    auth.token_user_cache.invalidate(current_user.id)
+    return None
+
+
 @router.get("/me", response_model=schemas.UserResponse)
 def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
     """
@@ -123,6 +164,7 @@ def update_current_user(
     current_user.email = user_update.email
     
     db.commit()
+    auth.token_user_cache.invalidate(current_user.id)
     db.refresh(current_user)
     
     return current_user
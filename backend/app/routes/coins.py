@@ -1,81 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import or_, func
 from typing import List, Optional
 from uuid import UUID
+import asyncio
 import os
 from datetime import datetime
+import hashlib
+import json
 import shutil
 
 from ..database import get_db
-from ..models import Coin, CoinImage, AIAnalysis, Valuation, User
+from ..models import Coin, CoinImage, AIAnalysis, Valuation, EbayListing, User
 from ..schemas import (
-    CoinCreate, CoinUpdate, CoinSchema, CoinListSchema, 
-    CoinSearchParams
+    CoinCreate, CoinUpdate, CoinSchema, CoinListSchema,
+    CapturePromoteRequest, CoinBatchRequest
 )
-from ..services.vision_ai import vision_ai_service
+from ..services.captures import capture_store
+from ..services.coin_data import sanitize_coin_payload
+from ..services.analytics import collection_analytics
+from ..services.export import collection_exporter
+from ..services.coin_import import coin_importer, FORMATS as IMPORT_FORMATS
+from ..services.coin_batch import BatchRejected, apply_batch, remove_image_files
 from ..auth import get_request_user
+from ..cache import user_cache
 
 router = APIRouter()
 
 IMAGES_PATH = os.getenv("IMAGES_PATH", "/app/images")
 
-_MAX_LENGTHS = {
-    "inventory_number": 20,
-    "country": 100,
-    "denomination": 100,
-    "mint_mark": 20,
-    "composition": 200,
-    "condition_grade": 50,
-    "condition_notes": 1000,
-    "defects": 1000,
-    "catalog_number": 100,
-    "variety": 100,
-    "error_type": 100,
-    "notes": 2000,
-    "acquisition_source": 200,
-    "location": 200,
-}
-
-
-def _normalize_mint_mark(value: Optional[str]) -> Optional[str]:
-    if value is None:
-        return None
-    cleaned = value.strip()
-    if not cleaned:
-        return None
-    lower = cleaned.lower()
-    if "philadelphia" in lower and ("none" in lower or "no mint" in lower):
-        return "None"
-    return cleaned
-
-
-def _sanitize_coin_payload(data: dict, allow_inventory_default: bool = False) -> dict:
-    sanitized = dict(data)
-    if allow_inventory_default and not sanitized.get("inventory_number"):
-        sanitized.pop("inventory_number", None)
-
-    for key in list(sanitized.keys()):
-        value = sanitized.get(key)
-        if value is None:
-            sanitized.pop(key, None)
-            continue
-        if key == "inventory_number" and isinstance(value, str) and not value.strip():
-            sanitized.pop(key, None)
-            continue
-        if key == "mint_mark":
-            value = _normalize_mint_mark(value)
-            if value is None:
-                sanitized.pop(key, None)
-                continue
-            sanitized[key] = value
-        if key in _MAX_LENGTHS and isinstance(sanitized.get(key), str):
-            max_len = _MAX_LENGTHS[key]
-            if len(sanitized[key]) > max_len:
-                sanitized[key] = sanitized[key][:max_len]
-
-    return sanitized
-
 @router.post("/", response_model=CoinSchema, status_code=201)
 async def create_coin(
     coin: CoinCreate,
@@ -83,7 +38,7 @@ async def create_coin(
     db: Session = Depends(get_db)
 ):
     """Create a new coin record"""
-    coin_data = _sanitize_coin_payload(
+    coin_data = sanitize_coin_payload(
         coin.model_dump(),
         allow_inventory_default=True
     )
@@ -91,9 +46,59 @@ async def create_coin(
     db_coin = Coin(**coin_data)
     db.add(db_coin)
     db.commit()
+    user_cache.invalidate(current_user.id, db_coin.id)
     db.refresh(db_coin)
     return db_coin
 
+@router.post("/import")
+async def import_coins(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or jsonl; defaults to the file extension"),
+    idempotency_key: Optional[str] = Header(None, max_length=64),
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Import many coins from a CSV or JSON Lines file in batched transactions"""
+    try:
+        import_format = (format or os.path.splitext(file.filename or "")[1]).lower().lstrip(".")
+        if import_format not in IMPORT_FORMATS:
+            raise HTTPException(status_code=400, detail="Import must be a .csv or .jsonl file")
+
+        report = await asyncio.to_thread(
+            coin_importer.import_file, db, current_user.id, file.file, import_format, idempotency_key
+        )
+        if report["inserted"]:
+            user_cache.invalidate(current_user.id)
+        return report
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch")
+async def batch_coins(
+    request: CoinBatchRequest,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Apply mixed create/update/delete operations in one transaction"""
+    try:
+        results, image_paths = await asyncio.to_thread(apply_batch, db, current_user.id, request.operations)
+    except BatchRejected as e:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Batch rejected; no changes were made", "results": jsonable_encoder(e.results)}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    user_cache.invalidate(current_user.id)
+    if image_paths:
+        await remove_image_files(IMAGES_PATH, image_paths)
+    return {"success": True, "results": results}
+
 @router.get("/", response_model=List[CoinListSchema])
 async def list_coins(
     skip: int = Query(0, ge=0),
@@ -146,8 +151,11 @@ async def list_coins(
         else:
             query = query.order_by(order_column.asc())
     
-    # Pagination
-    coins = query.offset(skip).limit(limit).all()
+    # Pagination; images and the latest valuation are loaded with the page
+    coins = query.options(
+        selectinload(Coin.images),
+        joinedload(Coin.latest_valuation)
+    ).offset(skip).limit(limit).all()
     
     # Transform to list schema with primary image and estimated value
     result = []
@@ -157,9 +165,9 @@ async def list_coins(
             primary_image = coin.images[0].file_path
         
         estimated_value = None
-        if coin.valuations:
-            latest_valuation = max(coin.valuations, key=lambda v: v.created_at)
-            estimated_value = float(latest_valuation.estimated_value_avg) if latest_valuation.estimated_value_avg else None
+        latest_valuation = coin.latest_valuation
+        if latest_valuation and latest_valuation.estimated_value_avg is not None:
+            estimated_value = float(latest_valuation.estimated_value_avg)
         
         result.append(CoinListSchema(
             id=coin.id,
@@ -174,20 +182,84 @@ async def list_coins(
     
     return result
 
+@router.get("/analytics")
+async def get_collection_analytics(
+    top: int = Query(20, ge=1, le=500),
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Collection value totals and breakdowns by country, denomination, decade and grade"""
+    entry_key, cached = user_cache.lookup(current_user.id, f"analytics:{top}")
+    if cached is not None:
+        return cached
+    try:
+        result = collection_analytics(db, current_user.id, top=top)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    user_cache.store(entry_key, result)
+    return result
+
+@router.get("/export")
+async def export_coins(
+    format: str = Query("csv", description="csv, jsonl or parquet"),
+    bundle: bool = Query(False, description="Zip the data file with the coins' images"),
+    current_user: User = Depends(get_request_user)
+):
+    """Stream the whole collection with latest valuations and primary images"""
+    try:
+        extension, media_type = collection_exporter.normalize_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"nomisma-coins-{datetime.utcnow().strftime('%Y%m%d')}"
+    if bundle:
+        content = collection_exporter.stream_bundle(current_user.id, extension)
+        media_type = "application/zip"
+        filename += ".zip"
+    else:
+        content = collection_exporter.stream(current_user.id, extension)
+        filename += f".{extension}"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
 @router.get("/{coin_id}", response_model=CoinSchema)
 async def get_coin(
     coin_id: UUID,
+    request: Request,
     current_user: User = Depends(get_request_user),
     db: Session = Depends(get_db)
 ):
-    """Get a specific coin by ID"""
-    coin = db.query(Coin).filter(
-        Coin.id == coin_id,
-        Coin.user_id == current_user.id
-    ).first()
-    if not coin:
-        raise HTTPException(status_code=404, detail="Coin not found")
-    return coin
+    """Get a specific coin by ID (cached per user; supports If-None-Match)"""
+    entry_key, cached = user_cache.lookup(current_user.id, "coin", coin_id=coin_id)
+    if cached is None:
+        coin = db.query(Coin).options(
+            selectinload(Coin.images),
+            selectinload(Coin.analyses),
+            selectinload(Coin.valuations)
+        ).filter(
+            Coin.id == coin_id,
+            Coin.user_id == current_user.id
+        ).first()
+        if not coin:
+            raise HTTPException(status_code=404, detail="Coin not found")
+        body = CoinSchema.model_validate(coin).model_dump(mode="json")
+        digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:32]
+        cached = {"etag": f'"{digest}"', "body": body}
+        user_cache.store(entry_key, cached)
+
+    headers = {"ETag": cached["etag"], "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), cached["etag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=cached["body"], headers=headers)
 
 @router.put("/{coin_id}", response_model=CoinSchema)
 async def update_coin(
@@ -205,13 +277,14 @@ async def update_coin(
         raise HTTPException(status_code=404, detail="Coin not found")
     
     # Update fields
-    update_data = _sanitize_coin_payload(
+    update_data = sanitize_coin_payload(
         coin_update.model_dump(exclude_unset=True)
     )
     for field, value in update_data.items():
         setattr(coin, field, value)
     
     db.commit()
+    user_cache.invalidate(current_user.id, coin_id)
     db.refresh(coin)
     return coin
 
@@ -237,6 +310,7 @@ async def delete_coin(
     
     db.delete(coin)
     db.commit()
+    user_cache.invalidate(current_user.id, coin_id)
     return None
 
 @router.post("/{coin_id}/images", status_code=201)
@@ -290,6 +364,7 @@ async def upload_coin_image(
     
     db.add(coin_image)
     db.commit()
+    user_cache.invalidate(current_user.id, coin_id)
     db.refresh(coin_image)
     
     return {
@@ -298,6 +373,59 @@ async def upload_coin_image(
         "url": f"/images/{relative_path}"
     }
 
+@router.post("/{coin_id}/images/from-capture", status_code=201)
+async def promote_capture(
+    coin_id: UUID,
+    request: CapturePromoteRequest,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Attach a microscope capture to a coin without re-uploading it"""
+    coin = db.query(Coin).filter(
+        Coin.id == coin_id,
+        Coin.user_id == current_user.id
+    ).first()
+    if not coin:
+        raise HTTPException(status_code=404, detail="Coin not found")
+
+    try:
+        relative_path, metadata = capture_store.promote(
+            request.file_path, str(coin_id), request.image_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Capture not found")
+
+    coin_image = CoinImage(
+        coin_id=coin_id,
+        file_path=relative_path,
+        file_size=metadata.get("file_size"),
+        image_type=request.image_type,
+        is_primary=request.is_primary,
+        width=metadata.get("width"),
+        height=metadata.get("height"),
+        format=metadata.get("format")
+    )
+
+    db.add(coin_image)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Put the capture back so it is neither orphaned nor lost
+        capture_store.restore(relative_path, request.file_path, metadata)
+        raise
+    user_cache.invalidate(current_user.id, coin_id)
+    db.refresh(coin_image)
+
+    return {
+        "id": coin_image.id,
+        "file_path": relative_path,
+        "url": f"/images/{relative_path}",
+        "sharpness": metadata.get("sharpness")
+    }
+
 @router.get("/{coin_id}/stats")
 async def get_coin_stats(
     coin_id: UUID,
@@ -312,11 +440,14 @@ async def get_coin_stats(
     if not coin:
         raise HTTPException(status_code=404, detail="Coin not found")
     
+    def count(model):
+        return db.query(func.count(model.id)).filter(model.coin_id == coin_id).scalar()
+    
     return {
-        "total_images": len(coin.images),
-        "total_analyses": len(coin.analyses),
-        "total_valuations": len(coin.valuations),
-        "ebay_listings": len(coin.ebay_listings),
-        "latest_valuation": coin.valuations[-1].estimated_value_avg if coin.valuations else None,
-        "latest_analysis_date": coin.analyses[-1].created_at if coin.analyses else None
+        "total_images": count(CoinImage),
+        "total_analyses": count(AIAnalysis),
+        "total_valuations": count(Valuation),
+        "ebay_listings": count(EbayListing),
+        "latest_valuation": coin.latest_valuation.estimated_value_avg if coin.latest_valuation else None,
+        "latest_analysis_date": coin.latest_analysis.created_at if coin.latest_analysis else None
     }
@@ -0,0 +1,100 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+import asyncio
+import os
+
+from ..database import get_db
+from ..models import User
+from ..services.comparables import comparables_service, parse_feed
+from ..auth import get_current_user, get_request_user
+
+router = APIRouter()
+
+
+@router.get("/price")
+async def get_comparable_price(
+    country: str,
+    denomination: str,
+    year: int,
+    mint_mark: Optional[str] = None,
+    grade: Optional[str] = None,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Price statistics from comparable sales for a coin description"""
+    try:
+        coin = {
+            "country": country,
+            "denomination": denomination,
+            "year": year,
+            "mint_mark": mint_mark,
+            "grade": grade
+        }
+        found = comparables_service.lookup(db, coin)
+        if found["key"] is None:
+            raise HTTPException(status_code=400, detail="Country, denomination and year are required")
+
+        exact = found["exact"]
+        all_grades = found["all_grades"]
+        return {
+            "key": {
+                "country": found["key"][0],
+                "denomination": found["key"][1],
+                "year": found["key"][2],
+                "mint_mark": found["key"][3],
+                "grade_bucket": found["grade_bucket"]
+            },
+            "grade": comparables_service.price_stats(exact) if exact else None,
+            "all_grades": comparables_service.price_stats(all_grades) if all_grades else None,
+            "recent_sales": comparables_service.recent_sales(db, found["key"], found["grade_bucket"])
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/import")
+async def import_comparable_sales(
+    file: UploadFile = File(...),
+    source: str = Query("feed", min_length=1, max_length=50, pattern=r"^[A-Za-z0-9_.-]+$"),
+    # The index is shared by every user's valuations
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Import sold prices from a CSV, JSON or JSON Lines feed"""
+    try:
+        feed_format = os.path.splitext(file.filename or "")[1].lower().lstrip(".")
+        if feed_format not in ("csv", "json", "jsonl", "ndjson"):
+            raise HTTPException(status_code=400, detail="Feed must be a .csv, .json or .jsonl file")
+
+        def run_import():
+            records = parse_feed(file.file, feed_format)
+            return comparables_service.ingest_records(db, records, f"feed:{source}")
+
+        try:
+            result = await asyncio.to_thread(run_import)
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Invalid feed: {str(e)}")
+
+        return {"success": True, **result}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/refresh")
+async def refresh_comparables(
+    current_user: User = Depends(get_current_user)
+):
+    """Ingest newly sold eBay listings and rebuild the price index"""
+    try:
+        result = await asyncio.to_thread(comparables_service.sync)
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
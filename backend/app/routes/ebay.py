@@ -4,12 +4,28 @@ from uuid import UUID
 
 from ..database import get_db
 from ..models import Coin, EbayListing, User
-from ..schemas import EbayListingCreate, EbayListingSchema
+from ..schemas import EbayListingCreate, EbayListingSchema, EbayBulkListingCreate
 from ..services.ebay_service import ebay_service
-from ..auth import get_request_user
+from ..services.ebay_client import EbayCallLimitExceeded
+from ..services.ebay_sync import ebay_status_sync
+from ..auth import get_current_user, get_request_user
+from ..cache import user_cache
 
 router = APIRouter()
 
+
+def _coin_listing_data(coin: Coin) -> dict:
+    return {
+        "id": str(coin.id),
+        "country": coin.country,
+        "denomination": coin.denomination,
+        "year": coin.year,
+        "mint_mark": coin.mint_mark,
+        "condition_grade": coin.condition_grade,
+        "catalog_number": coin.catalog_number
+    }
+
+
 @router.post("/list", response_model=EbayListingSchema)
 async def create_ebay_listing(
     listing: EbayListingCreate,
@@ -27,15 +43,7 @@ async def create_ebay_listing(
             raise HTTPException(status_code=404, detail="Coin not found")
         
         # Prepare coin data
-        coin_data = {
-            "id": str(coin.id),
-            "country": coin.country,
-            "denomination": coin.denomination,
-            "year": coin.year,
-            "mint_mark": coin.mint_mark,
-            "condition_grade": coin.condition_grade,
-            "catalog_number": coin.catalog_number
-        }
+        coin_data = _coin_listing_data(coin)
         
         # Prepare listing data
         listing_data = {
@@ -46,11 +54,11 @@ async def create_ebay_listing(
         }
         
         # Create eBay listing
-        result = ebay_service.create_listing(coin_data, listing_data)
+        result = await ebay_service.create_listing(coin_data, listing_data)
         
         if not result.get("success"):
             raise HTTPException(
-                status_code=400,
+                status_code=429 if result.get("rate_limited") else 400,
                 detail={
                     "message": "Failed to create eBay listing",
                     "error": result.get("error", "Unknown error"),
@@ -77,6 +85,7 @@ async def create_ebay_listing(
         coin.is_for_sale = True
         
         db.commit()
+        user_cache.invalidate(current_user.id, listing.coin_id)
         db.refresh(ebay_listing)
         
         return ebay_listing
@@ -86,6 +95,93 @@ async def create_ebay_listing(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/list/bulk")
+async def create_ebay_listings_bulk(
+    request: EbayBulkListingCreate,
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
+):
+    """Create eBay listings for many coins using batched AddItems calls"""
+    try:
+        # One query for every coin in the request - only the user's own coins
+        coin_ids = {listing.coin_id for listing in request.listings}
+        coins = {
+            coin.id: coin
+            for coin in db.query(Coin).filter(
+                Coin.id.in_(coin_ids),
+                Coin.user_id == current_user.id
+            )
+        }
+
+        results = [None] * len(request.listings)
+        entries = []
+        positions = []
+        for position, listing in enumerate(request.listings):
+            coin = coins.get(listing.coin_id)
+            if not coin:
+                results[position] = {"coin_id": listing.coin_id, "success": False, "error": "Coin not found"}
+                continue
+            entries.append((_coin_listing_data(coin), {
+                "listing_title": listing.listing_title,
+                "listing_description": listing.listing_description,
+                "starting_price": listing.starting_price,
+                "buy_it_now_price": listing.buy_it_now_price
+            }))
+            positions.append(position)
+
+        ebay_results = await ebay_service.create_listings_bulk(entries)
+
+        # Persist every successful listing in a single transaction
+        created = []
+        for position, result in zip(positions, ebay_results):
+            listing = request.listings[position]
+            if not result.get("success"):
+                results[position] = {
+                    "coin_id": listing.coin_id,
+                    "success": False,
+                    "error": result.get("error", "Unknown error"),
+                    "rate_limited": result.get("rate_limited", False)
+                }
+                continue
+            ebay_listing = EbayListing(
+                coin_id=listing.coin_id,
+                ebay_item_id=result.get("item_id"),
+                listing_title=listing.listing_title,
+                listing_description=listing.listing_description,
+                starting_price=listing.starting_price,
+                buy_it_now_price=listing.buy_it_now_price,
+                status="active",
+                listed_at=result.get("start_time"),
+                ebay_response=result.get("response")
+            )
+            coins[listing.coin_id].is_for_sale = True
+            created.append((position, ebay_listing))
+
+        db.add_all([ebay_listing for _, ebay_listing in created])
+        db.flush()
+        for position, ebay_listing in created:
+            results[position] = {
+                "coin_id": ebay_listing.coin_id,
+                "success": True,
+                "listing_id": ebay_listing.id,
+                "ebay_item_id": ebay_listing.ebay_item_id
+            }
+        db.commit()
+        for _, ebay_listing in created:
+            user_cache.invalidate(current_user.id, ebay_listing.coin_id)
+
+        return {
+            "success": len(created) == len(request.listings),
+            "created": len(created),
+            "failed": len(request.listings) - len(created),
+            "results": results
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/listings/{coin_id}")
 async def get_coin_listings(
     coin_id: UUID,
@@ -115,15 +211,42 @@ async def get_coin_listings(
 @router.get("/status/{item_id}")
 async def get_listing_status(
     item_id: str,
-    current_user: User = Depends(get_request_user)
+    current_user: User = Depends(get_request_user),
+    db: Session = Depends(get_db)
 ):
-    """Get the status of an eBay listing"""
+    """Get the status of an eBay listing, from the synced table when fresh"""
     try:
-        result = ebay_service.get_listing_status(item_id)
+        listing = db.query(EbayListing).join(Coin).filter(
+            EbayListing.ebay_item_id == item_id,
+            Coin.user_id == current_user.id
+        ).first()
+
+        if listing and ebay_status_sync.enabled and not ebay_status_sync.is_fresh(listing):
+            try:
+                await ebay_status_sync.refresh_listing(listing)
+                db.commit()
+            except EbayCallLimitExceeded:
+                pass  # Serve the stored status rather than failing
+
+        if listing and (ebay_status_sync.enabled or listing.last_synced_at):
+            return {
+                "success": True,
+                "item_id": item_id,
+                "status": listing.status,
+                "current_price": float(listing.current_price) if listing.current_price is not None else None,
+                "sold_price": float(listing.sold_price) if listing.sold_price is not None else None,
+                "sold_at": listing.sold_at,
+                "ended_at": listing.ended_at,
+                "buyer_username": listing.buyer_username,
+                "last_synced_at": listing.last_synced_at
+            }
+
+        # Unknown listing, or no eBay credentials: fall back to a live lookup
+        result = await ebay_service.get_listing_status(item_id)
         
         if not result.get("success"):
             raise HTTPException(
-                status_code=500,
+                status_code=429 if result.get("rate_limited") else 500,
                 detail=f"Failed to get listing status: {result.get('error', 'Unknown error')}"
             )
         
@@ -134,6 +257,22 @@ async def get_listing_status(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Account-wide operations spend the shared eBay quota: signed-in users only
+@router.post("/sync", dependencies=[Depends(get_current_user)])
+async def sync_listing_status():
+    """Run an incremental listing status sync now"""
+    try:
+        return await ebay_status_sync.sync_once()
+    except EbayCallLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/metrics", dependencies=[Depends(get_current_user)])
+async def get_ebay_metrics():
+    """Get eBay call pool queue depth and rate limit usage"""
+    return ebay_service.metrics()
+
 @router.post("/auth")
 async def ebay_auth():
     """Handle eBay OAuth authentication"""
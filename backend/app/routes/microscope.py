@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-import cv2
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+import asyncio
 import os
 from datetime import datetime
+from typing import Optional
 from uuid import uuid4
 
-from ..services.microscope import microscope_service
+from ..workers import worker_role
+from ..services.image_encoder import image_encoder
+from ..services.captures import capture_store
 router = APIRouter()
 
 IMAGES_PATH = os.getenv("IMAGES_PATH", "/app/images")
@@ -14,7 +17,7 @@ IMAGES_PATH = os.getenv("IMAGES_PATH", "/app/images")
 async def list_devices():
     """List available camera devices"""
     try:
-        cameras = microscope_service.list_available_cameras()
+        cameras = await asyncio.to_thread(worker_role.microscope().list_available_cameras)
         return {
             "success": True,
             "cameras": cameras,
@@ -26,13 +29,23 @@ async def list_devices():
 @router.post("/capture")
 async def capture_image(
     camera_index: str = "0",
-    image_type: str = "scan"
+    image_type: str = "scan",
+    focus_window: Optional[float] = Query(None, ge=0, le=5),
+    image_format: Optional[str] = Query(None, pattern="^(jpg|jpeg|png|tiff|tif)$"),
+    quality: Optional[int] = Query(
+        None, ge=1, le=100,
+        description="JPEG quality; ignored for PNG and TIFF, which are lossless (PNG compression comes from IMAGE_PNG_COMPRESSION)"
+    )
 ):
-    """Capture an image from the microscope"""
+    """Capture the sharpest frame from the microscope"""
     try:
+        # Only one worker owns the camera; the others relay to it
+        microscope_service = worker_role.microscope()
+        extension, _ = image_encoder.normalize_format(image_format or microscope_service.capture_format)
+
         # Generate unique filename
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"capture_{timestamp}_{uuid4().hex[:8]}.jpg"
+        filename = f"capture_{timestamp}_{uuid4().hex[:8]}.{extension}"
         
         # Create temp directory
         temp_dir = os.path.join(IMAGES_PATH, "temp")
@@ -41,20 +54,26 @@ async def capture_image(
         save_path = os.path.join(temp_dir, filename)
         
         # Open selected camera if needed
-        if not microscope_service.ensure_camera(camera_index):
+        if not await asyncio.to_thread(microscope_service.ensure_camera, camera_index):
             raise HTTPException(status_code=500, detail="Failed to open camera")
         
         # Capture image
-        success, result = microscope_service.capture_image(save_path)
+        success, result, sharpness = await asyncio.to_thread(
+            microscope_service.capture_image, save_path, focus_window, extension, quality
+        )
         
         if not success:
             raise HTTPException(status_code=500, detail=result)
+
+        # Metadata is stored now so promoting the capture never re-reads the image
+        capture_store.write_metadata(save_path, sharpness)
         
         return {
             "success": True,
             "file_path": f"temp/{filename}",
             "url": f"/images/temp/{filename}",
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "sharpness": sharpness
         }
         
     except Exception as e:
@@ -66,25 +85,21 @@ async def get_preview(
 ):
     """Get a preview frame from the microscope"""
     try:
+        microscope_service = worker_role.microscope()
         # Open selected camera if needed
-        if not microscope_service.ensure_camera(camera_index):
+        if not await asyncio.to_thread(microscope_service.ensure_camera, camera_index):
             raise HTTPException(status_code=500, detail="Failed to open camera")
         
-        # Get frame
-        frame = microscope_service.get_frame()
+        # Get an already-compressed frame (MJPEG passthrough or pooled encoder)
+        data = await asyncio.to_thread(microscope_service.get_preview_jpeg)
         
-        if frame is None:
+        if data is None:
             raise HTTPException(status_code=500, detail="Failed to capture frame")
         
-        # Encode frame as JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            raise HTTPException(status_code=500, detail="Failed to encode frame")
-        
-        # Return as streaming response
-        return StreamingResponse(
-            iter([buffer.tobytes()]),
-            media_type="image/jpeg"
+        return Response(
+            content=data,
+            media_type="image/jpeg",
+            headers={"Cache-Control": "no-store"}
         )
         
     except Exception as e:
@@ -96,7 +111,7 @@ async def open_camera(
 ):
     """Open a specific camera"""
     try:
-        success = microscope_service.open_camera(camera_index)
+        success = await asyncio.to_thread(worker_role.microscope().open_camera, camera_index)
         if success:
             return {
                 "success": True,
@@ -112,7 +127,7 @@ async def open_camera(
 async def close_camera():
     """Close the current camera"""
     try:
-        microscope_service.close_camera()
+        await asyncio.to_thread(worker_role.microscope().close_camera)
         return {
             "success": True,
             "message": "Camera closed successfully"
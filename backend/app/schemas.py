@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from uuid import UUID
 
@@ -127,6 +127,42 @@ class CoinSchema(CoinBase):
     class Config:
         from_attributes = True
 
+class CoinBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[UUID] = None  # Required for update and delete
+    data: Optional[CoinUpdate] = None  # Fields to set for create and update
+
+class CoinBatchRequest(BaseModel):
+    operations: List[CoinBatchOperation] = Field(..., min_length=1, max_length=1000)
+
+class CapturePromoteRequest(BaseModel):
+    file_path: str  # temp/... path returned by /api/microscope/capture
+    image_type: str = Field("obverse", max_length=20, pattern="^[a-z_]+$")  # Part of the file name
+    is_primary: bool = False
+
+class RevaluationJobCreate(BaseModel):
+    budget_usd: Optional[float] = Field(None, ge=0)  # Gemini spend limit; defaults to REVALUATION_DEFAULT_BUDGET_USD
+    use_ai: bool = True
+
+class RevaluationJobSchema(BaseModel):
+    id: UUID
+    status: str
+    error: Optional[str] = None
+    use_ai: bool
+    total_coins: int
+    processed_coins: int
+    local_valuations: int
+    ai_valuations: int
+    skipped_coins: int
+    budget_usd: float
+    spent_usd: float
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 class CoinListSchema(BaseModel):
     id: UUID
     inventory_number: str
@@ -153,6 +189,9 @@ class EbayListingCreate(BaseModel):
     starting_price: float
     buy_it_now_price: Optional[float] = None
 
+class EbayBulkListingCreate(BaseModel):
+    listings: List[EbayListingCreate] = Field(..., min_length=1, max_length=500)
+
 class EbayListingSchema(BaseModel):
     id: UUID
     coin_id: UUID
@@ -0,0 +1,98 @@
+"""
+Production server.
+
+    python -m app.server [--host 0.0.0.0] [--port 8000] [--workers N]
+
+Runs uvicorn with one or more worker processes, uvloop and httptools (when
+installed) and no reloader. Several workers need the Redis response cache
+(``RESPONSE_CACHE_BACKEND=redis``); without it the default is one worker. On SIGTERM each worker stops accepting
+connections, finishes in-flight requests for up to the graceful timeout, then
+drains revaluation jobs, stops background work and releases the camera (see
+``app.workers``). Workers share ``/metrics`` through snapshot files in
+``METRICS_MULTIPROC_DIR`` (a per-server temp directory by default). Use
+``uvicorn app.main:app --reload`` for development.
+"""
+import argparse
+import glob
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+
+import uvicorn
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def shared_cache() -> bool:
+    return os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower() == "redis"
+
+
+def default_workers() -> int:
+    # The in-process response cache is only coherent within one worker
+    if not shared_cache():
+        return int(os.getenv("WEB_CONCURRENCY") or 1)
+    return int(os.getenv("WEB_CONCURRENCY") or min(4, os.cpu_count() or 1))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.server")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Worker processes (default: WEB_CONCURRENCY, else up to 4 by CPU count with the Redis response cache, 1 without)")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("SERVER_GRACEFUL_TIMEOUT_SECONDS", "30")), help="Seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("SERVER_KEEP_ALIVE_SECONDS", "5")))
+    parser.add_argument("--forwarded-allow-ips", default=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"), help="Proxies trusted for X-Forwarded-* headers")
+    parser.add_argument("--no-access-log", action="store_true", default=os.getenv("SERVER_ACCESS_LOG", "true").lower() != "true")
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    if workers > 1 and not shared_cache():
+        print(
+            f"Warning: {workers} workers with the in-process response cache; a write on one worker "
+            "leaves the others serving stale responses for up to RESPONSE_CACHE_TTL_SECONDS. "
+            "Set RESPONSE_CACHE_BACKEND=redis or run one worker.",
+            file=sys.stderr
+        )
+    # Workers inherit the environment; services split account-wide limits by it
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    own_metrics_dir = None
+    if workers > 1:
+        # Workers share /metrics through snapshots here; start without a previous run's counts
+        metrics_dir = os.getenv("METRICS_MULTIPROC_DIR")
+        if not metrics_dir:
+            metrics_dir = own_metrics_dir = os.path.join(tempfile.gettempdir(), f"nomisma-{os.getpid()}-metrics")
+            os.environ["METRICS_MULTIPROC_DIR"] = metrics_dir
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+            os.remove(path)
+
+    try:
+        run_server(args, workers)
+    finally:
+        if own_metrics_dir:
+            shutil.rmtree(own_metrics_dir, ignore_errors=True)
+    return 0
+
+
+def run_server(args: argparse.Namespace, workers: int) -> None:
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=not args.no_access_log,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
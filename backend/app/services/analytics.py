@@ -0,0 +1,127 @@
+"""
+Collection analytics computed in the database.
+
+One query scans the user's coins joined to their latest valuation and groups
+them by country, denomination, decade and grade at once (GROUPING SETS);
+window functions add each group's share of the collection value and its rank.
+"""
+from datetime import datetime
+from typing import Any, Dict, List
+from uuid import UUID
+
+from sqlalchemy import func, literal_column, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..models import Coin, Valuation
+
+# GROUPING(country, denomination, decade, grade) bitmask -> breakdown name
+DIMENSIONS = {
+    0b0111: "by_country",
+    0b1011: "by_denomination",
+    0b1101: "by_decade",
+    0b1110: "by_grade",
+}
+TOTAL = 0b1111
+
+
+def _money(value: Any) -> float:
+    return round(float(value or 0), 2)
+
+
+def collection_analytics(db: Session, user_id: UUID, top: int = 20) -> Dict[str, Any]:
+    """Totals and per-dimension breakdowns of a user's collection value."""
+    base = (
+        select(
+            Coin.country,
+            Coin.denomination,
+            ((Coin.year // 10) * 10).label("decade"),
+            Coin.condition_grade,
+            Coin.is_for_sale,
+            Coin.acquisition_price,
+            Valuation.estimated_value_avg.label("value"),
+        )
+        .select_from(Coin)
+        .outerjoin(Valuation, Valuation.id == Coin.latest_valuation_id)
+        .where(Coin.user_id == user_id)
+        .subquery()
+    )
+    group_set = func.grouping(base.c.country, base.c.denomination, base.c.decade, base.c.condition_grade)
+    total_value = func.coalesce(func.sum(base.c.value), 0)
+    for_sale = base.c.is_for_sale.is_(True)
+
+    query = (
+        select(
+            group_set.label("group_set"),
+            base.c.country,
+            base.c.denomination,
+            base.c.decade,
+            base.c.condition_grade,
+            func.count().label("coins"),
+            func.count(base.c.value).label("valued_coins"),
+            total_value.label("value"),
+            func.coalesce(func.sum(base.c.acquisition_price), 0).label("acquisition_cost"),
+            # Cost and value of the coins that have both, so the gain compares like with like
+            func.coalesce(func.sum(base.c.acquisition_price).filter(base.c.value.isnot(None)), 0).label("valued_cost"),
+            func.coalesce(func.sum(base.c.value).filter(base.c.acquisition_price.isnot(None)), 0).label("acquired_value"),
+            func.count().filter(for_sale).label("for_sale_coins"),
+            func.coalesce(func.sum(base.c.value).filter(for_sale), 0).label("for_sale_value"),
+            (total_value / func.nullif(func.sum(total_value).over(partition_by=group_set), 0)).label("share"),
+            func.rank().over(partition_by=group_set, order_by=total_value.desc()).label("rank"),
+        )
+        .group_by(func.grouping_sets(
+            tuple_(base.c.country),
+            tuple_(base.c.denomination),
+            tuple_(base.c.decade),
+            tuple_(base.c.condition_grade),
+            literal_column("()"),
+        ))
+    )
+
+    result: Dict[str, Any] = {name: [] for name in DIMENSIONS.values()}
+    totals = None
+    for row in db.execute(query):
+        if row.group_set == TOTAL:
+            totals = row
+            continue
+        name = DIMENSIONS.get(row.group_set)
+        if name is None or row.rank > top:
+            continue
+        key = {
+            "by_country": row.country,
+            "by_denomination": row.denomination,
+            "by_decade": f"{row.decade}s" if row.decade is not None else None,
+            "by_grade": row.condition_grade,
+        }[name]
+        result[name].append({
+            "key": key or "Unknown",
+            "coins": row.coins,
+            "value": _money(row.value),
+            "share": round(float(row.share or 0), 4),
+            "acquisition_cost": _money(row.acquisition_cost),
+            "for_sale_coins": row.for_sale_coins,
+        })
+
+    for name in DIMENSIONS.values():
+        rows: List[Dict[str, Any]] = result[name]
+        rows.sort(key=lambda entry: (-entry["value"], -entry["coins"]))
+
+    cost = _money(totals.valued_cost) if totals else 0.0
+    acquired_value = _money(totals.acquired_value) if totals else 0.0
+    unvalued_cost = _money(totals.acquisition_cost - totals.valued_cost) if totals else 0.0
+    result.update({
+        "total_coins": totals.coins if totals else 0,
+        "valued_coins": totals.valued_coins if totals else 0,
+        "total_value": _money(totals.value) if totals else 0.0,
+        "acquisition": {
+            "cost": cost,
+            "current_value": acquired_value,
+            "gain": round(acquired_value - cost, 2),
+            "unvalued_cost": unvalued_cost,
+        },
+        "for_sale": {
+            "coins": totals.for_sale_coins if totals else 0,
+            "value": _money(totals.for_sale_value) if totals else 0.0,
+        },
+        "generated_at": datetime.utcnow().isoformat(),
+    })
+    return result
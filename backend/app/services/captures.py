@@ -0,0 +1,177 @@
+"""
+Temporary microscope captures.
+
+Captures land in ``<IMAGES_PATH>/temp`` with a JSON sidecar holding the image
+metadata computed at capture time. A capture is either promoted into a coin's
+image directory (an atomic rename, so nothing is copied) or evicted by the
+janitor once it is too old or the temp directory exceeds its size budget.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from PIL import Image
+
+# Image types become part of the promoted file name
+IMAGE_TYPE = re.compile(r"^[a-z_]{1,20}$")
+
+
+class CaptureStore:
+    """Manage temporary captures under the images directory"""
+
+    METADATA_SUFFIX = ".json"
+
+    def __init__(self):
+        self.images_path = os.getenv("IMAGES_PATH", "/app/images")
+        self.temp_dir = os.path.join(self.images_path, "temp")
+        self.max_age_seconds = int(os.getenv("CAPTURE_TEMP_MAX_AGE_SECONDS", "21600"))
+        self.max_total_bytes = int(os.getenv("CAPTURE_TEMP_MAX_BYTES", str(512 * 1024 * 1024)))
+        self.janitor_interval = int(os.getenv("CAPTURE_JANITOR_INTERVAL_SECONDS", "300"))
+
+    def _metadata_path(self, capture_path: str) -> str:
+        return capture_path + self.METADATA_SUFFIX
+
+    def _image_metadata(self, image_path: str) -> Dict[str, Any]:
+        # Image.open only parses the header, so this stays cheap for large files.
+        with Image.open(image_path) as img:
+            width, height = img.size
+            image_format = img.format
+        return {
+            "width": width,
+            "height": height,
+            "format": image_format,
+            "file_size": os.path.getsize(image_path),
+        }
+
+    def write_metadata(self, capture_path: str, sharpness: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Record metadata for a fresh capture next to the image."""
+        metadata = self._image_metadata(capture_path)
+        metadata["sharpness"] = sharpness
+        metadata["captured_at"] = datetime.utcnow().isoformat()
+        self._store_metadata(capture_path, metadata)
+        return metadata
+
+    def _store_metadata(self, capture_path: str, metadata: Dict[str, Any]) -> None:
+        tmp_path = f"{self._metadata_path(capture_path)}.{uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(metadata, handle)
+        os.replace(tmp_path, self._metadata_path(capture_path))
+
+    def read_metadata(self, capture_path: str) -> Dict[str, Any]:
+        """Return the stored metadata, recomputing it if the sidecar is missing."""
+        try:
+            with open(self._metadata_path(capture_path), "r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return self._image_metadata(capture_path)
+
+    def resolve(self, file_path: str) -> str:
+        """Resolve a ``temp/...`` path, rejecting anything outside the temp directory."""
+        temp_root = os.path.abspath(self.temp_dir)
+        capture_path = os.path.abspath(os.path.join(self.images_path, file_path))
+        if os.path.dirname(capture_path) != temp_root or capture_path.endswith(self.METADATA_SUFFIX):
+            raise ValueError("Invalid capture path")
+        return capture_path
+
+    def promote(self, file_path: str, coin_id: str, image_type: str) -> Tuple[str, Dict[str, Any]]:
+        """Move a capture into the coin directory.
+
+        Returns the image path relative to IMAGES_PATH and the capture metadata.
+        Raises FileNotFoundError if the capture has already been promoted or
+        evicted, and ValueError for a bad path or image type.
+        """
+        if not IMAGE_TYPE.match(image_type):
+            raise ValueError("Invalid image type")
+        capture_path = self.resolve(file_path)
+        if not os.path.isfile(capture_path):
+            raise FileNotFoundError(file_path)
+
+        metadata = self.read_metadata(capture_path)
+
+        coin_dir = os.path.join(self.images_path, str(coin_id))
+        os.makedirs(coin_dir, exist_ok=True)
+        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        file_extension = os.path.splitext(capture_path)[1]
+        filename = f"{image_type}_{timestamp}_{uuid4().hex[:8]}{file_extension}"
+
+        # temp/ lives under IMAGES_PATH, so this is a same-filesystem rename.
+        os.replace(capture_path, os.path.join(coin_dir, filename))
+        try:
+            os.remove(self._metadata_path(capture_path))
+        except OSError:
+            pass
+
+        return f"{coin_id}/{filename}", metadata
+
+    def restore(self, relative_path: str, file_path: str, metadata: Dict[str, Any]) -> None:
+        """Undo promote(), e.g. when the image row could not be saved."""
+        capture_path = self.resolve(file_path)
+        os.replace(os.path.join(self.images_path, relative_path), capture_path)
+        self._store_metadata(capture_path, metadata)
+
+    def evict(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Delete expired captures, then the oldest ones until under the size budget."""
+        now = time.time() if now is None else now
+        captures: List[Tuple[float, int, str]] = []
+        try:
+            entries = list(os.scandir(self.temp_dir))
+        except FileNotFoundError:
+            return {"removed": 0, "freed_bytes": 0, "remaining_bytes": 0}
+
+        for entry in entries:
+            if not entry.is_file() or entry.name.endswith(self.METADATA_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            size = stat.st_size
+            try:
+                size += os.path.getsize(self._metadata_path(entry.path))
+            except OSError:
+                pass
+            captures.append((stat.st_mtime, size, entry.path))
+
+        captures.sort()
+        total = sum(size for _, size, _ in captures)
+        removed = freed = 0
+        for mtime, size, path in captures:
+            expired = now - mtime > self.max_age_seconds
+            if not expired and total <= self.max_total_bytes:
+                break
+            for target in (path, self._metadata_path(path)):
+                try:
+                    os.remove(target)
+                except OSError:
+                    pass
+            total -= size
+            freed += size
+            removed += 1
+
+        # Sidecars whose capture was removed out from under us.
+        for entry in entries:
+            if entry.name.endswith(self.METADATA_SUFFIX) and not os.path.exists(entry.path[:-len(self.METADATA_SUFFIX)]):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+        return {"removed": removed, "freed_bytes": freed, "remaining_bytes": total}
+
+    async def run_janitor(self) -> None:
+        """Periodically evict temp captures until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.evict)
+            except Exception as e:
+                print(f"Capture janitor error: {str(e)}")
+            await asyncio.sleep(self.janitor_interval)
+
+
+# Global instance
+capture_store = CaptureStore()
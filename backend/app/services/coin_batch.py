@@ -0,0 +1,154 @@
+"""
+Mixed create/update/delete of coins in one transaction.
+
+Operations are checked up front (ids present, owned by the user, not repeated);
+if any is invalid, nothing is written. Otherwise creates run as one executemany
+INSERT, updates that set the same values share one ``UPDATE ... WHERE id IN``
+(so bulk tagging, relocating or marking for sale is a single statement), and
+deletes are a single ``DELETE`` whose children go with the foreign-key
+cascades. Image files of deleted coins are removed after the commit.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..models import Coin, CoinImage
+from ..schemas import CoinBatchOperation, CoinCreate
+from .coin_data import sanitize_coin_payload
+
+COIN_FIELDS = tuple(CoinCreate.model_fields)
+
+
+class BatchRejected(Exception):
+    """Raised when an operation is invalid; carries the per-operation results"""
+
+    def __init__(self, results: List[Dict[str, Any]]):
+        super().__init__("Batch rejected")
+        self.results = results
+
+
+def _validate(db: Session, user_id: UUID, operations: List[CoinBatchOperation]) -> List[Dict[str, Any]]:
+    results = [{"index": index, "op": operation.op, "id": operation.id, "success": True} for index, operation in enumerate(operations)]
+    target_ids = {operation.id for operation in operations if operation.op != "create" and operation.id}
+    owned = set(db.scalars(
+        select(Coin.id).where(Coin.id.in_(target_ids), Coin.user_id == user_id)
+    )) if target_ids else set()
+
+    seen = set()
+    for result, operation in zip(results, operations):
+        error = None
+        if operation.op == "create":
+            if operation.id is not None:
+                error = "Create operations cannot set an id"
+        elif operation.id is None:
+            error = "id is required"
+        elif operation.id not in owned:
+            error = "Coin not found"
+        elif operation.id in seen:
+            error = "Coin appears in more than one operation"
+        elif operation.op == "update" and operation.data is None:
+            error = "data is required"
+        if operation.id is not None:
+            seen.add(operation.id)
+        if error:
+            result.update(success=False, error=error)
+
+    if any(not result["success"] for result in results):
+        raise BatchRejected(results)
+    return results
+
+
+def _create(db: Session, user_id: UUID, creates: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
+    # executemany needs the same columns in every row; rows without an
+    # inventory number leave it to the sequence default
+    for with_number in (True, False):
+        group = [(result, row) for result, row in creates if ("inventory_number" in row) == with_number]
+        if not group:
+            continue
+        columns = COIN_FIELDS if with_number else tuple(field for field in COIN_FIELDS if field != "inventory_number")
+        params = [{**{column: row.get(column) for column in columns}, "user_id": user_id} for _, row in group]
+        created = db.execute(
+            insert(Coin).returning(Coin.id, Coin.inventory_number, sort_by_parameter_order=True),
+            params
+        )
+        for (result, _), (coin_id, inventory_number) in zip(group, created):
+            result.update(id=coin_id, inventory_number=inventory_number)
+
+
+def apply_batch(db: Session, user_id: UUID, operations: List[CoinBatchOperation]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Apply all operations in one transaction; returns (results, image files to remove)."""
+    try:
+        results = _validate(db, user_id, operations)
+
+        creates = []
+        updates: Dict[Tuple[Tuple[str, Any], ...], List[UUID]] = defaultdict(list)
+        deletes = []
+        for result, operation in zip(results, operations):
+            data = operation.data.model_dump(exclude_unset=True) if operation.data is not None else {}
+            if operation.op == "create":
+                row = sanitize_coin_payload(
+                    CoinCreate(**data).model_dump(),
+                    allow_inventory_default=True
+                )
+                creates.append((result, row))
+            elif operation.op == "update":
+                changes = sanitize_coin_payload(data)
+                if changes:
+                    updates[tuple(sorted(changes.items()))].append(operation.id)
+            else:
+                deletes.append(operation.id)
+
+        if creates:
+            _create(db, user_id, creates)
+        for changes, coin_ids in updates.items():
+            db.execute(
+                update(Coin)
+                .where(Coin.id.in_(coin_ids), Coin.user_id == user_id)
+                .values(**dict(changes))
+            )
+        image_paths: List[str] = []
+        if deletes:
+            image_paths = list(db.scalars(select(CoinImage.file_path).where(CoinImage.coin_id.in_(deletes))))
+            db.execute(delete(Coin).where(Coin.id.in_(deletes), Coin.user_id == user_id))
+
+        db.commit()
+        return results, image_paths
+    except Exception:
+        db.rollback()
+        raise
+
+
+async def remove_image_files(images_path: str, image_paths: List[str], concurrency: int = 8) -> None:
+    """Delete image files (and then-empty coin directories) on worker threads."""
+    images_root = os.path.abspath(images_path)
+    slots = asyncio.Semaphore(concurrency)
+
+    def remove(image_path: str) -> None:
+        path = os.path.abspath(os.path.join(images_root, image_path))
+        if os.path.commonpath([path, images_root]) != images_root:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove image {image_path}: {str(e)}")
+
+    async def remove_bounded(image_path: str) -> None:
+        async with slots:
+            await asyncio.to_thread(remove, image_path)
+
+    await asyncio.gather(*(remove_bounded(image_path) for image_path in image_paths))
+
+    for directory in {os.path.dirname(os.path.abspath(os.path.join(images_root, image_path))) for image_path in image_paths}:
+        if directory == images_root or os.path.commonpath([directory, images_root]) != images_root:
+            continue
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass  # Not empty or already gone
@@ -0,0 +1,61 @@
+"""
+Validation rules shared by every path that writes coin records.
+"""
+from typing import Optional
+
+_MAX_LENGTHS = {
+    "inventory_number": 20,
+    "country": 100,
+    "denomination": 100,
+    "mint_mark": 20,
+    "composition": 200,
+    "condition_grade": 50,
+    "condition_notes": 1000,
+    "defects": 1000,
+    "catalog_number": 100,
+    "variety": 100,
+    "error_type": 100,
+    "notes": 2000,
+    "acquisition_source": 200,
+    "location": 200,
+}
+
+
+def normalize_mint_mark(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    cleaned = value.strip()
+    if not cleaned:
+        return None
+    lower = cleaned.lower()
+    if "philadelphia" in lower and ("none" in lower or "no mint" in lower):
+        return "None"
+    return cleaned
+
+
+def sanitize_coin_payload(data: dict, allow_inventory_default: bool = False) -> dict:
+    """Drop empty values, normalize the mint mark and truncate strings to their column lengths."""
+    sanitized = dict(data)
+    if allow_inventory_default and not sanitized.get("inventory_number"):
+        sanitized.pop("inventory_number", None)
+
+    for key in list(sanitized.keys()):
+        value = sanitized.get(key)
+        if value is None:
+            sanitized.pop(key, None)
+            continue
+        if key == "inventory_number" and isinstance(value, str) and not value.strip():
+            sanitized.pop(key, None)
+            continue
+        if key == "mint_mark":
+            value = normalize_mint_mark(value)
+            if value is None:
+                sanitized.pop(key, None)
+                continue
+            sanitized[key] = value
+        if key in _MAX_LENGTHS and isinstance(sanitized.get(key), str):
+            max_len = _MAX_LENGTHS[key]
+            if len(sanitized[key]) > max_len:
+                sanitized[key] = sanitized[key][:max_len]
+
+    return sanitized
@@ -0,0 +1,194 @@
+"""
+Bulk import of coins from CSV or JSON Lines.
+
+Input is parsed a row at a time, validated with the same schema and sanitizing
+rules as ``POST /api/coins/``, and inserted in multi-row batches, one
+transaction per batch. A batch the database rejects is retried row by row so
+only the offending rows fail.
+
+Rows carry an import key, either their own ``import_key`` column or
+``<idempotency key>:<row number>``. A unique (user, import key) constraint makes
+re-running an import insert only the rows that are not there yet.
+"""
+import csv
+import io
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..models import Coin
+from ..schemas import CoinCreate
+from .coin_data import sanitize_coin_payload
+
+FORMATS = ("csv", "jsonl", "ndjson")
+COIN_FIELDS = tuple(CoinCreate.model_fields)
+MAX_IMPORT_KEY_LENGTH = 100
+
+
+def parse_rows(stream: io.BufferedIOBase, import_format: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (row number, record) pairs; a line that cannot be parsed yields its exception."""
+    import_format = import_format.lower().lstrip(".")
+    if import_format not in FORMATS:
+        raise ValueError(f"Unsupported import format: {import_format}")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if import_format == "csv":
+            for row_number, row in enumerate(csv.DictReader(text), start=1):
+                yield row_number, {(name or "").strip().lower(): value for name, value in row.items()}
+        else:
+            row_number = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    yield row_number, json.loads(line)
+                except ValueError as e:
+                    yield row_number, e
+    finally:
+        text.detach()
+
+
+def prepare_row(record: Any, user_id: UUID, idempotency_key: Optional[str], row_number: int) -> Dict[str, Any]:
+    """Validate and sanitize one record into coins column values; raises ValueError."""
+    if isinstance(record, Exception):
+        raise ValueError(f"Unreadable row: {str(record)}")
+    if not isinstance(record, dict):
+        raise ValueError("Row must be an object")
+    cleaned = {
+        key: (value.strip() or None) if isinstance(value, str) else value
+        for key, value in record.items()
+    }
+    try:
+        coin = CoinCreate.model_validate({key: value for key, value in cleaned.items() if key in COIN_FIELDS and value is not None})
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        ))
+
+    row = sanitize_coin_payload(coin.model_dump(), allow_inventory_default=True)
+    import_key = cleaned.get("import_key")
+    if import_key is None and idempotency_key:
+        import_key = f"{idempotency_key}:{row_number}"
+    if import_key is not None:
+        import_key = str(import_key)
+        if len(import_key) > MAX_IMPORT_KEY_LENGTH:
+            raise ValueError(f"import_key: longer than {MAX_IMPORT_KEY_LENGTH} characters")
+    row.update(user_id=user_id, import_key=import_key)
+    return row
+
+
+class CoinImporter:
+    """Validate and insert coin rows in batches with per-row error reporting"""
+
+    def __init__(self):
+        self.batch_size = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+        self.max_errors = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+    def _insert(self, db: Session, rows: List[Dict[str, Any]]) -> List[Tuple[Optional[str], str]]:
+        """Insert rows, skipping re-imported ones; returns (import_key, inventory_number) of inserted rows.
+
+        Only the (user, import key) constraint is a skip; any other conflict,
+        such as an inventory number that is already taken, fails the batch.
+        """
+        inserted = []
+        # Multi-row VALUES needs the same columns in every row; rows without an
+        # inventory number leave it to the sequence default
+        for with_number in (True, False):
+            group = [row for row in rows if ("inventory_number" in row) == with_number]
+            if not group:
+                continue
+            columns = COIN_FIELDS if with_number else tuple(field for field in COIN_FIELDS if field != "inventory_number")
+            values = [
+                {**{column: row.get(column) for column in columns}, "user_id": row["user_id"], "import_key": row["import_key"]}
+                for row in group
+            ]
+            statement = (
+                insert(Coin)
+                .values(values)
+                .on_conflict_do_nothing(constraint="uq_coins_user_import_key")
+                .returning(Coin.import_key, Coin.inventory_number)
+            )
+            inserted.extend(tuple(row) for row in db.execute(statement))
+        return inserted
+
+    def _flush(self, db: Session, batch: List[Tuple[int, Dict[str, Any]]], report: Dict[str, Any]) -> None:
+        rows = [row for _, row in batch]
+        try:
+            inserted = self._insert(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Isolate the rows the database rejects
+            inserted = []
+            for row_number, row in batch:
+                try:
+                    inserted.extend(self._insert(db, [row]))
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    self._error(report, row_number, str(getattr(e, "orig", e)).strip())
+                    rows.remove(row)
+
+        # Rows without an import key cannot be skipped: they were inserted or failed
+        inserted_keys = {key for key, _ in inserted if key is not None}
+        for row in rows:
+            duplicate = row["import_key"] is not None and row["import_key"] not in inserted_keys
+            report["duplicates" if duplicate else "inserted"] += 1
+        batch.clear()
+
+    def _error(self, report: Dict[str, Any], row_number: int, message: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < self.max_errors:
+            report["errors"].append({"row": row_number, "error": message})
+        else:
+            report["errors_truncated"] = True
+
+    def import_rows(
+        self,
+        db: Session,
+        user_id: UUID,
+        records: Iterator[Tuple[int, Any]],
+        idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Import (row number, record) pairs; returns counts and row-level errors."""
+        report: Dict[str, Any] = {
+            "rows": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "failed": 0,
+            "errors": [],
+            "errors_truncated": False,
+        }
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        for row_number, record in records:
+            report["rows"] += 1
+            try:
+                batch.append((row_number, prepare_row(record, user_id, idempotency_key, row_number)))
+            except ValueError as e:
+                self._error(report, row_number, str(e))
+                continue
+            if len(batch) >= self.batch_size:
+                self._flush(db, batch, report)
+        if batch:
+            self._flush(db, batch, report)
+        return report
+
+    def import_file(
+        self,
+        db: Session,
+        user_id: UUID,
+        stream: io.BufferedIOBase,
+        import_format: str,
+        idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return self.import_rows(db, user_id, parse_rows(stream, import_format), idempotency_key)
+
+
+# Global instance
+coin_importer = CoinImporter()
@@ -0,0 +1,496 @@
+"""
+Comparable-sales price index.
+
+Sold prices come from our own eBay listings and from imported CSV/JSON feeds.
+Each sale is normalized to a comparison key (country, denomination, year, mint
+mark) plus a Sheldon grade bucket, and ``comparable_price_index`` keeps price
+quantiles per key over a rolling window. Ingestion only recomputes the keys it
+touched, so lookups are a single indexed read.
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import Numeric, delete, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import Coin, ComparablePrice, ComparableSale, EbayListing
+
+Key = Tuple[str, str, int, str]
+
+# Lower bounds of the grade ranges collectors price as one market
+# (AG, G, VG, F, VF, XF, AU, MS60-62, MS63-64, MS65-66, MS67+).
+GRADE_BUCKETS = [1, 3, 4, 8, 12, 20, 40, 50, 60, 63, 65, 67]
+ALL_GRADES = 0
+
+GRADE_ABBREVIATIONS = {
+    "PO": 1, "P": 1, "FR": 2, "AG": 3, "G": 4, "VG": 8, "F": 12, "VF": 20,
+    "EF": 40, "XF": 40, "AU": 50, "MS": 60, "UNC": 60, "BU": 63,
+    "PF": 60, "PR": 60, "PRF": 60, "PROOF": 60, "SP": 60,
+}
+
+# Longest phrases first so "very good" is not read as "good".
+GRADE_NAMES = [
+    ("brilliant uncirculated", 63),
+    ("about uncirculated", 50),
+    ("almost uncirculated", 50),
+    ("extremely fine", 40),
+    ("extra fine", 40),
+    ("mint state", 60),
+    ("uncirculated", 60),
+    ("about good", 3),
+    ("very good", 8),
+    ("very fine", 20),
+    ("proof", 60),
+    ("poor", 1),
+    ("fair", 2),
+    ("good", 4),
+    ("fine", 12),
+]
+
+COUNTRY_ALIASES = {
+    "us": "united states",
+    "usa": "united states",
+    "u s": "united states",
+    "u s a": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "britain": "united kingdom",
+}
+
+DENOMINATION_NAMES = {
+    "penny": "1 cent",
+    "cent": "1 cent",
+    "one cent": "1 cent",
+    "lincoln cent": "1 cent",
+    "nickel": "5 cent",
+    "five cents": "5 cent",
+    "dime": "10 cent",
+    "ten cents": "10 cent",
+    "quarter": "25 cent",
+    "quarter dollar": "25 cent",
+    "half dollar": "50 cent",
+    "half": "50 cent",
+    "dollar": "1 dollar",
+    "one dollar": "1 dollar",
+    "silver dollar": "1 dollar",
+}
+
+NO_MINT_MARK = {"", "NONE", "NA", "NOMINT", "NOMARK", "NOMINTMARK"}
+
+
+def _clean(value: Any) -> str:
+    text = re.sub(r"[^\w\s$¢]", " ", str(value or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def normalize_country(value: Any) -> str:
+    country = _clean(value)
+    return COUNTRY_ALIASES.get(country, country)
+
+
+def normalize_denomination(value: Any) -> str:
+    denomination = _clean(value).replace("¢", " cent").strip()
+    denomination = re.sub(r"\s+", " ", denomination)
+    if denomination in DENOMINATION_NAMES:
+        return DENOMINATION_NAMES[denomination]
+    match = re.fullmatch(r"(\d+)\s*(c|ct|cts|cent|cents)", denomination)
+    if match:
+        return f"{int(match.group(1))} cent"
+    match = re.fullmatch(r"\$\s*(\d+)|(\d+)\s*(dollar|dollars)", denomination)
+    if match:
+        return f"{int(match.group(1) or match.group(2))} dollar"
+    return denomination
+
+
+def normalize_mint_mark(value: Any) -> str:
+    mint = re.sub(r"[^A-Z0-9]", "", str(value or "").upper())
+    return "" if mint in NO_MINT_MARK else mint
+
+
+def grade_to_sheldon(value: Any) -> Optional[int]:
+    """Read a grade such as ``MS-65``, ``VF 30``, ``Very Fine`` or ``45`` as a Sheldon number."""
+    if value is None:
+        return None
+    text = str(value).strip().upper()
+    if not text:
+        return None
+
+    match = re.search(r"\b([A-Z]{1,5})\s*-?\s*(\d{1,2})\b", text)
+    if match and match.group(1) in GRADE_ABBREVIATIONS and 1 <= int(match.group(2)) <= 70:
+        return int(match.group(2))
+    match = re.fullmatch(r"(\d{1,2})", text)
+    if match and 1 <= int(match.group(1)) <= 70:
+        return int(match.group(1))
+
+    words = _clean(text)
+    if words.upper() in GRADE_ABBREVIATIONS:
+        return GRADE_ABBREVIATIONS[words.upper()]
+    for name, grade in GRADE_NAMES:
+        if name in words:
+            return grade
+    return None
+
+
+def grade_bucket(sheldon: Optional[int]) -> Optional[int]:
+    if sheldon is None:
+        return None
+    return max(bucket for bucket in GRADE_BUCKETS if bucket <= max(1, sheldon))
+
+
+def comparison_key(coin: Dict[str, Any]) -> Optional[Key]:
+    """Normalized (country, denomination, year, mint) key, or None if incomplete."""
+    country = normalize_country(coin.get("country"))
+    denomination = normalize_denomination(coin.get("denomination"))
+    try:
+        year = int(coin.get("year"))
+    except (TypeError, ValueError):
+        return None
+    if not country or not denomination:
+        return None
+    return country, denomination, year, normalize_mint_mark(coin.get("mint_mark"))
+
+
+def _parse_price(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    try:
+        price = Decimal(re.sub(r"[^\d.]", "", str(value)))
+    except InvalidOperation:
+        return None
+    return price if price > 0 else None
+
+
+def _parse_sold_at(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if not value:
+        return None
+    text = str(value).strip().replace("Z", "+00:00")
+    try:
+        return datetime.fromisoformat(text).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def normalize_sale(record: Dict[str, Any], source: str) -> Optional[Dict[str, Any]]:
+    """Turn a raw sale record into a comparable_sales row, or None if unusable."""
+    key = comparison_key(record)
+    price = _parse_price(record.get("price") or record.get("sold_price"))
+    if key is None or price is None:
+        return None
+
+    sold_at = _parse_sold_at(record.get("sold_at") or record.get("date")) or datetime.utcnow()
+    sheldon = grade_to_sheldon(record.get("grade") or record.get("condition_grade"))
+    source_ref = record.get("source_ref") or record.get("id") or record.get("item_id")
+    if not source_ref:
+        # Stable reference so re-importing the same feed is a no-op
+        digest = hashlib.sha1(
+            json.dumps([*key, sheldon, str(price), sold_at.isoformat()]).encode("utf-8")
+        )
+        source_ref = digest.hexdigest()
+
+    country_key, denomination_key, year, mint_key = key
+    return {
+        "source": source,
+        "source_ref": str(source_ref)[:255],
+        "title": (str(record["title"])[:255] if record.get("title") else None),
+        "country": record.get("country"),
+        "denomination": record.get("denomination"),
+        "mint_mark": record.get("mint_mark"),
+        "grade": record.get("grade") or record.get("condition_grade"),
+        "country_key": country_key,
+        "denomination_key": denomination_key,
+        "year": year,
+        "mint_key": mint_key,
+        "grade_numeric": sheldon,
+        "grade_bucket": grade_bucket(sheldon),
+        "price": price,
+        "currency": (record.get("currency") or "USD").upper()[:3],
+        "sold_at": sold_at,
+    }
+
+
+def parse_feed(stream: io.BufferedIOBase, feed_format: str) -> Iterator[Dict[str, Any]]:
+    """Yield sale records from a CSV, JSON array or JSON Lines feed."""
+    feed_format = feed_format.lower().lstrip(".")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if feed_format == "csv":
+            for row in csv.DictReader(text):
+                yield {(name or "").strip().lower(): value for name, value in row.items()}
+        elif feed_format in ("jsonl", "ndjson"):
+            for line in text:
+                if line.strip():
+                    yield json.loads(line)
+        elif feed_format == "json":
+            data = json.load(text)
+            yield from (data.get("sales", []) if isinstance(data, dict) else data)
+        else:
+            raise ValueError(f"Unsupported feed format: {feed_format}")
+    finally:
+        text.detach()
+
+
+class ComparablesService:
+    """Ingest sold prices and answer price lookups from the index"""
+
+    def __init__(self):
+        self.window_days = int(os.getenv("COMPARABLES_WINDOW_DAYS", "365"))
+        self.min_samples = int(os.getenv("COMPARABLES_MIN_SAMPLES", "3"))
+        self.currency = os.getenv("COMPARABLES_CURRENCY", "USD")
+        self.batch_size = int(os.getenv("COMPARABLES_BATCH_SIZE", "1000"))
+        self.refresh_interval = int(os.getenv("COMPARABLES_REFRESH_INTERVAL_SECONDS", "86400"))
+
+    def ingest_records(self, db: Session, records: Iterable[Dict[str, Any]], source: str) -> Dict[str, int]:
+        """Insert new sales in batches and refresh the affected index keys."""
+        inserted = skipped = 0
+        touched: Set[Key] = set()
+        batch: List[Dict[str, Any]] = []
+
+        def flush() -> None:
+            nonlocal inserted
+            if not batch:
+                return
+            statement = (
+                insert(ComparableSale)
+                .values(batch)
+                .on_conflict_do_nothing(constraint="uq_comparable_sales_source_ref")
+                .returning(
+                    ComparableSale.country_key,
+                    ComparableSale.denomination_key,
+                    ComparableSale.year,
+                    ComparableSale.mint_key,
+                )
+            )
+            rows = db.execute(statement).all()
+            inserted += len(rows)
+            touched.update(tuple(row) for row in rows)
+            batch.clear()
+
+        for record in records:
+            row = normalize_sale(record, source)
+            if row is None:
+                skipped += 1
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                flush()
+        flush()
+
+        if touched:
+            self.refresh_index(db, touched)
+        db.commit()
+        return {"inserted": inserted, "skipped": skipped, "keys_refreshed": len(touched)}
+
+    def ingest_sold_listings(self, db: Session) -> Dict[str, int]:
+        """Ingest our eBay listings sold since the last ingestion."""
+        watermark = db.query(func.max(ComparableSale.sold_at)).filter(
+            ComparableSale.source == "ebay"
+        ).scalar()
+
+        query = (
+            db.query(EbayListing, Coin)
+            .join(Coin, EbayListing.coin_id == Coin.id)
+            .filter(EbayListing.status == "sold", EbayListing.sold_price.isnot(None))
+        )
+        if watermark:
+            # Re-read a day of overlap; duplicates are dropped by the unique key
+            query = query.filter(EbayListing.sold_at >= watermark - timedelta(days=1))
+
+        records = (
+            {
+                "source_ref": listing.ebay_item_id or str(listing.id),
+                "title": listing.listing_title,
+                "country": coin.country,
+                "denomination": coin.denomination,
+                "year": coin.year,
+                "mint_mark": coin.mint_mark,
+                "grade": coin.condition_grade,
+                "price": listing.sold_price,
+                "sold_at": listing.sold_at,
+            }
+            for listing, coin in query.yield_per(self.batch_size)
+        )
+        return self.ingest_records(db, records, "ebay")
+
+    def refresh_index(self, db: Session, keys: Optional[Iterable[Key]] = None) -> None:
+        """Recompute window quantiles for the given keys (all keys if None)."""
+        sale = ComparableSale
+        key_columns = (sale.country_key, sale.denomination_key, sale.year, sale.mint_key)
+        index_key = tuple_(
+            ComparablePrice.country_key,
+            ComparablePrice.denomination_key,
+            ComparablePrice.year,
+            ComparablePrice.mint_key,
+        )
+
+        def quantile(fraction: float):
+            # Postgres shares one sort between ordered-set aggregates on the same input
+            return func.round(func.percentile_cont(fraction).within_group(sale.price).cast(Numeric), 2)
+
+        rows = (
+            select(
+                *key_columns,
+                func.coalesce(sale.grade_bucket, ALL_GRADES),
+                func.count(),
+                quantile(0.1),
+                quantile(0.25),
+                quantile(0.5),
+                quantile(0.75),
+                quantile(0.9),
+                func.round(func.avg(sale.price), 2),
+                func.round(func.avg(sale.grade_numeric), 1),
+                func.max(sale.sold_at),
+                literal(datetime.utcnow()),
+            )
+            .where(
+                sale.currency == self.currency,
+                sale.sold_at >= datetime.utcnow() - timedelta(days=self.window_days),
+            )
+            .group_by(func.grouping_sets(tuple_(*key_columns, sale.grade_bucket), tuple_(*key_columns)))
+            # Ungraded sales only count towards the all-grades row
+            .having((func.grouping(sale.grade_bucket) == 1) | sale.grade_bucket.isnot(None))
+        )
+
+        clear = delete(ComparablePrice)
+        if keys is not None:
+            keys = list(keys)
+            if not keys:
+                return
+            rows = rows.where(tuple_(*key_columns).in_(keys))
+            clear = clear.where(index_key.in_(keys))
+
+        db.execute(clear)
+        db.execute(
+            insert(ComparablePrice).from_select(
+                [
+                    "country_key", "denomination_key", "year", "mint_key", "grade_bucket",
+                    "sample_count", "price_p10", "price_p25", "price_median", "price_p75",
+                    "price_p90", "price_mean", "grade_mean", "last_sold_at", "updated_at",
+                ],
+                rows,
+            )
+        )
+
+    def lookup_many(self, db: Session, coins: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Index rows for many coins in one query: each coin's grade bucket and all grades."""
+        keys = [comparison_key(coin) for coin in coins]
+        buckets = [
+            grade_bucket(grade_to_sheldon(coin.get("condition_grade") or coin.get("grade")))
+            for coin in coins
+        ]
+        wanted = {key for key in keys if key is not None}
+
+        rows: Dict[Tuple[Key, int], ComparablePrice] = {}
+        wanted_list = list(wanted)
+        for start in range(0, len(wanted_list), self.batch_size):
+            chunk = wanted_list[start:start + self.batch_size]
+            for row in db.query(ComparablePrice).filter(
+                tuple_(
+                    ComparablePrice.country_key,
+                    ComparablePrice.denomination_key,
+                    ComparablePrice.year,
+                    ComparablePrice.mint_key,
+                ).in_(chunk)
+            ):
+                key = (row.country_key, row.denomination_key, row.year, row.mint_key)
+                rows[(key, row.grade_bucket)] = row
+
+        return [
+            {
+                "key": key,
+                "grade_bucket": bucket,
+                "exact": rows.get((key, bucket)) if key is not None and bucket is not None else None,
+                "all_grades": rows.get((key, ALL_GRADES)) if key is not None else None,
+            }
+            for key, bucket in zip(keys, buckets)
+        ]
+
+    def lookup(self, db: Session, coin: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the index rows for a coin's key: its grade bucket and all grades."""
+        return self.lookup_many(db, [coin])[0]
+
+    def recent_sales(self, db: Session, key: Key, bucket: Optional[int] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        query = db.query(ComparableSale).filter(
+            tuple_(
+                ComparableSale.country_key,
+                ComparableSale.denomination_key,
+                ComparableSale.year,
+                ComparableSale.mint_key,
+            ).in_([key])
+        )
+        if bucket is not None:
+            query = query.filter(ComparableSale.grade_bucket == bucket)
+        sales = query.order_by(ComparableSale.sold_at.desc()).limit(limit).all()
+        return [
+            {
+                "source": sale.source,
+                "title": sale.title,
+                "grade": sale.grade,
+                "price": float(sale.price),
+                "currency": sale.currency,
+                "sold_at": sale.sold_at.isoformat(),
+            }
+            for sale in sales
+        ]
+
+    def price_stats(self, row: ComparablePrice) -> Dict[str, Any]:
+        def as_float(value: Any) -> Optional[float]:
+            return float(value) if value is not None else None
+
+        return {
+            "grade_bucket": row.grade_bucket,
+            "sample_count": row.sample_count,
+            "p10": as_float(row.price_p10),
+            "p25": as_float(row.price_p25),
+            "median": as_float(row.price_median),
+            "p75": as_float(row.price_p75),
+            "p90": as_float(row.price_p90),
+            "mean": as_float(row.price_mean),
+            "grade_mean": as_float(row.grade_mean),
+            "last_sold_at": row.last_sold_at.isoformat() if row.last_sold_at else None,
+            "window_days": self.window_days,
+        }
+
+    def sync(self) -> Dict[str, int]:
+        """Ingest newly sold listings and rebuild the whole index (rolls the window)."""
+        db = SessionLocal()
+        try:
+            result = self.ingest_sold_listings(db)
+            self.refresh_index(db)
+            db.commit()
+            return result
+        finally:
+            db.close()
+
+    def ingest_new_sales(self) -> Dict[str, int]:
+        """Ingest newly sold listings in a session of its own."""
+        db = SessionLocal()
+        try:
+            return self.ingest_sold_listings(db)
+        finally:
+            db.close()
+
+    async def run(self) -> None:
+        """Periodically ingest sales and roll the index window until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception as e:
+                print(f"Comparables refresh error: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+# Global instance
+comparables_service = ComparablesService()
@@ -0,0 +1,241 @@
+"""
+Pooled, rate-limited execution of eBay Trading API calls.
+
+``ebaysdk`` connections are blocking and keep per-call state, so each worker
+thread owns its own connection (and with it a keep-alive HTTP session). Calls
+are admitted through a per-call-type daily quota and token bucket before they
+are handed to the bounded worker pool, so async routes never block on eBay.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..metrics import observe_call
+
+
+class EbayCallLimitExceeded(Exception):
+    """Raised when a call would exceed eBay's daily or rate limits."""
+
+
+class TokenBucket:
+    """Classic token bucket; ``rate`` tokens per second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available; otherwise return the seconds to wait."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            if self.rate <= 0:
+                return float("inf")
+            return (tokens - self._tokens) / self.rate
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            elapsed = self._clock() - self._updated
+            return min(self.capacity, self._tokens + elapsed * self.rate)
+
+
+class DailyQuota:
+    """Count calls per UTC day, matching how eBay resets application limits."""
+
+    def __init__(self, limit: int, today: Callable[[], Any] = lambda: datetime.utcnow().date()):
+        self.limit = int(limit)
+        self._today = today
+        self._day = today()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def _roll(self) -> None:
+        day = self._today()
+        if day != self._day:
+            self._day = day
+            self._used = 0
+
+    def try_consume(self) -> bool:
+        with self._lock:
+            self._roll()
+            if self.limit and self._used >= self.limit:
+                return False
+            self._used += 1
+            return True
+
+    def refund(self) -> None:
+        with self._lock:
+            self._used = max(0, self._used - 1)
+
+    @property
+    def used(self) -> int:
+        with self._lock:
+            self._roll()
+            return self._used
+
+
+def parse_call_limits(value: Optional[str]) -> Dict[str, Tuple[int, Optional[float]]]:
+    """Parse ``"AddItem=5000:2,GetItem=100000"`` into {call: (daily, per_second)}."""
+    limits: Dict[str, Tuple[int, Optional[float]]] = {}
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry or "=" not in entry:
+            continue
+        call_name, spec = entry.split("=", 1)
+        daily, _, per_second = spec.partition(":")
+        try:
+            limits[call_name.strip()] = (int(daily), float(per_second) if per_second else None)
+        except ValueError:
+            continue
+    return limits
+
+
+def worker_share(limit, workers: int):
+    """One server worker's share of an account-wide limit; 0 or None (unlimited) stays as is."""
+    if not limit or workers <= 1:
+        return limit
+    if isinstance(limit, int):
+        return max(1, limit // workers)
+    return limit / workers
+
+
+class EbayCallPool:
+    """Run eBay calls on a bounded thread pool with per-call-type limits."""
+
+    def __init__(
+        self,
+        connection_factory: Callable[[], Any],
+        max_workers: int = 4,
+        calls_per_second: float = 5.0,
+        burst: float = 10.0,
+        daily_limit: int = 5000,
+        call_limits: Optional[Dict[str, Tuple[int, Optional[float]]]] = None,
+        max_wait: float = 30.0
+    ):
+        self._connection_factory = connection_factory
+        self.max_workers = max(1, int(max_workers))
+        self.calls_per_second = calls_per_second
+        self.burst = burst
+        self.daily_limit = daily_limit
+        self.call_limits = call_limits or {}
+        self.max_wait = max_wait
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ebay")
+        self._local = threading.local()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._quotas: Dict[str, DailyQuota] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "waiting_for_rate_limit": 0,
+            "queued": 0,
+            "in_flight": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+        }
+        self._per_call: Dict[str, Dict[str, float]] = {}
+
+    def _limits_for(self, call_name: str) -> Tuple[TokenBucket, DailyQuota]:
+        with self._lock:
+            if call_name not in self._buckets:
+                daily, per_second = self.call_limits.get(call_name, (self.daily_limit, None))
+                rate = per_second or self.calls_per_second
+                self._buckets[call_name] = TokenBucket(rate, max(1.0, min(self.burst, rate * 2)))
+                self._quotas[call_name] = DailyQuota(daily)
+                self._per_call[call_name] = {"calls": 0, "errors": 0, "throttled": 0, "total_seconds": 0.0}
+            return self._buckets[call_name], self._quotas[call_name]
+
+    def _bump(self, key: str, delta: int = 1, call_name: Optional[str] = None, call_key: Optional[str] = None) -> None:
+        with self._lock:
+            self._stats[key] += delta
+            if call_name and call_key:
+                self._per_call[call_name][call_key] += 1
+
+    def _connection(self) -> Any:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connection_factory()
+            self._local.connection = connection
+        return connection
+
+    def _run(self, call_name: str, data: Any) -> Any:
+        self._bump("queued", -1)
+        self._bump("in_flight")
+        started = time.perf_counter()
+        try:
+            with observe_call("ebay", call_name):
+                return self._connection().execute(call_name, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stats["in_flight"] -= 1
+                self._per_call[call_name]["total_seconds"] += elapsed
+
+    async def _admit(self, call_name: str) -> None:
+        bucket, quota = self._limits_for(call_name)
+        if not quota.try_consume():
+            self._bump("rejected", call_name=call_name, call_key="throttled")
+            raise EbayCallLimitExceeded(f"Daily eBay call limit reached for {call_name}")
+
+        deadline = time.monotonic() + self.max_wait
+        self._bump("waiting_for_rate_limit")
+        try:
+            while True:
+                wait = bucket.try_acquire()
+                if wait == 0:
+                    return
+                if time.monotonic() + wait > deadline:
+                    quota.refund()
+                    self._bump("rejected", call_name=call_name, call_key="throttled")
+                    raise EbayCallLimitExceeded(f"eBay rate limit exceeded for {call_name}")
+                await asyncio.sleep(wait)
+        finally:
+            self._bump("waiting_for_rate_limit", -1)
+
+    async def execute(self, call_name: str, data: Any = None) -> Any:
+        """Execute a Trading API call in the worker pool."""
+        await self._admit(call_name)
+        self._bump("queued")
+        loop = asyncio.get_running_loop()
+        try:
+            # Carry the request context over so the call's span nests under it
+            context = contextvars.copy_context()
+            response = await loop.run_in_executor(self._executor, context.run, self._run, call_name, data)
+        except Exception:
+            self._bump("failed", call_name=call_name, call_key="errors")
+            raise
+        finally:
+            self._bump("completed", call_name=call_name, call_key="calls")
+        return response
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, in-flight calls and per-call-type usage."""
+        with self._lock:
+            stats = dict(self._stats)
+            per_call = {name: dict(values) for name, values in self._per_call.items()}
+            buckets = dict(self._buckets)
+            quotas = dict(self._quotas)
+        for name, values in per_call.items():
+            values["daily_used"] = quotas[name].used
+            values["daily_limit"] = quotas[name].limit
+            values["tokens_available"] = round(buckets[name].available, 2)
+            values["total_seconds"] = round(values["total_seconds"], 3)
+        stats["max_workers"] = self.max_workers
+        stats["calls"] = per_call
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -1,9 +1,14 @@
-from ebaysdk.trading import Connection as Trading
-from ebaysdk.exception import ConnectionError
+import asyncio
 import os
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+from .ebay_client import EbayCallPool, EbayCallLimitExceeded, parse_call_limits, worker_share
+from .lazy import LazyService
+
+if TYPE_CHECKING:
+    from ebaysdk.trading import Connection as Trading
+
 class EbayService:
     """Service for eBay API integration"""
     
@@ -23,40 +28,84 @@ class EbayService:
         self.listing_duration = os.getenv("EBAY_LISTING_DURATION", "Days_7")
         self.dispatch_time_max = os.getenv("EBAY_DISPATCH_TIME_MAX", "3")
         self.default_condition_id = os.getenv("EBAY_CONDITION_ID", "3000")
+        # AddItems accepts at most 5 items per call
+        self.add_items_batch_size = min(5, max(1, int(os.getenv("EBAY_ADD_ITEMS_BATCH_SIZE", "5"))))
+        # EBAY_API_DOMAIN/EBAY_API_HTTPS point the client at another endpoint,
+        # e.g. the local fake Trading API in stubs/ebay_trading.py.
+        self.domain = os.getenv("EBAY_API_DOMAIN") or (
+            'api.sandbox.ebay.com' if self.environment == 'sandbox' else 'api.ebay.com'
+        )
+        self.use_https = os.getenv("EBAY_API_HTTPS", "true").lower() == "true"
+        self.timeout = int(os.getenv("EBAY_TIMEOUT", "20"))
         
-        self.api = None
+        self.pool = None
         if all([self.app_id, self.dev_id, self.cert_id, self.token]):
             try:
-                self.api = Trading(
-                    domain='api.sandbox.ebay.com' if self.environment == 'sandbox' else 'api.ebay.com',
-                    appid=self.app_id,
-                    devid=self.dev_id,
-                    certid=self.cert_id,
-                    token=self.token,
-                    config_file=None
+                # Fail fast on bad configuration rather than in a worker thread
+                self._build_connection()
+                # Limits apply to the whole account; each server worker gets an equal share
+                workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+                self.pool = EbayCallPool(
+                    self._build_connection,
+                    max_workers=int(os.getenv("EBAY_MAX_WORKERS", "4")),
+                    calls_per_second=worker_share(float(os.getenv("EBAY_CALLS_PER_SECOND", "5")), workers),
+                    burst=worker_share(float(os.getenv("EBAY_CALL_BURST", "10")), workers),
+                    daily_limit=worker_share(int(os.getenv("EBAY_DAILY_CALL_LIMIT", "5000")), workers),
+                    call_limits={
+                        call_name: (worker_share(daily, workers), worker_share(per_second, workers))
+                        for call_name, (daily, per_second) in parse_call_limits(os.getenv("EBAY_CALL_LIMITS")).items()
+                    },
+                    max_wait=float(os.getenv("EBAY_RATE_LIMIT_MAX_WAIT", "30"))
                 )
             except Exception as e:
                 print(f"eBay API initialization error: {str(e)}")
+
+    def _build_connection(self) -> "Trading":
+        """Create a Trading connection; each pool worker keeps its own."""
+        # Imported on first use: deployments without eBay never load ebaysdk
+        from ebaysdk.trading import Connection as Trading
+
+        api = Trading(
+            domain=self.domain,
+            appid=self.app_id,
+            devid=self.dev_id,
+            certid=self.cert_id,
+            token=self.token,
+            timeout=self.timeout,
+            config_file=None
+        )
+        if not self.use_https:
+            api.config.set('https', False, force=True)
+        return api
+
+    def metrics(self) -> Dict[str, Any]:
+        """Worker pool and rate limit metrics"""
+        if not self.pool:
+            return {"enabled": False}
+        return {"enabled": True, **self.pool.metrics()}
+
+    def shutdown(self) -> None:
+        if self.pool:
+            self.pool.shutdown()
     
-    def create_listing(self, coin_data: Dict[str, Any], listing_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create an eBay listing for a coin"""
-        
-        if not self.api:
-            return self._mock_listing(coin_data, listing_data)
+    def _build_item(self, listing_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict[str, Any]], Optional[str]]:
+        """Validate listing data and build the Trading API item.
 
+        Returns (call_name, item, error); call_name and item are None on error.
+        """
         title = (listing_data.get("listing_title") or "").strip()
         if not title:
-            return {"success": False, "error": "Listing title is required"}
+            return None, None, "Listing title is required"
         if len(title) > 80:
             title = title[:80]
 
         description = (listing_data.get("listing_description") or "").strip()
         if not description:
-            return {"success": False, "error": "Listing description is required"}
+            return None, None, "Listing description is required"
 
         start_price = listing_data.get("starting_price")
         if start_price is None:
-            return {"success": False, "error": "Starting price is required"}
+            return None, None, "Starting price is required"
 
         buy_it_now_price = listing_data.get("buy_it_now_price")
         listing_type = "FixedPriceItem" if buy_it_now_price else "Chinese"
@@ -65,60 +114,71 @@ class EbayService:
         payment_methods = listing_data.get("payment_methods") or ["PayPal"]
         paypal_email = listing_data.get("paypal_email") or self.paypal_email
         if "PayPal" in payment_methods and not paypal_email:
-            return {
-                "success": False,
-                "error": "EBAY_PAYPAL_EMAIL is required when using PayPal"
-            }
+            return None, None, "EBAY_PAYPAL_EMAIL is required when using PayPal"
         
-        try:
-            # Prepare listing
-            item = {
-                "Item": {
-                    "Title": title,
-                    "Description": description,
-                    "PrimaryCategory": {"CategoryID": "11116"},  # Coins: US category
-                    "StartPrice": start_price,
-                    "CategoryMappingAllowed": "true",
-                    "Country": self.country,
-                    "Currency": "USD",
-                    "DispatchTimeMax": self.dispatch_time_max,
-                    "ListingDuration": self.listing_duration,
-                    "ListingType": listing_type,
-                    "PaymentMethods": payment_methods,
-                    "PostalCode": self.postal_code,
-                    "Location": self.location,
-                    "Quantity": "1",
-                    "ConditionID": listing_data.get("condition_id") or self.default_condition_id,
-                    "ReturnPolicy": {
-                        "ReturnsAcceptedOption": "ReturnsAccepted",
-                        "RefundOption": "MoneyBack",
-                        "ReturnsWithinOption": "Days_30",
-                        "ShippingCostPaidByOption": "Buyer"
-                    },
-                    "ShippingDetails": {
-                        "ShippingType": "Flat",
-                        "ShippingServiceOptions": {
-                            "ShippingServicePriority": "1",
-                            "ShippingService": listing_data.get("shipping_service") or self.shipping_service,
-                            "ShippingServiceCost": listing_data.get("shipping_cost") or self.shipping_cost
-                        }
-                    },
-                    "Site": self.site
-                }
+        # Prepare listing
+        item = {
+            "Item": {
+                "Title": title,
+                "Description": description,
+                "PrimaryCategory": {"CategoryID": "11116"},  # Coins: US category
+                "StartPrice": start_price,
+                "CategoryMappingAllowed": "true",
+                "Country": self.country,
+                "Currency": "USD",
+                "DispatchTimeMax": self.dispatch_time_max,
+                "ListingDuration": self.listing_duration,
+                "ListingType": listing_type,
+                "PaymentMethods": payment_methods,
+                "PostalCode": self.postal_code,
+                "Location": self.location,
+                "Quantity": "1",
+                "ConditionID": listing_data.get("condition_id") or self.default_condition_id,
+                "ReturnPolicy": {
+                    "ReturnsAcceptedOption": "ReturnsAccepted",
+                    "RefundOption": "MoneyBack",
+                    "ReturnsWithinOption": "Days_30",
+                    "ShippingCostPaidByOption": "Buyer"
+                },
+                "ShippingDetails": {
+                    "ShippingType": "Flat",
+                    "ShippingServiceOptions": {
+                        "ShippingServicePriority": "1",
+                        "ShippingService": listing_data.get("shipping_service") or self.shipping_service,
+                        "ShippingServiceCost": listing_data.get("shipping_cost") or self.shipping_cost
+                    }
+                },
+                "Site": self.site
             }
+        }
 
-            if "PayPal" in payment_methods and paypal_email:
-                item["Item"]["PayPalEmailAddress"] = paypal_email
+        if "PayPal" in payment_methods and paypal_email:
+            item["Item"]["PayPalEmailAddress"] = paypal_email
 
-            if buy_it_now_price:
-                item["Item"]["BuyItNowPrice"] = buy_it_now_price
+        if buy_it_now_price:
+            item["Item"]["BuyItNowPrice"] = buy_it_now_price
 
-            image_urls = listing_data.get("image_urls") or []
-            if image_urls:
-                item["Item"]["PictureDetails"] = {"PictureURL": image_urls}
-            
+        image_urls = listing_data.get("image_urls") or []
+        if image_urls:
+            item["Item"]["PictureDetails"] = {"PictureURL": image_urls}
+
+        return call_name, item, None
+
+    async def create_listing(self, coin_data: Dict[str, Any], listing_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create an eBay listing for a coin"""
+        
+        if not self.pool:
+            return self._mock_listing(coin_data, listing_data)
+
+        from ebaysdk.exception import ConnectionError
+
+        call_name, item, error = self._build_item(listing_data)
+        if error:
+            return {"success": False, "error": error}
+
+        try:
             # Add listing
-            response = self.api.execute(call_name, item)
+            response = await self.pool.execute(call_name, item)
             
             return {
                 "success": True,
@@ -129,6 +189,12 @@ class EbayService:
                 "response": response.dict()
             }
             
+        except EbayCallLimitExceeded as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "rate_limited": True
+            }
         except ConnectionError as e:
             return {
                 "success": False,
@@ -141,14 +207,101 @@ class EbayService:
                 "error": str(e)
             }
     
-    def get_listing_status(self, item_id: str) -> Dict[str, Any]:
+    async def create_listings_bulk(
+        self,
+        entries: List[Tuple[Dict[str, Any], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Create many listings via AddItems, up to 5 items per call.
+
+        ``entries`` is a list of (coin_data, listing_data); the returned results
+        are in the same order, one per entry, in create_listing's format.
+        """
+        if not self.pool:
+            return [self._mock_listing(coin_data, listing_data) for coin_data, listing_data in entries]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+        pending: List[Tuple[int, Dict[str, Any]]] = []
+        for index, (_, listing_data) in enumerate(entries):
+            _, item, error = self._build_item(listing_data)
+            if error:
+                results[index] = {"success": False, "error": error}
+            else:
+                pending.append((index, item["Item"]))
+
+        batches = [
+            pending[start:start + self.add_items_batch_size]
+            for start in range(0, len(pending), self.add_items_batch_size)
+        ]
+        batch_results = await asyncio.gather(*(self._add_items(batch) for batch in batches))
+        for batch_result in batch_results:
+            for index, result in batch_result.items():
+                results[index] = result
+
+        return results
+
+    async def _add_items(self, batch: List[Tuple[int, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+        """Submit one AddItems call; the entry index doubles as the MessageID."""
+        from ebaysdk.exception import ConnectionError
+
+        request = {
+            "AddItemRequestContainer": [
+                {"MessageID": str(index), "Item": item} for index, item in batch
+            ]
+        }
+        try:
+            response = await self.pool.execute("AddItems", request)
+            payload = response.dict()
+        except EbayCallLimitExceeded as e:
+            return {index: {"success": False, "error": str(e), "rate_limited": True} for index, _ in batch}
+        except ConnectionError as e:
+            # Partial failures are reported per container; anything else fails the batch
+            payload = e.response.dict() if getattr(e, "response", None) is not None else {}
+            if not payload.get("AddItemResponseContainer"):
+                return {index: {"success": False, "error": str(e)} for index, _ in batch}
+        except Exception as e:
+            return {index: {"success": False, "error": str(e)} for index, _ in batch}
+
+        containers = payload.get("AddItemResponseContainer") or []
+        if isinstance(containers, dict):
+            containers = [containers]
+
+        results: Dict[int, Dict[str, Any]] = {}
+        for container in containers:
+            try:
+                index = int(container.get("CorrelationID"))
+            except (TypeError, ValueError):
+                continue
+            if container.get("ItemID"):
+                results[index] = {
+                    "success": True,
+                    "item_id": container.get("ItemID"),
+                    "fees": container.get("Fees"),
+                    "start_time": container.get("StartTime"),
+                    "end_time": container.get("EndTime"),
+                    "response": container
+                }
+            else:
+                errors = container.get("Errors") or []
+                if isinstance(errors, dict):
+                    errors = [errors]
+                message = "; ".join(
+                    error.get("LongMessage") or error.get("ShortMessage") or "Unknown error"
+                    for error in errors
+                ) or "Item was not listed"
+                results[index] = {"success": False, "error": message, "details": container}
+
+        for index, _ in batch:
+            results.setdefault(index, {"success": False, "error": "No response for item"})
+        return results
+
+    async def get_listing_status(self, item_id: str) -> Dict[str, Any]:
         """Get the status of an eBay listing"""
         
-        if not self.api:
+        if not self.pool:
             return self._mock_status(item_id)
         
         try:
-            response = self.api.execute('GetItem', {'ItemID': item_id})
+            response = await self.pool.execute('GetItem', {'ItemID': item_id})
             item = response.reply.Item
             
             return {
@@ -161,6 +314,12 @@ class EbayService:
                 "watchers": int(item.WatchCount) if hasattr(item, 'WatchCount') else 0
             }
             
+        except EbayCallLimitExceeded as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "rate_limited": True
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -193,5 +352,5 @@ class EbayService:
             "watchers": 2
         }
 
-# Global instance
-ebay_service = EbayService()
+# Global instance, built on first use
+ebay_service = LazyService(EbayService)
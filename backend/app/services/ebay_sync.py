@@ -0,0 +1,269 @@
+"""
+Background synchronization of eBay listing status into ``ebay_listings``.
+
+Rather than calling GetItem for every status request, a background loop asks
+eBay for the items modified since the last sync (GetSellerEvents with a
+ModTimeFrom/ModTimeTo window) and applies the changes in one transaction.
+Listings that were not modified in the window are still marked as synced, so
+status reads can be served from the database within a freshness bound.
+
+The window starts at the oldest ``last_synced_at`` of the open listings, so it
+survives restarts and outages without separate state. Only listings the
+window covers are stamped; one last confirmed before the lookback limit (or
+never) is fetched with GetItem instead, up to ``EBAY_SYNC_REFRESH_LIMIT`` per
+pass.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, update
+
+from ..cache import user_cache
+from ..database import SessionLocal
+from ..models import Coin, EbayListing
+from .comparables import comparables_service
+from .ebay_client import EbayCallLimitExceeded
+from .ebay_service import ebay_service
+
+# GetSellerEvents rejects modification windows longer than 48 hours.
+MAX_WINDOW = timedelta(hours=48)
+
+
+def _confirmed_at():
+    """When a listing's status was last known: last sync, else when it was listed."""
+    return func.coalesce(EbayListing.last_synced_at, EbayListing.listed_at, EbayListing.created_at)
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value)[:19], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _parse_price(value: Any) -> Optional[Decimal]:
+    if isinstance(value, dict):
+        value = value.get("value")
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def listing_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a Trading API Item (as a dict) onto EbayListing columns."""
+    selling = item.get("SellingStatus") or {}
+    details = item.get("ListingDetails") or {}
+    listing_status = selling.get("ListingStatus")
+    end_time = _parse_time(details.get("EndTime"))
+    price = _parse_price(selling.get("CurrentPrice"))
+    try:
+        quantity_sold = int(selling.get("QuantitySold") or 0)
+    except ValueError:
+        quantity_sold = 0
+
+    fields: Dict[str, Any] = {"current_price": price}
+    if quantity_sold > 0:
+        fields.update({
+            "status": "sold",
+            "sold_price": price,
+            "sold_at": end_time or datetime.utcnow(),
+            "ended_at": end_time,
+            "buyer_username": (selling.get("HighBidder") or {}).get("UserID"),
+        })
+    elif listing_status == "Active":
+        fields["status"] = "active"
+    elif listing_status in ("Completed", "Ended"):
+        fields.update({"status": "ended", "ended_at": end_time})
+    return fields
+
+
+class EbayStatusSync:
+    """Poll eBay for modified listings and keep ebay_listings current"""
+
+    def __init__(self, ebay_service):
+        self.ebay_service = ebay_service
+        self.interval = int(os.getenv("EBAY_SYNC_INTERVAL_SECONDS", "300"))
+        self.max_age = timedelta(seconds=int(os.getenv("EBAY_STATUS_MAX_AGE_SECONDS", "900")))
+        self.lookback = timedelta(hours=int(os.getenv("EBAY_SYNC_LOOKBACK_HOURS", "48")))
+        self.batch_size = int(os.getenv("EBAY_SYNC_BATCH_SIZE", "500"))
+        # GetItem calls per pass for open listings the window does not cover
+        self.refresh_limit = int(os.getenv("EBAY_SYNC_REFRESH_LIMIT", "100"))
+        # Windows overlap slightly so clock skew never drops a modification
+        self.overlap = timedelta(seconds=60)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ebay_service.pool is not None
+
+    def is_fresh(self, listing: EbayListing, now: Optional[datetime] = None) -> bool:
+        if listing.last_synced_at is None:
+            return False
+        now = now or datetime.utcnow()
+        return now - listing.last_synced_at.replace(tzinfo=None) <= self.max_age
+
+    async def fetch_changes(self, mod_from: datetime, mod_to: datetime) -> Dict[str, Dict[str, Any]]:
+        """Return {item_id: listing fields} for items modified in the window."""
+        changes: Dict[str, Dict[str, Any]] = {}
+        window_start = mod_from
+        while window_start < mod_to:
+            window_end = min(mod_to, window_start + MAX_WINDOW)
+            response = await self.ebay_service.pool.execute("GetSellerEvents", {
+                "ModTimeFrom": window_start.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "ModTimeTo": window_end.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "DetailLevel": "ReturnAll",
+            })
+            items = (response.dict().get("ItemArray") or {}).get("Item") or []
+            if isinstance(items, dict):
+                items = [items]
+            for item in items:
+                if item.get("ItemID"):
+                    changes[str(item["ItemID"])] = listing_fields(item)
+            window_start = window_end
+        return changes
+
+    def window_start(self, now: datetime) -> Optional[datetime]:
+        """Start of the window covering every open listing, or None without open listings."""
+        db = SessionLocal()
+        try:
+            oldest = db.query(func.min(_confirmed_at())).filter(
+                EbayListing.status == "active",
+                EbayListing.ebay_item_id.isnot(None)
+            ).scalar()
+        finally:
+            db.close()
+        if oldest is None:
+            return None
+        return max(oldest.replace(tzinfo=None) - self.overlap, now - self.lookback)
+
+    def apply_changes(
+        self,
+        changes: Dict[str, Dict[str, Any]],
+        synced_at: datetime,
+        covered_from: Optional[datetime] = None
+    ) -> Tuple[List[UUID], List[str]]:
+        """Apply fetched changes and stamp the open listings the window covered.
+
+        ``covered_from`` is the start of the GetSellerEvents window: an open
+        listing confirmed since then would have shown up if it had changed.
+        Returns (ids of newly sold listings, item ids of open listings the
+        window did not cover).
+        """
+        sold: List[UUID] = []
+        owners: Set[Tuple[UUID, UUID]] = set()
+        uncovered: List[str] = []
+        db = SessionLocal()
+        try:
+            item_ids = list(changes)
+            for start in range(0, len(item_ids), self.batch_size):
+                chunk = item_ids[start:start + self.batch_size]
+                rows = db.query(EbayListing, Coin.user_id).join(Coin).filter(EbayListing.ebay_item_id.in_(chunk))
+                for listing, user_id in rows:
+                    fields = changes[listing.ebay_item_id]
+                    if fields.get("status") == "sold" and listing.status != "sold":
+                        sold.append(listing.id)
+                    for key, value in fields.items():
+                        if value is not None:
+                            setattr(listing, key, value)
+                    listing.last_synced_at = synced_at
+                    owners.add((user_id, listing.coin_id))
+
+            if covered_from is not None:
+                # Unchanged in the window: still open as of synced_at
+                db.execute(
+                    update(EbayListing)
+                    .where(EbayListing.status == "active", _confirmed_at() >= covered_from)
+                    .values(last_synced_at=synced_at)
+                    .execution_options(synchronize_session=False)
+                )
+                uncovered = [item_id for item_id, in db.query(EbayListing.ebay_item_id).filter(
+                    EbayListing.status == "active",
+                    EbayListing.ebay_item_id.isnot(None),
+                    _confirmed_at() < covered_from
+                ).order_by(_confirmed_at()).limit(self.refresh_limit)]
+            db.commit()
+        finally:
+            db.close()
+
+        # Coin details, analytics and for-sale views include listing status
+        for user_id, coin_id in owners:
+            user_cache.invalidate(user_id, coin_id)
+        return sold, uncovered
+
+    async def fetch_items(self, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return {item_id: listing fields} from GetItem, one call per item."""
+        changes: Dict[str, Dict[str, Any]] = {}
+        for item_id in item_ids:
+            try:
+                response = await self.ebay_service.pool.execute("GetItem", {"ItemID": item_id})
+            except EbayCallLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"eBay sync GetItem {item_id} error: {str(e)}")
+                continue
+            changes[item_id] = listing_fields(response.dict().get("Item") or {})
+        return changes
+
+    async def sync_once(self) -> Dict[str, Any]:
+        """Run one incremental sync pass."""
+        if not self.enabled:
+            return {"enabled": False}
+
+        now = datetime.utcnow()
+        mod_from = await asyncio.to_thread(self.window_start, now)
+        if mod_from is None:
+            # Nothing open on eBay to keep current
+            return {"enabled": True, "modified": 0, "refreshed": 0, "sold": 0, "synced_at": now}
+        changes = await self.fetch_changes(mod_from, now)
+        sold, uncovered = await asyncio.to_thread(self.apply_changes, changes, now, mod_from)
+        refreshed: Dict[str, Dict[str, Any]] = {}
+        if uncovered:
+            # Confirmed before the lookback limit: the window says nothing about these
+            refreshed = await self.fetch_items(uncovered)
+            more_sold, _ = await asyncio.to_thread(self.apply_changes, refreshed, datetime.utcnow())
+            sold.extend(more_sold)
+        if sold:
+            # New sold prices feed the comparable-sales index right away
+            try:
+                await asyncio.to_thread(comparables_service.ingest_new_sales)
+            except Exception as e:
+                print(f"Comparables ingestion error: {str(e)}")
+        return {"enabled": True, "modified": len(changes), "refreshed": len(refreshed), "sold": len(sold), "synced_at": now}
+
+    async def refresh_listing(self, listing: EbayListing) -> Dict[str, Any]:
+        """Fetch one listing live (used when the stored status is stale)."""
+        response = await self.ebay_service.pool.execute("GetItem", {"ItemID": listing.ebay_item_id})
+        item = response.dict().get("Item") or {}
+        fields = listing_fields(item)
+        for key, value in fields.items():
+            if value is not None:
+                setattr(listing, key, value)
+        listing.last_synced_at = datetime.utcnow()
+        return item
+
+    async def run(self) -> None:
+        """Sync periodically until cancelled."""
+        if not self.enabled:
+            return
+        while True:
+            try:
+                await self.sync_once()
+            except EbayCallLimitExceeded as e:
+                print(f"eBay sync skipped: {str(e)}")
+            except Exception as e:
+                print(f"eBay sync error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+# Global instance
+ebay_status_sync = EbayStatusSync(ebay_service)
@@ -0,0 +1,248 @@
+"""
+Streaming export of a user's collection.
+
+Rows are read with a server-side cursor (``yield_per``) as plain tuples, with
+the latest valuation and primary image joined in, and written out one batch at
+a time, so memory use stays flat however large the collection is. Formats are
+CSV, JSON Lines and Parquet (when pyarrow is installed). A bundle wraps the
+data file and every image of the exported coins in a zip that is also built
+as it streams.
+"""
+import csv
+import io
+import json
+import os
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from ..database import SessionLocal
+from ..models import Coin, CoinImage, Valuation
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency
+    pa = None
+    pq = None
+
+FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "jsonl": ("jsonl", "application/x-ndjson"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# (output column, SQL expression, Parquet type name)
+_primary_image = (
+    select(CoinImage.file_path)
+    .where(CoinImage.coin_id == Coin.id)
+    .order_by(CoinImage.is_primary.desc(), CoinImage.created_at)
+    .limit(1)
+    .scalar_subquery()
+)
+COLUMNS = [
+    ("id", Coin.id, "string"),
+    ("inventory_number", Coin.inventory_number, "string"),
+    ("country", Coin.country, "string"),
+    ("denomination", Coin.denomination, "string"),
+    ("year", Coin.year, "int32"),
+    ("mint_mark", Coin.mint_mark, "string"),
+    ("composition", Coin.composition, "string"),
+    ("weight_grams", Coin.weight_grams, "float64"),
+    ("diameter_mm", Coin.diameter_mm, "float64"),
+    ("condition_grade", Coin.condition_grade, "string"),
+    ("condition_notes", Coin.condition_notes, "string"),
+    ("defects", Coin.defects, "string"),
+    ("catalog_number", Coin.catalog_number, "string"),
+    ("variety", Coin.variety, "string"),
+    ("error_type", Coin.error_type, "string"),
+    ("notes", Coin.notes, "string"),
+    ("acquisition_date", Coin.acquisition_date, "timestamp"),
+    ("acquisition_price", Coin.acquisition_price, "float64"),
+    ("acquisition_source", Coin.acquisition_source, "string"),
+    ("is_for_sale", Coin.is_for_sale, "bool"),
+    ("location", Coin.location, "string"),
+    ("created_at", Coin.created_at, "timestamp"),
+    ("updated_at", Coin.updated_at, "timestamp"),
+    ("estimated_value_low", Valuation.estimated_value_low, "float64"),
+    ("estimated_value_avg", Valuation.estimated_value_avg, "float64"),
+    ("estimated_value_high", Valuation.estimated_value_high, "float64"),
+    ("valuation_confidence", Valuation.confidence_level, "string"),
+    ("valuation_source", Valuation.valuation_source, "string"),
+    ("valued_at", Valuation.created_at, "timestamp"),
+    ("primary_image", _primary_image, "string"),
+]
+COLUMN_NAMES = [name for name, _, _ in COLUMNS]
+
+
+def _plain(value: Any) -> Any:
+    """Convert a database value to a JSON/CSV/Arrow friendly one."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class _Sink(io.RawIOBase):
+    """Write-only stream whose contents are drained by the generator feeding the response"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class CollectionExporter:
+    """Stream a collection as CSV, JSON Lines or Parquet, optionally zipped with images"""
+
+    def __init__(self):
+        self.images_path = os.getenv("IMAGES_PATH", "/app/images")
+        self.batch_size = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+    def normalize_format(self, export_format: str) -> Tuple[str, str]:
+        """Return (extension, media type); raises ValueError for unknown or unavailable formats."""
+        key = (export_format or "csv").lower()
+        if key not in FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+        if key == "parquet" and pa is None:
+            raise ValueError("Parquet export requires the pyarrow package")
+        return FORMATS[key]
+
+    def batches(self, user_id: UUID) -> Iterator[List[Tuple[Any, ...]]]:
+        """Rows of the user's coins in id order, batch_size at a time, from a server-side cursor."""
+        statement = (
+            select(*[column for _, column, _ in COLUMNS])
+            .select_from(Coin)
+            .outerjoin(Valuation, Valuation.id == Coin.latest_valuation_id)
+            .where(Coin.user_id == user_id)
+            .order_by(Coin.id)
+            .execution_options(yield_per=self.batch_size)
+        )
+        db = SessionLocal()
+        try:
+            result = db.execute(statement)
+            for partition in result.partitions():
+                yield [tuple(_plain(value) for value in row) for row in partition]
+        finally:
+            db.close()
+
+    def _csv(self, user_id: UUID) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMN_NAMES)
+        for batch in self.batches(user_id):
+            writer.writerows(batch)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _jsonl(self, user_id: UUID) -> Iterator[bytes]:
+        for batch in self.batches(user_id):
+            yield "".join(
+                json.dumps(dict(zip(COLUMN_NAMES, row)), default=_json_default) + "\n" for row in batch
+            ).encode("utf-8")
+
+    def _parquet_schema(self):
+        types = {
+            "string": pa.string(),
+            "int32": pa.int32(),
+            "float64": pa.float64(),
+            "bool": pa.bool_(),
+            "timestamp": pa.timestamp("us"),
+        }
+        return pa.schema([(name, types[kind]) for name, _, kind in COLUMNS])
+
+    def _parquet(self, user_id: UUID) -> Iterator[bytes]:
+        """One row group per batch; each is flushed to the client as soon as it is written."""
+        schema = self._parquet_schema()
+        sink = _Sink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="snappy")
+        try:
+            for batch in self.batches(user_id):
+                columns = list(zip(*batch))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def stream(self, user_id: UUID, export_format: str) -> Iterator[bytes]:
+        extension, _ = self.normalize_format(export_format)
+        return {"csv": self._csv, "jsonl": self._jsonl, "parquet": self._parquet}[extension](user_id)
+
+    def _image_paths(self, user_id: UUID) -> Iterator[str]:
+        statement = (
+            select(CoinImage.file_path)
+            .join(Coin, Coin.id == CoinImage.coin_id)
+            .where(Coin.user_id == user_id)
+            .order_by(CoinImage.coin_id, CoinImage.created_at)
+            .execution_options(yield_per=self.batch_size)
+        )
+        db = SessionLocal()
+        try:
+            for (file_path,) in db.execute(statement):
+                yield file_path
+        finally:
+            db.close()
+
+    def _image_file(self, image_path: str) -> Optional[str]:
+        images_root = os.path.abspath(self.images_path)
+        path = os.path.abspath(os.path.join(images_root, image_path))
+        if os.path.commonpath([path, images_root]) != images_root or not os.path.isfile(path):
+            return None
+        return path
+
+    def stream_bundle(self, user_id: UUID, export_format: str) -> Iterator[bytes]:
+        """Zip of the data file plus images/<coin id>/<file> for every stored image."""
+        extension, _ = self.normalize_format(export_format)
+        sink = _Sink()
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as bundle:
+            with bundle.open(f"coins.{extension}", mode="w", force_zip64=True) as entry:
+                for chunk in self.stream(user_id, extension):
+                    entry.write(chunk)
+                    yield sink.drain()
+            for image_path in self._image_paths(user_id):
+                path = self._image_file(image_path)
+                if path is None:
+                    continue
+                # Images are already compressed; store them as-is
+                info = zipfile.ZipInfo.from_file(path, arcname=f"images/{image_path}")
+                info.compress_type = zipfile.ZIP_STORED
+                with open(path, "rb") as source, bundle.open(info, mode="w", force_zip64=True) as entry:
+                    while True:
+                        data = source.read(1024 * 1024)
+                        if not data:
+                            break
+                        entry.write(data)
+                        yield sink.drain()
+        yield sink.drain()
+
+
+# Global instance
+collection_exporter = CollectionExporter()
@@ -0,0 +1,119 @@
+"""
+Image encoding for microscope captures and previews.
+
+JPEG encoding goes through libjpeg-turbo via PyTurboJPEG when it is installed,
+using a small pool of encoder handles so concurrent requests don't share one.
+Without it, OpenCV's encoder is used (the opencv-python wheels bundle
+libjpeg-turbo as well). PNG and TIFF captures are always lossless.
+"""
+import os
+import queue
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_GRAY, TJSAMP_420
+except Exception:  # Optional dependency (package or native library missing)
+    TurboJPEG = None
+
+
+FORMATS = {
+    "jpg": ("jpg", "image/jpeg"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "png": ("png", "image/png"),
+    "tiff": ("tiff", "image/tiff"),
+    "tif": ("tiff", "image/tiff"),
+}
+
+
+def is_jpeg(data: bytes) -> bool:
+    """Return True if the buffer looks like a complete JPEG bitstream."""
+    return len(data) > 4 and data[:2] == b"\xff\xd8" and data[-2:] == b"\xff\xd9"
+
+
+class ImageEncoder:
+    """Encode BGR frames to JPEG, PNG or TIFF."""
+
+    def __init__(self):
+        self.pool_size = max(1, int(os.getenv("IMAGE_ENCODER_POOL_SIZE", "2")))
+        self.png_compression = int(os.getenv("IMAGE_PNG_COMPRESSION", "3"))
+        self._pool: Optional[queue.Queue] = None
+        if TurboJPEG is not None:
+            try:
+                pool = queue.Queue(maxsize=self.pool_size)
+                for _ in range(self.pool_size):
+                    pool.put(TurboJPEG())
+                self._pool = pool
+            except Exception as e:
+                print(f"libjpeg-turbo unavailable, using OpenCV encoder: {str(e)}")
+
+    @property
+    def backend(self) -> str:
+        return "turbojpeg" if self._pool is not None else "opencv"
+
+    def normalize_format(self, image_format: Optional[str]) -> Tuple[str, str]:
+        """Return (extension, mime type) for a requested format."""
+        key = (image_format or "jpg").lower().lstrip(".")
+        if key not in FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        return FORMATS[key]
+
+    @contextmanager
+    def _turbo(self) -> Iterator["TurboJPEG"]:
+        handle = self._pool.get()
+        try:
+            yield handle
+        finally:
+            self._pool.put(handle)
+
+    def encode_jpeg(self, frame: np.ndarray, quality: int = 90) -> bytes:
+        quality = min(100, max(1, int(quality)))
+        if self._pool is not None:
+            pixel_format = TJPF_GRAY if frame.ndim == 2 else TJPF_BGR
+            with self._turbo() as jpeg:
+                return jpeg.encode(
+                    np.ascontiguousarray(frame),
+                    quality=quality,
+                    pixel_format=pixel_format,
+                    jpeg_subsample=TJSAMP_420
+                )
+
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("Failed to encode JPEG")
+        return buffer.tobytes()
+
+    def encode(
+        self,
+        frame: np.ndarray,
+        image_format: Optional[str] = "jpg",
+        quality: Optional[int] = None
+    ) -> Tuple[bytes, str]:
+        """Encode a frame and return (bytes, mime type).
+
+        ``quality`` is the JPEG quality (1-100). It is ignored for the lossless
+        formats: PNG uses the ``IMAGE_PNG_COMPRESSION`` level (0-9) and TIFF is
+        written with LZW compression.
+        """
+        extension, mime_type = self.normalize_format(image_format)
+        if extension == "jpg":
+            return self.encode_jpeg(frame, 90 if quality is None else quality), mime_type
+
+        if extension == "png":
+            params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        else:
+            params = []
+            if hasattr(cv2, "IMWRITE_TIFF_COMPRESSION"):
+                params = [cv2.IMWRITE_TIFF_COMPRESSION, 5]  # LZW
+
+        ok, buffer = cv2.imencode(f".{extension}", frame, params)
+        if not ok:
+            raise ValueError(f"Failed to encode {extension.upper()}")
+        return buffer.tobytes(), mime_type
+
+
+# Global instance
+image_encoder = ImageEncoder()
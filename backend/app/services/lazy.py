@@ -0,0 +1,51 @@
+"""Construct-on-first-use service singletons."""
+import threading
+from typing import Any, Callable
+
+
+class LazyService:
+    """Stands in for a service singleton and builds it on first use.
+
+    Attribute reads and writes are forwarded to the real instance, so
+    ``from .vision_ai import vision_ai_service`` and its call sites work
+    unchanged, while client construction and connection checks happen when
+    the first request needs the service rather than at import.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def resolve(self) -> Any:
+        """The service instance, built on the first call."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def reset(self) -> None:
+        """Forget the instance (after closing it); the next use builds a new one."""
+        with self._lock:
+            object.__setattr__(self, "_instance", None)
+
+    @property
+    def is_built(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.resolve(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        state = "built" if self.is_built else "not built"
+        return f"<LazyService {getattr(self._factory, '__name__', self._factory)} ({state})>"
@@ -1,16 +1,38 @@
 import cv2
 import os
 import glob
-from typing import List, Optional, Tuple, Union
-from datetime import datetime
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
 import numpy as np
 
+from ..metrics import record_frame
+from .image_encoder import image_encoder, is_jpeg
+from .lazy import LazyService
+
 class MicroscopeService:
     """Service for interacting with digital microscope via OpenCV"""
     
     def __init__(self):
         self.current_camera = None
         self.camera_index: Union[int, str] = 0
+        # Sharpest-frame selection: frames are scored for up to focus_window
+        # seconds (or focus_max_frames frames) and the best one is saved.
+        self.focus_window = float(os.getenv("MICROSCOPE_FOCUS_WINDOW_SECONDS", "0.6"))
+        self.focus_max_frames = int(os.getenv("MICROSCOPE_FOCUS_MAX_FRAMES", "12"))
+        self.focus_scale_width = int(os.getenv("MICROSCOPE_FOCUS_SCALE_WIDTH", "480"))
+        self.capture_format = os.getenv("MICROSCOPE_CAPTURE_FORMAT", "jpg")
+        self.capture_quality = int(os.getenv("MICROSCOPE_CAPTURE_QUALITY", "95"))
+        self.preview_quality = int(os.getenv("MICROSCOPE_PREVIEW_QUALITY", "80"))
+        self.preview_max_width = int(os.getenv("MICROSCOPE_PREVIEW_MAX_WIDTH", "1280"))
+        self.passthrough_enabled = os.getenv("MICROSCOPE_MJPEG_PASSTHROUGH", "true").lower() == "true"
+        # None until probed: whether the open camera hands out raw MJPEG buffers.
+        self._passthrough_supported: Optional[bool] = None
+        self._raw_mode = False
+        # Camera calls run in worker threads (and for every server worker via
+        # the camera host); one VideoCapture must only be used by one at a time.
+        # Reentrant because capture and preview reopen the camera themselves.
+        self._lock = threading.RLock()
 
     def _select_backend(self) -> int:
         if os.name == "posix" and hasattr(cv2, "CAP_V4L2"):
@@ -61,12 +83,67 @@ class MicroscopeService:
         if hasattr(cv2, "CAP_PROP_BUFFERSIZE"):
             cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
+    def _set_raw_mode(self, enabled: bool) -> bool:
+        """Toggle OpenCV's RGB conversion so reads return raw MJPEG buffers."""
+        if self._raw_mode == enabled:
+            return True
+        if not hasattr(cv2, "CAP_PROP_CONVERT_RGB"):
+            return False
+        if not self.current_camera.set(cv2.CAP_PROP_CONVERT_RGB, 0 if enabled else 1):
+            return False
+        self._raw_mode = enabled
+        return True
+
+    def _camera_is_mjpeg(self) -> bool:
+        if not hasattr(cv2, "CAP_PROP_FOURCC"):
+            return False
+        fourcc = int(self.current_camera.get(cv2.CAP_PROP_FOURCC))
+        return fourcc == cv2.VideoWriter_fourcc(*"MJPG")
+
+    def _read_raw_jpeg(self) -> Optional[bytes]:
+        """Read one compressed frame straight from an MJPG camera, or None."""
+        if not self.passthrough_enabled or self._passthrough_supported is False:
+            return None
+        if self.current_camera is None or not self.current_camera.isOpened():
+            return None
+        if self._passthrough_supported is None and not self._camera_is_mjpeg():
+            self._passthrough_supported = False
+            return None
+        if not self._set_raw_mode(True):
+            self._passthrough_supported = False
+            return None
+
+        for _ in range(5):
+            started = time.perf_counter()
+            ret, buffer = self.current_camera.read()
+            record_frame("passthrough", time.perf_counter() - started, bool(ret) and buffer is not None)
+            if not ret or buffer is None:
+                continue
+            data = buffer.tobytes()
+            if is_jpeg(data):
+                self._passthrough_supported = True
+                return data
+            # The backend decoded anyway; fall back to encoding ourselves.
+            break
+
+        self._passthrough_supported = False
+        self._set_raw_mode(False)
+        return None
+
+    def _decode_for_scoring(self, data: bytes) -> Optional[np.ndarray]:
+        """Decode a JPEG at reduced size in grayscale, which is all scoring needs."""
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+
     def _read_frame(self) -> Optional[np.ndarray]:
         if self.current_camera is None or not self.current_camera.isOpened():
             return None
+        if not self._set_raw_mode(False):
+            return None
         frame = None
         for _ in range(5):
+            started = time.perf_counter()
             ret, frame = self.current_camera.read()
+            record_frame("decoded", time.perf_counter() - started, bool(ret))
             if ret:
                 return frame
         return None
@@ -79,6 +156,75 @@ class MicroscopeService:
                 return frame
         return None
 
+    def _sharpness_metrics(self, frame: np.ndarray) -> Tuple[float, float]:
+        """Return (variance of Laplacian, Tenengrad) on a downscaled grayscale frame."""
+        if frame.ndim == 3:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = frame
+        height, width = gray.shape[:2]
+        if self.focus_scale_width and width > self.focus_scale_width:
+            scale = self.focus_scale_width / float(width)
+            gray = cv2.resize(
+                gray,
+                (self.focus_scale_width, max(1, int(round(height * scale)))),
+                interpolation=cv2.INTER_AREA
+            )
+        gray = gray.astype(np.float32)
+        laplacian_var = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        tenengrad = float(np.mean(gx * gx + gy * gy))
+        return laplacian_var, tenengrad
+
+    def _read_sharpest_frame(
+        self,
+        window_seconds: Optional[float] = None,
+        max_frames: Optional[int] = None,
+        raw: bool = False
+    ) -> Tuple[Optional[Union[np.ndarray, bytes]], Optional[Dict[str, float]]]:
+        """Read frames for a short window and return the sharpest one with its scores.
+
+        With ``raw`` the frames are compressed MJPEG buffers, scored from a
+        reduced grayscale decode and returned untouched.
+        """
+        window = self.focus_window if window_seconds is None else max(0.0, window_seconds)
+        limit = self.focus_max_frames if max_frames is None else max(1, max_frames)
+
+        frames: List[Union[np.ndarray, bytes]] = []
+        metrics: List[Tuple[float, float]] = []
+        deadline = time.monotonic() + window
+        while len(frames) < limit:
+            if raw:
+                frame = self._read_raw_jpeg()
+                scored = self._decode_for_scoring(frame) if frame is not None else None
+            else:
+                frame = scored = self._read_frame()
+            if frame is None or scored is None:
+                break
+            frames.append(frame)
+            metrics.append(self._sharpness_metrics(scored))
+            if time.monotonic() >= deadline:
+                break
+
+        if not frames:
+            return None, None
+
+        # Both metrics grow with focus but live on different scales, so each is
+        # normalised against the window maximum before they are combined.
+        scores = np.asarray(metrics, dtype=np.float64)
+        peaks = scores.max(axis=0)
+        peaks[peaks == 0] = 1.0
+        combined = (scores / peaks).mean(axis=1)
+        best = int(np.argmax(combined))
+
+        return frames[best], {
+            "score": round(float(combined[best]), 4),
+            "laplacian_variance": round(float(scores[best, 0]), 2),
+            "tenengrad": round(float(scores[best, 1]), 2),
+            "frames_scored": len(frames),
+        }
+
     def _probe_device(self, device_path: Union[int, str]) -> Tuple[bool, Optional[int], Optional[int], Optional[int]]:
         cap = self._open_capture(device_path)
         if not cap or not cap.isOpened():
@@ -167,52 +313,56 @@ class MicroscopeService:
     
     def open_camera(self, camera_index: Union[int, str] = 0) -> bool:
         """Open a specific camera device"""
-        if self.current_camera is not None:
-            self.current_camera.release()
+        with self._lock:
+            if self.current_camera is not None:
+                self.current_camera.release()
+            self._passthrough_supported = None
+            self._raw_mode = False
 
-        targets: List[Union[int, str]] = []
-        if isinstance(camera_index, str):
-            if camera_index.startswith("/dev/media"):
-                targets = self._linked_video_nodes(camera_index)
-                if not targets:
+            targets: List[Union[int, str]] = []
+            if isinstance(camera_index, str):
+                if camera_index.startswith("/dev/media"):
+                    targets = self._linked_video_nodes(camera_index)
+                    if not targets:
+                        targets = [camera_index]
+                elif camera_index.startswith("/dev/video"):
+                    targets = [camera_index]
+                    media_path = self._media_for_video(camera_index)
+                    if media_path:
+                        for node in self._linked_video_nodes(media_path):
+                            if node not in targets:
+                                targets.append(node)
+                else:
                     targets = [camera_index]
-            elif camera_index.startswith("/dev/video"):
-                targets = [camera_index]
-                media_path = self._media_for_video(camera_index)
-                if media_path:
-                    for node in self._linked_video_nodes(media_path):
-                        if node not in targets:
-                            targets.append(node)
             else:
                 targets = [camera_index]
-        else:
-            targets = [camera_index]
 
-        for target in targets:
-            cap = self._open_capture(target)
-            if not cap or not cap.isOpened():
-                if cap:
-                    cap.release()
-                continue
-            self._configure_camera(cap)
-            if self._read_frame_from(cap) is not None:
-                self.current_camera = cap
-                self.camera_index = camera_index
-                return True
-            cap.release()
+            for target in targets:
+                cap = self._open_capture(target)
+                if not cap or not cap.isOpened():
+                    if cap:
+                        cap.release()
+                    continue
+                self._configure_camera(cap)
+                if self._read_frame_from(cap) is not None:
+                    self.current_camera = cap
+                    self.camera_index = camera_index
+                    return True
+                cap.release()
 
-        self.current_camera = None
-        return False
+            self.current_camera = None
+            return False
 
     def ensure_camera(self, camera_index: Union[int, str] = 0) -> bool:
         """Ensure the requested camera is open and active."""
-        if (
-            self.current_camera is None
-            or not self.current_camera.isOpened()
-            or not self._camera_matches(camera_index)
-        ):
-            return self.open_camera(camera_index)
-        return True
+        with self._lock:
+            if (
+                self.current_camera is None
+                or not self.current_camera.isOpened()
+                or not self._camera_matches(camera_index)
+            ):
+                return self.open_camera(camera_index)
+            return True
 
     def _resolve_media_device(self, media_path: str) -> Optional[str]:
         for node in self._linked_video_nodes(media_path):
@@ -248,41 +398,101 @@ class MicroscopeService:
                 return os.path.join("/dev", os.path.basename(media_device))
         return None
     
-    def capture_image(self, save_path: str) -> Tuple[bool, Optional[str]]:
-        """Capture an image from the microscope"""
-        if self.current_camera is None or not self.current_camera.isOpened():
-            if not self.open_camera(self.camera_index):
-                return False, "Failed to open camera"
-        
-        # Capture frame
-        frame = self._read_frame()
+    def capture_image(
+        self,
+        save_path: str,
+        focus_window: Optional[float] = None,
+        image_format: Optional[str] = None,
+        quality: Optional[int] = None
+    ) -> Tuple[bool, Optional[str], Optional[Dict[str, float]]]:
+        """Capture the sharpest frame seen within the focus window.
+
+        JPEG captures at the camera's own quality are written straight from the
+        MJPEG bitstream; other formats or an explicit quality are re-encoded.
+        """
+        image_format = image_format or self.capture_format
+        try:
+            extension, _ = image_encoder.normalize_format(image_format)
+        except ValueError as e:
+            return False, str(e), None
+
+        # Capture frame; encoding and saving happen after the camera is free
+        with self._lock:
+            if self.current_camera is None or not self.current_camera.isOpened():
+                if not self.open_camera(self.camera_index):
+                    return False, "Failed to open camera", None
+
+            frame, sharpness = None, None
+            if extension == "jpg" and quality is None:
+                frame, sharpness = self._read_sharpest_frame(focus_window, raw=True)
+            if frame is None:
+                frame, sharpness = self._read_sharpest_frame(focus_window)
         if frame is None:
-            return False, "Failed to capture image"
+            return False, "Failed to capture image", None
+
+        try:
+            if isinstance(frame, bytes):
+                data = frame
+            else:
+                if quality is None and extension == "jpg":
+                    quality = self.capture_quality
+                data, _ = image_encoder.encode(frame, extension, quality)
+        except ValueError as e:
+            return False, str(e), sharpness
         
         # Ensure directory exists
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         
         # Save image
-        success = cv2.imwrite(save_path, frame)
-        
-        if success:
-            return True, save_path
-        else:
-            return False, "Failed to save image"
+        try:
+            with open(save_path, "wb") as handle:
+                handle.write(data)
+        except OSError:
+            return False, "Failed to save image", sharpness
+
+        return True, save_path, sharpness
     
     def get_frame(self) -> Optional[np.ndarray]:
         """Get a single frame for preview"""
-        if self.current_camera is None or not self.current_camera.isOpened():
-            if not self.open_camera(self.camera_index):
-                return None
-        
-        return self._read_frame()
-    
+        with self._lock:
+            if self.current_camera is None or not self.current_camera.isOpened():
+                if not self.open_camera(self.camera_index):
+                    return None
+
+            return self._read_frame()
+
+    def get_preview_jpeg(self) -> Optional[bytes]:
+        """Get a JPEG preview, passing the camera's MJPEG bitstream through when possible"""
+        with self._lock:
+            if self.current_camera is None or not self.current_camera.isOpened():
+                if not self.open_camera(self.camera_index):
+                    return None
+
+            data = self._read_raw_jpeg()
+            if data is not None:
+                return data
+
+            frame = self._read_frame()
+        if frame is None:
+            return None
+        height, width = frame.shape[:2]
+        if self.preview_max_width and width > self.preview_max_width:
+            scale = self.preview_max_width / float(width)
+            frame = cv2.resize(
+                frame,
+                (self.preview_max_width, max(1, int(round(height * scale)))),
+                interpolation=cv2.INTER_AREA
+            )
+        return image_encoder.encode_jpeg(frame, self.preview_quality)
+
     def close_camera(self):
         """Release the camera"""
-        if self.current_camera is not None:
-            self.current_camera.release()
-            self.current_camera = None
+        with self._lock:
+            if self.current_camera is not None:
+                self.current_camera.release()
+                self.current_camera = None
+            self._passthrough_supported = None
+            self._raw_mode = False
 
-# Global instance
-microscope_service = MicroscopeService()
+# Global instance, built on first use
+microscope_service = LazyService(MicroscopeService)
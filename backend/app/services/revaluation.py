@@ -0,0 +1,333 @@
+"""
+Resumable collection-wide revaluation.
+
+A job walks a user's coins in id order, one chunk at a time. Each chunk is
+valued in a single vectorized pass of the local engine; coins it is not
+confident about go to Gemini on a bounded number of concurrent slots while the
+job's spend budget lasts. A chunk's valuations are bulk-inserted in the same
+transaction that advances the job's checkpoint, so a restarted job continues
+after the last finished chunk and never values a coin twice.
+"""
+import asyncio
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from ..cache import user_cache
+from ..database import SessionLocal
+from ..models import AIAnalysis, Coin, CoinImage, RevaluationJob, Valuation
+from .valuation_engine import valuation_engine
+from .vision_ai import vision_ai_service
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def coin_valuation_data(coin: Coin) -> Dict[str, Any]:
+    """Coin fields used for valuation."""
+    return {
+        "country": coin.country,
+        "denomination": coin.denomination,
+        "year": coin.year,
+        "mint_mark": coin.mint_mark,
+        "composition": coin.composition,
+        "weight_grams": float(coin.weight_grams) if coin.weight_grams is not None else None,
+        "condition_grade": coin.condition_grade,
+        "catalog_number": coin.catalog_number,
+        "variety": coin.variety,
+        "error_type": coin.error_type
+    }
+
+
+def analysis_valuation_data(analysis: Optional[AIAnalysis]) -> Optional[Dict[str, Any]]:
+    """Stored analysis fields used for valuation."""
+    if analysis is None:
+        return None
+    return {
+        "grade": analysis.ai_grade,
+        "wear_level": analysis.wear_level,
+        "surface_quality": analysis.surface_quality,
+        "defects": analysis.detected_defects,
+        "errors": analysis.detected_errors,
+        "authenticity": analysis.authenticity_assessment,
+        "rarity": analysis.raw_response.get("analysis", {}).get("rarity_estimate") if analysis.raw_response else None
+    }
+
+
+@dataclass
+class ChunkItem:
+    coin_id: UUID
+    coin: Dict[str, Any]
+    analysis: Optional[Dict[str, Any]]
+    image_path: Optional[str]
+    local: Dict[str, Any]
+    valuation: Optional[Dict[str, Any]] = None
+    source: str = field(default="local")
+
+
+class RevaluationService:
+    """Run and track revaluation jobs"""
+
+    def __init__(self):
+        self.images_path = os.getenv("IMAGES_PATH", "/app/images")
+        self.chunk_size = int(os.getenv("REVALUATION_CHUNK_SIZE", "200"))
+        self.ai_concurrency = int(os.getenv("REVALUATION_AI_CONCURRENCY", "4"))
+        self.ai_call_cost = Decimal(os.getenv("REVALUATION_AI_CALL_COST_USD", "0.002"))
+        self.default_budget = Decimal(os.getenv("REVALUATION_DEFAULT_BUDGET_USD", "1.00"))
+        # Seconds a shutdown waits for running jobs to save their current chunk
+        self.drain_timeout = float(os.getenv("REVALUATION_DRAIN_SECONDS", "20"))
+        # Shared by all jobs so concurrent jobs don't multiply Gemini load
+        self._ai_slots = asyncio.Semaphore(self.ai_concurrency)
+        self._tasks: Dict[UUID, asyncio.Task] = {}
+        self._draining = False
+
+    def create_job(self, db: Session, user_id: UUID, budget_usd: Optional[float] = None, use_ai: bool = True) -> RevaluationJob:
+        job = RevaluationJob(
+            user_id=user_id,
+            status="pending",
+            use_ai=use_ai,
+            budget_usd=self.default_budget if budget_usd is None else Decimal(str(budget_usd)),
+            spent_usd=Decimal("0"),
+            total_coins=db.query(func.count(Coin.id)).filter(Coin.user_id == user_id).scalar(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def start(self, job_id: UUID) -> None:
+        """Run a job in the background unless it is already running here."""
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self.run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def cancel(self, db: Session, job: RevaluationJob) -> None:
+        if job.status in ACTIVE_STATUSES:
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        task = self._tasks.get(job.id)
+        if task is not None:
+            task.cancel()
+
+    def shutdown(self) -> None:
+        """Stop running jobs; they stay 'running' and resume on the next start."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+    async def drain(self) -> None:
+        """Let running jobs save their current chunk, then stop them.
+
+        Drained jobs stay 'running' and resume on the next start, from the
+        chunk after their checkpoint, so no work is lost or repeated.
+        """
+        self._draining = True
+        try:
+            tasks = [task for task in self._tasks.values() if not task.done()]
+            if tasks:
+                await asyncio.wait(tasks, timeout=self.drain_timeout)
+            self.shutdown()
+        finally:
+            self._draining = False
+
+    def resume_interrupted(self) -> int:
+        """Restart jobs left running by a previous process."""
+        db = SessionLocal()
+        try:
+            job_ids = [
+                job_id for (job_id,) in
+                db.query(RevaluationJob.id).filter(RevaluationJob.status.in_(ACTIVE_STATUSES))
+            ]
+        finally:
+            db.close()
+        for job_id in job_ids:
+            self.start(job_id)
+        return len(job_ids)
+
+    def _load_chunk(self, job_id: UUID) -> Optional[List[ChunkItem]]:
+        """Next chunk after the checkpoint with its latest analyses, images and local values."""
+        db = SessionLocal()
+        try:
+            job = db.get(RevaluationJob, job_id)
+            if job is None or job.status not in ACTIVE_STATUSES:
+                return None
+            if job.status == "pending":
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+                db.commit()
+
+            query = db.query(Coin).filter(Coin.user_id == job.user_id)
+            if job.checkpoint_coin_id is not None:
+                query = query.filter(Coin.id > job.checkpoint_coin_id)
+            coins = query.order_by(Coin.id).limit(self.chunk_size).all()
+            if not coins:
+                return []
+            coin_ids = [coin.id for coin in coins]
+
+            # Latest analysis (via the coin's pointer) and primary image per coin, one query each
+            analysis_ids = [coin.latest_analysis_id for coin in coins if coin.latest_analysis_id]
+            analyses = {
+                analysis.coin_id: analysis for analysis in
+                db.query(AIAnalysis).filter(AIAnalysis.id.in_(analysis_ids))
+            } if analysis_ids else {}
+            images = {
+                coin_id: file_path for coin_id, file_path in
+                db.query(CoinImage.coin_id, CoinImage.file_path)
+                .filter(CoinImage.coin_id.in_(coin_ids))
+                .distinct(CoinImage.coin_id)
+                .order_by(CoinImage.coin_id, CoinImage.is_primary.desc(), CoinImage.created_at)
+            }
+
+            coin_data = [coin_valuation_data(coin) for coin in coins]
+            analysis_data = [analysis_valuation_data(analyses.get(coin.id)) for coin in coins]
+            local = valuation_engine.estimate_many(db, coin_data, analysis_data)
+
+            return [
+                ChunkItem(
+                    coin_id=coin.id,
+                    coin=data,
+                    analysis=analysis,
+                    image_path=images.get(coin.id),
+                    local=estimate,
+                )
+                for coin, data, analysis, estimate in zip(coins, coin_data, analysis_data, local)
+            ]
+        finally:
+            db.close()
+
+    def _image_file(self, image_path: Optional[str]) -> Optional[str]:
+        if not image_path:
+            return None
+        images_root = os.path.abspath(self.images_path)
+        path = os.path.abspath(os.path.join(images_root, image_path))
+        if os.path.commonpath([path, images_root]) != images_root or not os.path.exists(path):
+            return None
+        return path
+
+    async def _value_with_ai(self, item: ChunkItem) -> None:
+        image_file = self._image_file(item.image_path)
+        if image_file is None or item.analysis is None:
+            return
+        async with self._ai_slots:
+            result = await asyncio.to_thread(
+                vision_ai_service.estimate_value_from_image, image_file, item.analysis, item.coin
+            )
+        if result.get("success") and result.get("valuation", {}).get("estimated_value_avg") is not None:
+            item.valuation = {
+                **self._valuation_row(item.coin_id, result["valuation"]),
+                "recent_sales_data": {
+                    "formatted_response": result.get("formatted_response"),
+                    "raw_response": result.get("raw_response"),
+                    "model_version": result.get("model_version")
+                },
+                "valuation_source": f"AI - {result.get('model_version') or 'Gemini'}",
+            }
+            item.source = "ai"
+
+    def _valuation_row(self, coin_id: UUID, valuation: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "coin_id": coin_id,
+            "estimated_value_low": valuation.get("estimated_value_low"),
+            "estimated_value_high": valuation.get("estimated_value_high"),
+            "estimated_value_avg": valuation.get("estimated_value_avg"),
+            "rarity_score": valuation.get("rarity_score"),
+            "condition_multiplier": valuation.get("condition_multiplier"),
+            "market_demand": valuation.get("market_demand"),
+            "confidence_level": valuation.get("confidence_level"),
+            "recent_sales_data": None,
+            "comparable_listings": None,
+        }
+
+    def _local_row(self, item: ChunkItem) -> Dict[str, Any]:
+        return {
+            **self._valuation_row(item.coin_id, item.local["valuation"]),
+            "recent_sales_data": item.local.get("recent_sales_data"),
+            "valuation_source": f"Local - {item.local.get('method')}",
+        }
+
+    def _save_chunk(self, job_id: UUID, items: List[ChunkItem], spent: Decimal) -> bool:
+        """Insert the chunk's valuations and advance the checkpoint atomically."""
+        rows = [item.valuation for item in items if item.valuation is not None]
+        db = SessionLocal()
+        try:
+            job = db.query(RevaluationJob).filter(RevaluationJob.id == job_id).with_for_update().one()
+            if job.status not in ACTIVE_STATUSES:
+                return False  # Cancelled while the chunk was being valued
+            if rows:
+                db.execute(insert(Valuation), rows)
+            job.checkpoint_coin_id = items[-1].coin_id
+            job.processed_coins = (job.processed_coins or 0) + len(items)
+            job.local_valuations = (job.local_valuations or 0) + sum(1 for item in items if item.valuation and item.source == "local")
+            job.ai_valuations = (job.ai_valuations or 0) + sum(1 for item in items if item.source == "ai")
+            job.skipped_coins = (job.skipped_coins or 0) + len(items) - len(rows)
+            job.spent_usd = (job.spent_usd or Decimal("0")) + spent
+            db.commit()
+            if rows:
+                user_cache.invalidate(job.user_id)
+            return True
+        finally:
+            db.close()
+
+    def _finish(self, job_id: UUID, status: str, error: Optional[str] = None) -> None:
+        db = SessionLocal()
+        try:
+            job = db.get(RevaluationJob, job_id)
+            if job is not None and job.status in ACTIVE_STATUSES:
+                job.status = status
+                job.error = error
+                job.finished_at = datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+
+    async def run(self, job_id: UUID) -> None:
+        """Process chunks until the collection is done, the job is cancelled or fails."""
+        try:
+            while not self._draining:
+                items = await asyncio.to_thread(self._load_chunk, job_id)
+                if items is None:
+                    return
+                if not items:
+                    await asyncio.to_thread(self._finish, job_id, "completed")
+                    return
+
+                db = SessionLocal()
+                try:
+                    job = db.get(RevaluationJob, job_id)
+                    use_ai = bool(job.use_ai) and vision_ai_service.api_key is not None
+                    remaining = (job.budget_usd or Decimal("0")) - (job.spent_usd or Decimal("0"))
+                finally:
+                    db.close()
+
+                # Confident local values are kept; the rest go to Gemini while the budget lasts
+                ai_items = []
+                for item in items:
+                    if item.local.get("success"):
+                        item.valuation = self._local_row(item)
+                    if use_ai and not item.local.get("confident") and remaining >= self.ai_call_cost:
+                        if item.analysis is not None and self._image_file(item.image_path):
+                            remaining -= self.ai_call_cost
+                            ai_items.append(item)
+
+                await asyncio.gather(*(self._value_with_ai(item) for item in ai_items))
+                spent = self.ai_call_cost * len(ai_items)
+
+                if not await asyncio.to_thread(self._save_chunk, job_id, items, spent):
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Revaluation job {job_id} error: {str(e)}")
+            await asyncio.to_thread(self._finish, job_id, "failed", str(e))
+
+
+# Global instance
+revaluation_service = RevaluationService()
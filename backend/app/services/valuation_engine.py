@@ -0,0 +1,274 @@
+"""
+Deterministic coin valuation.
+
+Values come from, in order of preference:
+
+1. comparable sales in the coin's grade range (median and interquartile range),
+2. comparable sales of the same coin in any grade, rescaled along a grade
+   premium curve from the samples' average grade to the coin's grade,
+3. an intrinsic floor (face value or metal content) scaled by rarity and grade.
+
+Every step is computed over NumPy arrays, so a whole collection is valued in
+one pass. Each result carries a confidence score; callers fall back to the LLM
+only when it is low. Results use the same shape as the Gemini valuation.
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .comparables import (
+    comparables_service,
+    grade_to_sheldon,
+    normalize_country,
+    normalize_denomination,
+)
+
+MODEL_VERSION = "valuation-engine-1"
+
+# Price relative to VF-20 across the Sheldon scale; interpolated in log space.
+GRADE_POINTS = np.array([1, 3, 4, 8, 12, 20, 30, 40, 45, 50, 55, 58, 60, 62, 63, 64, 65, 66, 67, 68, 69, 70], dtype=float)
+GRADE_PREMIUMS = np.array(
+    [0.2, 0.3, 0.35, 0.5, 0.7, 1.0, 1.3, 1.7, 2.0, 2.4, 2.8, 3.2, 3.6, 4.2, 4.8, 5.6, 7.0, 9.0, 12.0, 18.0, 30.0, 60.0]
+)
+_LOG_PREMIUMS = np.log(GRADE_PREMIUMS)
+
+# Rarity as reported by the image analysis: (price multiplier, rarity score 1-10)
+RARITY = {
+    "common": (1.0, 2),
+    "scarce": (2.0, 4),
+    "rare": (5.0, 6),
+    "very rare": (15.0, 8),
+    "extremely rare": (50.0, 10),
+}
+
+CONFIDENCE_LEVELS = ((0.7, "High"), (0.4, "Medium"))
+
+
+def grade_premium(sheldon: np.ndarray) -> np.ndarray:
+    """Grade multiplier relative to VF-20; NaN grades map to 1.0."""
+    sheldon = np.asarray(sheldon, dtype=float)
+    premium = np.exp(np.interp(np.nan_to_num(sheldon, nan=20.0), GRADE_POINTS, _LOG_PREMIUMS))
+    return np.where(np.isnan(sheldon), 1.0, premium)
+
+
+def confidence_level(score: float) -> str:
+    for threshold, level in CONFIDENCE_LEVELS:
+        if score >= threshold:
+            return level
+    return "Low"
+
+
+def _face_value_usd(country: str, denomination: str) -> float:
+    if country != "united states":
+        return 0.0
+    match = re.fullmatch(r"(\d+) (cent|dollar)", denomination)
+    if not match:
+        return 0.0
+    return int(match.group(1)) * (0.01 if match.group(2) == "cent" else 1.0)
+
+
+def _is_cleaned(defects: Any) -> bool:
+    if isinstance(defects, dict):
+        return str(defects.get("cleaning", "")).strip().lower().startswith("yes")
+    return bool(re.search(r"['\"]?cleaning['\"]?\s*:\s*['\"]?yes", str(defects or ""), re.IGNORECASE))
+
+
+class ValuationEngine:
+    """Vectorized valuation from comparables, grade curves and rarity"""
+
+    def __init__(self):
+        self.min_confidence = float(os.getenv("VALUATION_MIN_CONFIDENCE", "0.4"))
+        self.silver_per_gram = float(os.getenv("VALUATION_SILVER_USD_PER_GRAM", "1.00"))
+        self.gold_per_gram = float(os.getenv("VALUATION_GOLD_USD_PER_GRAM", "85.00"))
+        self.cleaned_multiplier = float(os.getenv("VALUATION_CLEANED_MULTIPLIER", "0.5"))
+
+    def _melt_value(self, coin: Dict[str, Any]) -> float:
+        composition = str(coin.get("composition") or "").lower()
+        try:
+            weight = float(coin.get("weight_grams") or 0)
+        except (TypeError, ValueError):
+            weight = 0.0
+        if not weight:
+            return 0.0
+        value = 0.0
+        for metal, per_gram in (("silver", self.silver_per_gram), ("gold", self.gold_per_gram)):
+            if metal not in composition:
+                continue
+            match = re.search(rf"(\d+(?:\.\d+)?)\s*%\s*{metal}", composition)
+            fineness = float(match.group(1)) / 100 if match else 0.9
+            value += weight * fineness * per_gram
+        return value
+
+    def _features(self, coins: List[Dict[str, Any]], analyses: List[Dict[str, Any]], found: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        def stat(row: Any, name: str) -> float:
+            value = getattr(row, name, None) if row is not None else None
+            return float(value) if value is not None else np.nan
+
+        n = len(coins)
+        features = {name: np.full(n, np.nan) for name in (
+            "sheldon", "exact_n", "exact_p25", "exact_median", "exact_p75",
+            "all_n", "all_median", "all_grade_mean",
+        )}
+        features.update({
+            "rarity": np.ones(n),
+            "rarity_score": np.full(n, np.nan),
+            "floor": np.zeros(n),
+            "cleaned": np.zeros(n, dtype=bool),
+            "error": np.zeros(n, dtype=bool),
+        })
+
+        for i, (coin, analysis, lookup) in enumerate(zip(coins, analyses, found)):
+            sheldon = grade_to_sheldon(coin.get("condition_grade") or analysis.get("grade"))
+            features["sheldon"][i] = np.nan if sheldon is None else sheldon
+
+            exact, all_grades = lookup["exact"], lookup["all_grades"]
+            features["exact_n"][i] = stat(exact, "sample_count")
+            features["exact_p25"][i] = stat(exact, "price_p25")
+            features["exact_median"][i] = stat(exact, "price_median")
+            features["exact_p75"][i] = stat(exact, "price_p75")
+            features["all_n"][i] = stat(all_grades, "sample_count")
+            features["all_median"][i] = stat(all_grades, "price_median")
+            features["all_grade_mean"][i] = stat(all_grades, "grade_mean")
+
+            rarity = RARITY.get(str(analysis.get("rarity") or analysis.get("rarity_estimate") or "").strip().lower())
+            if rarity:
+                features["rarity"][i], features["rarity_score"][i] = rarity
+
+            face = _face_value_usd(normalize_country(coin.get("country")), normalize_denomination(coin.get("denomination")))
+            features["floor"][i] = max(face, self._melt_value(coin))
+            features["cleaned"][i] = _is_cleaned(analysis.get("defects"))
+            features["error"][i] = bool(coin.get("error_type"))
+        return features
+
+    def value_arrays(self, f: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Compute low/avg/high, grade multiplier and confidence for every coin at once."""
+        min_samples = comparables_service.min_samples
+        premium = grade_premium(f["sheldon"])
+
+        has_exact = np.nan_to_num(f["exact_n"]) >= min_samples
+        has_all = (
+            ~has_exact
+            & (np.nan_to_num(f["all_n"]) >= min_samples)
+            & ~np.isnan(f["sheldon"])
+            & ~np.isnan(f["all_grade_mean"])
+        )
+        has_floor = ~has_exact & ~has_all & (f["floor"] > 0)
+
+        # Path 2: rescale the all-grades median from the samples' grade to this coin's
+        rescaled = f["all_median"] * premium / grade_premium(f["all_grade_mean"])
+        # Path 3: intrinsic floor, with rarity and a grade premium above it
+        floor_value = f["floor"] * f["rarity"] * np.maximum(premium, 1.0)
+
+        avg = np.select([has_exact, has_all, has_floor], [f["exact_median"], rescaled, floor_value], np.nan)
+        low = np.select(
+            [has_exact, has_all, has_floor],
+            [f["exact_p25"], rescaled * 0.7, np.maximum(f["floor"], floor_value * 0.6)],
+            np.nan,
+        )
+        high = np.select([has_exact, has_all, has_floor], [f["exact_p75"], rescaled * 1.3, floor_value * 1.6], np.nan)
+
+        score = np.select(
+            [has_exact, has_all, has_floor],
+            [
+                0.5 + 0.5 * np.minimum(1.0, np.nan_to_num(f["exact_n"]) / 20),
+                0.3 + 0.3 * np.minimum(1.0, np.nan_to_num(f["all_n"]) / 30),
+                np.where(f["rarity_score"] <= 2, 0.3, 0.15),
+            ],
+            0.0,
+        )
+        # Comparables describe regular strikes; error coins need a closer look
+        score = np.where(f["error"], score * 0.5, score)
+
+        adjust = np.where(f["cleaned"], self.cleaned_multiplier, 1.0)
+        return {
+            "low": np.round(low * adjust, 2),
+            "avg": np.round(avg * adjust, 2),
+            "high": np.round(high * adjust, 2),
+            "condition_multiplier": np.round(premium * adjust, 2),
+            "score": np.round(score, 2),
+            "method": np.select([has_exact, has_all, has_floor], ["comparables", "grade-adjusted comparables", "intrinsic"], "none"),
+        }
+
+    def _market_demand(self, samples: float) -> str:
+        if np.isnan(samples):
+            return "Unknown"
+        if samples >= 20:
+            return "High"
+        if samples >= 5:
+            return "Moderate"
+        return "Low"
+
+    def estimate_many(
+        self,
+        db: Session,
+        coins: List[Dict[str, Any]],
+        analyses: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Value many coins with one comparables query and one vectorized pass."""
+        if not coins:
+            return []
+        analyses = [analysis or {} for analysis in (analyses or [None] * len(coins))]
+        found = comparables_service.lookup_many(db, coins)
+        features = self._features(coins, analyses, found)
+        values = self.value_arrays(features)
+
+        results = []
+        for i, lookup in enumerate(found):
+            score = float(values["score"][i])
+            method = str(values["method"][i])
+            if method == "none":
+                results.append({
+                    "success": False,
+                    "confident": False,
+                    "confidence_score": 0.0,
+                    "error": "Not enough data for a local valuation"
+                })
+                continue
+
+            row = lookup["exact"] if method == "comparables" else lookup["all_grades"]
+            samples = float(row.sample_count) if row is not None else np.nan
+            notes = {
+                "comparables": f"Median of {row.sample_count if row is not None else 0} comparable sales in this grade range.",
+                "grade-adjusted comparables": f"{row.sample_count if row is not None else 0} comparable sales in all grades, adjusted to this grade.",
+                "intrinsic": "Face or metal value scaled by rarity and grade; no comparable sales found.",
+            }[method]
+            rarity_score = features["rarity_score"][i]
+
+            results.append({
+                "success": True,
+                "confident": score >= self.min_confidence,
+                "confidence_score": score,
+                "method": method,
+                "valuation": {
+                    "estimated_value_low": float(values["low"][i]),
+                    "estimated_value_high": float(values["high"][i]),
+                    "estimated_value_avg": float(values["avg"][i]),
+                    "rarity_score": None if np.isnan(rarity_score) else int(rarity_score),
+                    "condition_multiplier": float(values["condition_multiplier"][i]),
+                    "market_demand": self._market_demand(samples),
+                    "confidence_level": confidence_level(score),
+                    "valuation_notes": notes,
+                },
+                "recent_sales_data": comparables_service.price_stats(row) if row is not None else None,
+                "key": lookup["key"],
+                "grade_bucket": row.grade_bucket if row is not None else None,
+                "model_version": MODEL_VERSION,
+            })
+        return results
+
+    def estimate(self, db: Session, coin: Dict[str, Any], analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Value one coin; includes the recent comparable sales behind the estimate."""
+        result = self.estimate_many(db, [coin], [analysis])[0]
+        if result.get("success") and result.get("key") and result.get("grade_bucket") is not None:
+            bucket = result["grade_bucket"] or None
+            result["comparable_listings"] = comparables_service.recent_sales(db, result["key"], bucket)
+        else:
+            result["comparable_listings"] = []
+        return result
+
+
+# Global instance
+valuation_engine = ValuationEngine()
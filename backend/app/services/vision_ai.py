@@ -1,14 +1,21 @@
-from google import genai
-from google.genai import types
 import io
 import mimetypes
 import os
 import re
-from typing import Dict, Any, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
 import httpx
 from PIL import Image
 import json
 
+from ..metrics import observe_call, record_cache
+from .lazy import LazyService
+
+if TYPE_CHECKING:
+    from google.genai import types
+
 class VisionAIService:
     """Service for AI-powered coin analysis using Google Gemini Vision"""
 
@@ -27,12 +34,22 @@ class VisionAIService:
     
     def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
+        # GEMINI_API_BASE_URL points the client at another endpoint, e.g. the
+        # local fake Gemini API in stubs/gemini.py.
+        self.base_url = (os.getenv("GEMINI_API_BASE_URL") or "https://generativelanguage.googleapis.com").rstrip("/")
         if api_key:
+            # Imported here: google.genai takes longer to import than the rest of the app
+            from google import genai
+            from google.genai import types
+
             self.api_version = os.getenv("GEMINI_API_VERSION", "v1")
+            client_options = {}
+            if os.getenv("GEMINI_API_BASE_URL"):
+                client_options["http_options"] = types.HttpOptions(base_url=self.base_url + "/")
             try:
-                self.client = genai.Client(api_key=api_key, api_version=self.api_version)
+                self.client = genai.Client(api_key=api_key, api_version=self.api_version, **client_options)
             except TypeError:
-                self.client = genai.Client(api_key=api_key)
+                self.client = genai.Client(api_key=api_key, **client_options)
                 self.api_version = None
             self.model_name = os.getenv("GEMINI_MODEL")
             self.estimate_api_version = os.getenv("GEMINI_ESTIMATE_API_VERSION", "v1beta")
@@ -46,6 +63,43 @@ class VisionAIService:
             self.estimate_model_name = None
             self.api_key = None
 
+        # Uploaded files stay on Gemini for 48 hours; reuse them while they last
+        self.upload_cache_ttl = int(os.getenv("GEMINI_UPLOAD_CACHE_TTL_SECONDS", str(46 * 3600)))
+        self.upload_cache_size = int(os.getenv("GEMINI_UPLOAD_CACHE_SIZE", "1024"))
+        self._upload_cache: "OrderedDict[Tuple[str, int, int], Tuple[str, str, float]]" = OrderedDict()
+        self._upload_cache_lock = threading.Lock()
+        # Shared connection pool for the REST calls made outside the SDK
+        self._http: Optional[httpx.Client] = None
+        self._http_lock = threading.Lock()
+
+    def _http_client(self) -> httpx.Client:
+        with self._http_lock:
+            if self._http is None:
+                self._http = httpx.Client(timeout=120.0, limits=httpx.Limits(max_keepalive_connections=10))
+            return self._http
+
+    def warm_up(self) -> Optional[str]:
+        """Open connections and discover the model ahead of the first request; returns the model."""
+        if not self.client:
+            return None
+        self._http_client()
+        # Listing also opens the SDK client's connection pool
+        return self._select_model_name(models=self._list_models())
+
+    def close(self) -> None:
+        """Close the HTTP pools and forget uploaded files."""
+        with self._http_lock:
+            http, self._http = self._http, None
+        if http is not None:
+            http.close()
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception as e:
+                print(f"Gemini client close error: {str(e)}")
+        with self._upload_cache_lock:
+            self._upload_cache.clear()
+
     def _normalize_model_name(self, name: str) -> str:
         if name.startswith("models/"):
             return name.split("/", 1)[1]
@@ -55,15 +109,21 @@ class VisionAIService:
         if not self.client:
             return []
         try:
-            return list(self.client.models.list())
+            with observe_call("gemini", "list_models"):
+                return list(self.client.models.list())
         except Exception:
             return []
 
-    def _select_model_name(self, force_refresh: bool = False) -> Optional[str]:
+    def _generate(self, model_name: str, contents: list, operation: str):
+        with observe_call("gemini", operation, model_name):
+            return self.client.models.generate_content(model=model_name, contents=contents)
+
+    def _select_model_name(self, force_refresh: bool = False, models: Optional[list] = None) -> Optional[str]:
         if self.model_name and not force_refresh:
             return self.model_name
 
-        models = self._list_models()
+        if models is None:
+            models = self._list_models()
         available = set()
         for model in models:
             name = getattr(model, "name", None)
@@ -136,10 +196,7 @@ Provide only the JSON response, no additional text."""
 
             # Generate analysis
             model_name = self._select_model_name()
-            response = self.client.models.generate_content(
-                model=model_name,
-                contents=[prompt, image_part],
-            )
+            response = self._generate(model_name, [prompt, image_part], "analyze_coin")
             
             # Parse JSON response
             response_text = (response.text or "").strip()
@@ -168,10 +225,7 @@ Provide only the JSON response, no additional text."""
                 fallback_model = self._select_model_name(force_refresh=True)
                 if fallback_model and fallback_model != model_name:
                     try:
-                        response = self.client.models.generate_content(
-                            model=fallback_model,
-                            contents=[prompt, image_part],
-                        )
+                        response = self._generate(fallback_model, [prompt, image_part], "analyze_coin")
                         response_text = (response.text or "").strip()
                         if not response_text:
                             raise ValueError("Empty response from Gemini API")
@@ -230,10 +284,7 @@ Provide a value estimate in this JSON format:
 Provide only the JSON response."""
 
             model_name = self._select_model_name()
-            response = self.client.models.generate_content(
-                model=model_name,
-                contents=[prompt],
-            )
+            response = self._generate(model_name, [prompt], "estimate_value")
             response_text = (response.text or "").strip()
             if not response_text:
                 raise ValueError("Empty response from Gemini API")
@@ -259,10 +310,7 @@ Provide only the JSON response."""
                 fallback_model = self._select_model_name(force_refresh=True)
                 if fallback_model and fallback_model != model_name:
                     try:
-                        response = self.client.models.generate_content(
-                            model=fallback_model,
-                            contents=[prompt],
-                        )
+                        response = self._generate(fallback_model, [prompt], "estimate_value")
                         response_text = (response.text or "").strip()
                         if not response_text:
                             raise ValueError("Empty response from Gemini API")
@@ -301,7 +349,7 @@ Provide only the JSON response."""
             return self._mock_valuation()
 
         try:
-            file_uri, mime_type = self._upload_image(image_path)
+            file_uri, mime_type = self._cached_upload(image_path)
             prompt = self._build_estimate_prompt(analysis, coin_data)
             response_json = self._generate_content_with_file(file_uri, mime_type, prompt)
             formatted_text = self._extract_text(response_json)
@@ -334,14 +382,35 @@ Provide only the JSON response."""
                 "valuation": self._mock_valuation()["valuation"]
             }
 
+    def _cached_upload(self, image_path: str) -> Tuple[str, str]:
+        """Upload an image once per content version and reuse the file URI."""
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        now = time.monotonic()
+        with self._upload_cache_lock:
+            cached = self._upload_cache.get(key)
+            if cached and cached[2] > now:
+                self._upload_cache.move_to_end(key)
+                record_cache("gemini_upload", True)
+                return cached[0], cached[1]
+
+        record_cache("gemini_upload", False)
+        with observe_call("gemini", "upload_file"):
+            file_uri, mime_type = self._upload_image(image_path)
+        with self._upload_cache_lock:
+            self._upload_cache[key] = (file_uri, mime_type, now + self.upload_cache_ttl)
+            self._upload_cache.move_to_end(key)
+            while len(self._upload_cache) > self.upload_cache_size:
+                self._upload_cache.popitem(last=False)
+        return file_uri, mime_type
+
     def _upload_image(self, image_path: str) -> Tuple[str, str]:
         mime_type, _ = mimetypes.guess_type(image_path)
         if not mime_type:
             mime_type = "image/jpeg"
 
         file_size = os.path.getsize(image_path)
-        base_url = "https://generativelanguage.googleapis.com"
-        upload_url = f"{base_url}/upload/{self.estimate_api_version}/files"
+        upload_url = f"{self.base_url}/upload/{self.estimate_api_version}/files"
 
         headers = {
             "x-goog-api-key": self.api_key,
@@ -353,27 +422,28 @@ Provide only the JSON response."""
         }
         metadata = {"file": {"display_name": os.path.basename(image_path)}}
 
-        with httpx.Client(timeout=60.0) as client:
-            init_response = client.post(upload_url, headers=headers, json=metadata)
-            init_response.raise_for_status()
-            upload_location = init_response.headers.get("x-goog-upload-url")
-            if not upload_location:
-                raise ValueError("Missing upload URL from Gemini API")
-
-            with open(image_path, "rb") as handle:
-                upload_headers = {
-                    "x-goog-api-key": self.api_key,
-                    "Content-Length": str(file_size),
-                    "X-Goog-Upload-Offset": "0",
-                    "X-Goog-Upload-Command": "upload, finalize",
-                }
-                upload_response = client.post(
-                    upload_location,
-                    headers=upload_headers,
-                    content=handle.read()
-                )
-                upload_response.raise_for_status()
-                payload = upload_response.json()
+        client = self._http_client()
+        init_response = client.post(upload_url, headers=headers, json=metadata, timeout=60.0)
+        init_response.raise_for_status()
+        upload_location = init_response.headers.get("x-goog-upload-url")
+        if not upload_location:
+            raise ValueError("Missing upload URL from Gemini API")
+
+        with open(image_path, "rb") as handle:
+            upload_headers = {
+                "x-goog-api-key": self.api_key,
+                "Content-Length": str(file_size),
+                "X-Goog-Upload-Offset": "0",
+                "X-Goog-Upload-Command": "upload, finalize",
+            }
+            upload_response = client.post(
+                upload_location,
+                headers=upload_headers,
+                content=handle.read(),
+                timeout=60.0
+            )
+            upload_response.raise_for_status()
+            payload = upload_response.json()
 
         file_uri = payload.get("file", {}).get("uri")
         if not file_uri:
@@ -382,9 +452,8 @@ Provide only the JSON response."""
         return file_uri, mime_type
 
     def _generate_content_with_file(self, file_uri: str, mime_type: str, prompt: str) -> Dict[str, Any]:
-        base_url = "https://generativelanguage.googleapis.com"
         model = self.estimate_model_name
-        endpoint = f"{base_url}/{self.estimate_api_version}/models/{model}:generateContent"
+        endpoint = f"{self.base_url}/{self.estimate_api_version}/models/{model}:generateContent"
         payload = {
             "contents": [{
                 "parts": [
@@ -397,8 +466,8 @@ Provide only the JSON response."""
             "x-goog-api-key": self.api_key,
             "Content-Type": "application/json",
         }
-        with httpx.Client(timeout=120.0) as client:
-            response = client.post(endpoint, headers=headers, json=payload)
+        with observe_call("gemini", "estimate_value_from_image", model):
+            response = self._http_client().post(endpoint, headers=headers, json=payload)
             response.raise_for_status()
             return response.json()
 
@@ -440,8 +509,10 @@ Provide only the JSON response."""
         avg_val = round((low_val + high_val) / 2, 2)
         return low_val, high_val, avg_val
 
-    def _image_part(self, img: Image.Image) -> types.Part:
+    def _image_part(self, img: Image.Image) -> "types.Part":
         """Convert a PIL image to a Gemini image part."""
+        from google.genai import types
+
         img_format = img.format if img.format in Image.MIME else "PNG"
         mime_type = Image.MIME.get(img_format, "image/png")
         buffer = io.BytesIO()
@@ -510,5 +581,5 @@ Provide only the JSON response."""
             }
         }
 
-# Global instance
-vision_ai_service = VisionAIService()
+# Global instance, built on first use
+vision_ai_service = LazyService(VisionAIService)
@@ -0,0 +1,206 @@
+"""
+Multi-process coordination.
+
+With several server workers (``python -m app.server``, ``uvicorn --workers`` or
+gunicorn) every process imports the app and builds its own service singletons.
+Most of them are safe to duplicate: database pools, the Gemini client and
+the eBay call pool (whose limits are split per worker, see
+``WEB_CONCURRENCY``) are per process and only cost some memory. The caches
+are not: a write on one worker only invalidates that worker's in-process
+response cache, so the others serve stale coin details and analytics for up
+to ``RESPONSE_CACHE_TTL_SECONDS`` unless ``RESPONSE_CACHE_BACKEND=redis``,
+and a logout-all or deactivation reaches the other workers' token user
+caches only after ``AUTH_USER_CACHE_TTL_SECONDS``. Two things must exist
+once:
+
+- background work: the capture janitor, the eBay status sync, the comparables
+  refresh and resuming interrupted revaluation jobs;
+- the microscope: a V4L2 device can only be streamed by one process.
+
+The first worker to take an exclusive lock on ``WORKER_LOCK_PATH`` becomes the
+primary. It runs the background work and owns the camera, serving camera
+calls to the other workers over a Unix socket (``CAMERA_HOST_SOCKET``). When
+the primary exits the lock is released and the next worker to start takes it.
+Both paths default to names keyed by the parent process, so every server
+(and every load test) gets its own.
+"""
+import asyncio
+import json
+import os
+import socket
+import tempfile
+from typing import Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Optional dependency (not on Windows)
+    fcntl = None
+
+
+def _local_microscope():
+    # Imported on use: the camera stack (OpenCV) is only loaded where it is needed
+    from .services.microscope import microscope_service
+    return microscope_service
+
+# MicroscopeService methods the camera host runs for other workers
+CAMERA_METHODS = (
+    "list_available_cameras",
+    "ensure_camera",
+    "open_camera",
+    "close_camera",
+    "get_preview_jpeg",
+    "capture_image",
+)
+
+
+class CameraHost:
+    """Serves the primary's microscope to the other workers.
+
+    One request per connection: a JSON line ``{"method", "args"}`` answered by
+    a JSON line ``{"result", "size", "error"}``, followed by ``size`` bytes
+    when the result is binary (preview frames). Calls run one at a time, so
+    preview polls from every worker queue behind a capture instead of
+    piling up threads on the service lock.
+    """
+
+    def __init__(self, path: str, service=None):
+        self.path = path
+        self.service = service
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._calls = asyncio.Lock()
+
+    async def start(self) -> None:
+        # A primary that crashed leaves its socket behind
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        payload = b""
+        try:
+            request = json.loads(await reader.readline())
+            method = request.get("method")
+            if method not in CAMERA_METHODS:
+                raise ValueError(f"Unknown camera method: {method}")
+            service = self.service or _local_microscope()
+            async with self._calls:
+                result = await asyncio.to_thread(getattr(service, method), *request.get("args", []))
+            if isinstance(result, bytes):
+                payload, header = result, {"result": None, "size": len(result)}
+            else:
+                header = {"result": result, "size": None}
+        except Exception as e:
+            header = {"result": None, "size": None, "error": str(e)}
+        try:
+            writer.write(json.dumps(header).encode("utf-8") + b"\n" + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+class RemoteMicroscope:
+    """MicroscopeService stand-in for non-primary workers; calls block, like the real ones."""
+
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+
+    @property
+    def capture_format(self) -> str:
+        return _local_microscope().capture_format
+
+    def _call(self, method: str, *args: Any) -> Any:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(self.timeout)
+                connection.connect(self.path)
+                connection.sendall(json.dumps({"method": method, "args": list(args)}).encode("utf-8") + b"\n")
+                with connection.makefile("rb") as stream:
+                    header = json.loads(stream.readline())
+                    if "error" in header:
+                        raise RuntimeError(f"Camera host error: {header['error']}")
+                    if header.get("size") is not None:
+                        return stream.read(header["size"])
+                    return header.get("result")
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Camera host unavailable: {str(e)}")
+
+    def list_available_cameras(self) -> list:
+        return self._call("list_available_cameras")
+
+    def ensure_camera(self, camera_index="0") -> bool:
+        return self._call("ensure_camera", camera_index)
+
+    def open_camera(self, camera_index="0") -> bool:
+        return self._call("open_camera", camera_index)
+
+    def close_camera(self) -> None:
+        self._call("close_camera")
+
+    def get_preview_jpeg(self) -> Optional[bytes]:
+        return self._call("get_preview_jpeg")
+
+    def capture_image(self, save_path: str, focus_window=None, image_format=None, quality=None):
+        return tuple(self._call("capture_image", save_path, focus_window, image_format, quality))
+
+
+class WorkerRole:
+    """Primary election and camera ownership for this process"""
+
+    def __init__(self):
+        group = os.getppid()
+        run_dir = tempfile.gettempdir()
+        self.lock_path = os.getenv("WORKER_LOCK_PATH") or os.path.join(run_dir, f"nomisma-{group}.lock")
+        self.camera_socket = os.getenv("CAMERA_HOST_SOCKET") or os.path.join(run_dir, f"nomisma-{group}-camera.sock")
+        # None until the lifespan has run: a process without one (tests, CLI) uses the camera directly
+        self.primary: Optional[bool] = None
+        self._lock_file = None
+        self._camera_host = CameraHost(self.camera_socket)
+        self._remote = RemoteMicroscope(self.camera_socket, float(os.getenv("CAMERA_HOST_TIMEOUT_SECONDS", "30")))
+
+    def acquire(self) -> bool:
+        """Try to become the primary; returns whether this process is."""
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self.primary = True
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            self.primary = False
+            return False
+        self._lock_file = lock_file
+        self.primary = True
+        return True
+
+    def release(self) -> None:
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+        self.primary = None
+
+    def microscope(self):
+        """The camera service to use here: the real one, or a client of the primary's."""
+        return self._remote if self.primary is False else _local_microscope()
+
+    async def start_camera_host(self) -> None:
+        await self._camera_host.start()
+
+    async def stop_camera_host(self) -> None:
+        await self._camera_host.stop()
+
+
+# Global instance
+worker_role = WorkerRole()
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+from sqlalchemy.engine import make_url
+
+from stubs.ebay_trading import FakeTradingServer
+from stubs.gemini import FakeGeminiServer
+
+from . import report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+OPERATION_NAMES = ("list", "search", "get", "create", "upload", "analyze", "similar", "preview", "export")
+
+
+def _csv(value: str) -> list:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def run(args: argparse.Namespace) -> int:
+    database_url = args.database_url or os.getenv("BENCHMARK_DATABASE_URL")
+    if not database_url:
+        print("Pass --database-url or set BENCHMARK_DATABASE_URL (a throwaway database)", file=sys.stderr)
+        return 2
+    database = make_url(database_url).database or ""
+    if not args.force and not any(word in database for word in ("bench", "test")):
+        print(f"Refusing to truncate database {database!r}; its name must contain 'bench' or 'test' (or pass --force)", file=sys.stderr)
+        return 2
+    operations = _csv(args.operations)
+    unknown = [name for name in operations if name not in OPERATION_NAMES]
+    if unknown:
+        print(f"Unknown operations: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    images_path = args.images_path or tempfile.mkdtemp(prefix="nomisma-bench-")
+    with FakeGeminiServer(latency=args.gemini_latency) as gemini, FakeTradingServer(latency=args.ebay_latency) as ebay:
+        # The app reads its configuration at import time
+        os.environ.update({
+            "DATABASE_URL": database_url,
+            "IMAGES_PATH": images_path,
+            "GEMINI_API_KEY": "fake",
+            "GEMINI_MODEL": "gemini-2.5-flash",
+            "GEMINI_API_BASE_URL": gemini.base_url,
+            "EBAY_APP_ID": "fake",
+            "EBAY_DEV_ID": "fake",
+            "EBAY_CERT_ID": "fake",
+            "EBAY_USER_TOKEN": "fake",
+            "EBAY_API_DOMAIN": ebay.domain,
+            "EBAY_API_HTTPS": "false",
+        })
+        from .runner import run as run_benchmarks
+
+        result = asyncio.run(run_benchmarks({
+            "scales": [int(scale) for scale in _csv(args.scales)],
+            "operations": operations,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "other_users": args.other_users,
+            "gemini_latency": args.gemini_latency,
+            "ebay_latency": args.ebay_latency,
+            "camera_fps": args.camera_fps,
+            "init_sql": args.init_sql,
+        }))
+
+    with open(args.output, "w") as handle:
+        json.dump(result, handle, indent=2)
+    print(f"Report written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    rows = report.compare(report.load(args.before), report.load(args.after), args.threshold)
+    print(report.format_comparison(rows))
+    if args.fail_on_regression and any(row["verdict"] == "slower" for row in rows):
+        return 1
+    return 0
+
+
+def imports(args: argparse.Namespace) -> int:
+    from . import imports as import_time
+
+    env = {"DATABASE_URL": os.getenv("DATABASE_URL", "postgresql+psycopg2://nomisma@localhost/nomisma"), "IMAGES_PATH": tempfile.gettempdir()}
+    for feature in _csv(args.disable):
+        env[f"FEATURE_{feature.upper()}"] = "false"
+    result = import_time.measure(args.module, args.repeat, args.top, env)
+    print(import_time.format_result(result))
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(result, handle, indent=2)
+    if args.budget_ms is not None and result["total_ms"] > args.budget_ms:
+        print(f"Import took {result['total_ms']} ms, over the {args.budget_ms} ms budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runner = commands.add_parser("run", help="Seed, run every operation at every scale and write a JSON report")
+    runner.add_argument("--database-url", help="Throwaway PostgreSQL database (default: BENCHMARK_DATABASE_URL); it is truncated")
+    runner.add_argument("--force", action="store_true", help="Allow a database whose name lacks 'bench' or 'test'")
+    runner.add_argument("--scales", default="100,1000,10000", help="Coins in the benchmark user's collection, comma separated")
+    runner.add_argument("--operations", default=",".join(OPERATION_NAMES))
+    runner.add_argument("--iterations", type=int, default=100, help="Requests per operation (uploads, analyses, previews and exports run fewer)")
+    runner.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once")
+    runner.add_argument("--warmup", type=int, default=3)
+    runner.add_argument("--other-users", type=int, default=3, help="Other users sharing as many coins again")
+    runner.add_argument("--gemini-latency", type=float, default=0.05, help="Seconds per fake Gemini call")
+    runner.add_argument("--ebay-latency", type=float, default=0.05, help="Seconds per fake eBay call")
+    runner.add_argument("--camera-fps", type=float, default=30.0, help="Frame rate of the fake camera")
+    runner.add_argument("--init-sql", default=os.path.join(ROOT, "database", "init.sql"), help="Schema applied to an empty database")
+    runner.add_argument("--images-path", help="Image directory (default: a new temporary directory)")
+    runner.add_argument("--output", default="benchmark-report.json")
+    runner.set_defaults(handler=run)
+
+    comparer = commands.add_parser("compare", help="Compare two reports")
+    comparer.add_argument("before")
+    comparer.add_argument("after")
+    comparer.add_argument("--threshold", type=float, default=0.10, help="Relative p50 change reported as slower/faster")
+    comparer.add_argument("--fail-on-regression", action="store_true", help="Exit 1 when any operation got slower")
+    comparer.set_defaults(handler=compare)
+
+    importer = commands.add_parser("imports", help="Measure app import time with python -X importtime")
+    importer.add_argument("--module", default="app.main")
+    importer.add_argument("--repeat", type=int, default=5, help="Fresh interpreters; the fastest run is reported")
+    importer.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list")
+    importer.add_argument("--disable", default="", help="Features to turn off, e.g. microscope,ebay")
+    importer.add_argument("--budget-ms", type=float, help="Exit 1 when the import takes longer")
+    importer.add_argument("--output", help="Also write the result as JSON")
+    importer.set_defaults(handler=imports)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
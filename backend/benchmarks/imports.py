@@ -0,0 +1,69 @@
+"""Import-time measurement with ``python -X importtime``."""
+import os
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+# Modules whose import this tracks: deferring them is the point of lazy services
+HEAVY = ("google.genai", "ebaysdk", "cv2", "numpy", "PIL", "lxml")
+
+
+def parse(output: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self µs, cumulative µs, depth) for every line of -X importtime output."""
+    rows = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            depth = (len(match.group(3)) - 1) // 2
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)), depth))
+    return rows
+
+
+def _run(module: str, env: Dict[str, str]) -> List[Tuple[str, int, int, int]]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    return parse(completed.stderr)
+
+
+def measure(module: str = "app.main", repeat: int = 5, top: int = 15, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Import `module` in fresh interpreters; reports the fastest run.
+
+    The first run also warms the bytecode cache, so it is not counted.
+    """
+    env = {**os.environ, **(env or {})}
+    _run(module, env)
+    best = None
+    for _ in range(max(1, repeat)):
+        rows = _run(module, env)
+        total = next((cumulative for name, _, cumulative, depth in rows if name == module and depth == 0), None)
+        if total is not None and (best is None or total < best[0]):
+            best = (total, rows)
+    if best is None:
+        raise RuntimeError(f"{module} missing from -X importtime output")
+
+    total, rows = best
+    top_level = sorted((row for row in rows if row[3] == 1), key=lambda row: row[2], reverse=True)
+    loaded = {name for name, _, _, _ in rows}
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 1),
+        "modules": len(rows),
+        "top": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)} for name, _, cumulative, _ in top_level[:top]],
+        "heavy_loaded": [name for name in HEAVY if name in loaded],
+    }
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    lines = [
+        f"import {result['module']}: {result['total_ms']} ms, {result['modules']} modules",
+        f"heavy modules loaded: {', '.join(result['heavy_loaded']) or 'none'}",
+        "",
+    ]
+    lines.extend(f"{row['cumulative_ms']:>9.1f} ms  {row['module']}" for row in result["top"])
+    return "\n".join(lines)
@@ -0,0 +1,76 @@
+"""Latency summaries and report comparison."""
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    """Throughput and latency statistics (milliseconds) for one operation."""
+    values = sorted(latencies)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "iterations": len(values) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(values) / wall_seconds, 2) if wall_seconds > 0 else None,
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+        "p50_ms": ms(percentile(values, 0.50)),
+        "p90_ms": ms(percentile(values, 0.90)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "max_ms": ms(values[-1]) if values else None,
+    }
+
+
+def _results_by_key(report: Dict[str, Any]) -> Dict[Tuple[int, str], Dict[str, Any]]:
+    return {(result["scale"], result["operation"]): result for result in report["results"]}
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float = 0.10) -> List[Dict[str, Any]]:
+    """Per (scale, operation) change in p50, p99 and throughput; flags changes beyond threshold."""
+    rows = []
+    old = _results_by_key(before)
+    for key, new in sorted(_results_by_key(after).items()):
+        previous = old.get(key)
+        if previous is None:
+            continue
+        row = {"scale": key[0], "operation": key[1]}
+        for metric in ("p50_ms", "p99_ms", "throughput_rps"):
+            a, b = previous.get(metric), new.get(metric)
+            row[metric] = [a, b]
+            row[f"{metric}_change"] = round((b - a) / a, 3) if a and b is not None else None
+        p50_change = row["p50_ms_change"]
+        row["verdict"] = (
+            "slower" if p50_change is not None and p50_change > threshold
+            else "faster" if p50_change is not None and p50_change < -threshold
+            else "same"
+        )
+        rows.append(row)
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'scale':>8}  {'operation':<10} {'p50 ms':>21} {'p99 ms':>21} {'rps':>19}  verdict"]
+    for row in rows:
+        cells = []
+        for metric, width in (("p50_ms", 21), ("p99_ms", 21), ("throughput_rps", 19)):
+            a, b = row[metric]
+            change = row[f"{metric}_change"]
+            text = f"{a} -> {b}" + (f" ({change:+.0%})" if change is not None else "")
+            cells.append(f"{text:>{width}}")
+        lines.append(f"{row['scale']:>8}  {row['operation']:<10} {' '.join(cells)}  {row['verdict']}")
+    return "\n".join(lines)
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as handle:
+        return json.load(handle)
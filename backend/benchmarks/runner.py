@@ -0,0 +1,191 @@
+"""
+Operation scenarios and the measurement loop.
+
+Requests go through the full ASGI app (middleware, dependencies, routing) via
+httpx's ASGI transport, so results reflect the backend's own cost without
+network or server overhead. Import this module only after the environment has
+been prepared (see ``benchmarks.__main__``): the app reads its settings at
+import time.
+"""
+import asyncio
+import io
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+from app.auth import token_user_cache
+from app.cache import user_cache
+from app.database import engine
+from app.main import app
+from app.services.microscope import microscope_service
+from stubs import camera
+
+from . import seed
+from .report import summarize
+
+Operation = Callable[["Context"], Awaitable[httpx.Response]]
+
+
+class Context:
+    """Client and seeded data shared by the operations of one scale"""
+
+    def __init__(self, client: httpx.AsyncClient, seeded: Dict[str, Any], image_paths: List[str], upload: bytes, rng: random.Random):
+        self.client = client
+        self.coin_ids = [str(coin_id) for coin_id in seeded["coin_ids"]]
+        self.image_paths = image_paths
+        self.upload = upload
+        self.rng = rng
+
+    def coin_id(self) -> str:
+        return self.rng.choice(self.coin_ids)
+
+
+async def op_list(ctx: Context) -> httpx.Response:
+    return await ctx.client.get("/api/coins/", params={"limit": 50})
+
+
+async def op_search(ctx: Context) -> httpx.Response:
+    term = ctx.rng.choice(("Canada", "KM#1", "Bench coin 7", "Cents", "NOM"))
+    return await ctx.client.get("/api/coins/", params={"search": term, "limit": 50})
+
+
+async def op_get(ctx: Context) -> httpx.Response:
+    return await ctx.client.get(f"/api/coins/{ctx.coin_id()}")
+
+
+async def op_create(ctx: Context) -> httpx.Response:
+    return await ctx.client.post("/api/coins/", json={
+        "country": "United States",
+        "denomination": "1 Cent",
+        "year": ctx.rng.randint(1900, 2024),
+        "condition_grade": "Fine",
+        "notes": "created by benchmark",
+    })
+
+
+async def op_upload(ctx: Context) -> httpx.Response:
+    return await ctx.client.post(
+        f"/api/coins/{ctx.coin_id()}/images",
+        files={"file": ("coin.jpg", io.BytesIO(ctx.upload), "image/jpeg")},
+    )
+
+
+async def op_analyze(ctx: Context) -> httpx.Response:
+    return await ctx.client.post("/api/ai/analyze", json={
+        "image_path": ctx.rng.choice(ctx.image_paths),
+        "coin_id": ctx.coin_id(),
+    })
+
+
+async def op_similar(ctx: Context) -> httpx.Response:
+    return await ctx.client.get(f"/api/ai/similar/{ctx.coin_id()}")
+
+
+async def op_preview(ctx: Context) -> httpx.Response:
+    return await ctx.client.get("/api/microscope/preview", params={"camera_index": "0"})
+
+
+async def op_export(ctx: Context) -> httpx.Response:
+    return await ctx.client.get("/api/coins/export", params={"format": "csv"})
+
+
+# name -> (operation, share of the configured iterations)
+OPERATIONS: Dict[str, tuple] = {
+    "list": (op_list, 1.0),
+    "search": (op_search, 1.0),
+    "get": (op_get, 1.0),
+    "create": (op_create, 1.0),
+    "upload": (op_upload, 0.5),
+    "analyze": (op_analyze, 0.5),
+    "similar": (op_similar, 1.0),
+    "preview": (op_preview, 0.5),
+    "export": (op_export, 0.05),
+}
+
+
+async def measure(operation: Operation, ctx: Context, iterations: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        await operation(ctx)
+
+    latencies: List[float] = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            try:
+                response = await operation(ctx)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            if failed:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(iterations)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(options: Dict[str, Any]) -> Dict[str, Any]:
+    camera.install(microscope_service, fps=options["camera_fps"])
+    images_path = os.environ["IMAGES_PATH"]
+    seed.ensure_schema(engine, options["init_sql"])
+    image_paths = seed.write_images(images_path)
+    with open(os.path.join(images_path, image_paths[0]), "rb") as handle:
+        upload = handle.read()
+
+    results = []
+    for scale in options["scales"]:
+        seed.reset(engine)
+        token_user_cache.clear()
+        started = time.perf_counter()
+        seeded = seed.seed(engine, scale, image_paths, other_users=options["other_users"])
+        print(f"scale {scale}: seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        user_cache.invalidate(seeded["user_id"])
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            ctx = Context(client, seeded, image_paths, upload, random.Random(scale))
+            for name in options["operations"]:
+                operation, share = OPERATIONS[name]
+                iterations = max(3, int(options["iterations"] * share))
+                summary = await measure(operation, ctx, iterations, options["concurrency"], options["warmup"])
+                results.append({"scale": scale, "operation": name, **summary})
+                print(
+                    f"scale {scale:>7} {name:<8} p50 {summary['p50_ms']} ms  p99 {summary['p99_ms']} ms  "
+                    f"{summary['throughput_rps']} req/s  errors {summary['errors']}",
+                    file=sys.stderr
+                )
+    microscope_service.close_camera()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": {key: value for key, value in options.items() if key != "init_sql"},
+        },
+        "results": results,
+    }
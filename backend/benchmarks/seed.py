@@ -0,0 +1,153 @@
+"""Synthetic users, coins, images, analyses and valuations."""
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import cv2
+from sqlalchemy import inspect, insert, text
+from sqlalchemy.engine import Engine
+
+from app import models
+from app.auth import _get_or_create_default_user
+from app.database import SessionLocal
+from stubs.camera import coin_frame
+
+COUNTRIES = ("United States", "Canada", "United Kingdom", "Germany", "France", "Mexico", "Australia", "Japan", "Italy", "Spain")
+DENOMINATIONS = ("1 Cent", "5 Cents", "10 Cents", "25 Cents", "50 Cents", "1 Dollar", "1 Penny", "2 Euro", "1 Franc", "100 Yen")
+COMPOSITIONS = ("Copper", "Nickel", "Silver", "Copper-Nickel", "Bronze", "Steel")
+GRADES = ("Good", "Very Good", "Fine", "Very Fine", "Extremely Fine", "About Uncirculated", "Uncirculated")
+RARITIES = ("Common", "Scarce", "Rare")
+TABLES = (
+    "revaluation_jobs", "ebay_listings", "valuations", "ai_analyses", "coin_images",
+    "coins", "comparable_sales", "comparable_price_index", "users",
+)
+# Distinct image files on disk; image rows share them so large scales stay cheap to seed
+IMAGE_FILES = 16
+BATCH = 5000
+
+
+def ensure_schema(engine: Engine, init_sql: str) -> None:
+    """Create the schema from database/init.sql unless it is already there."""
+    if inspect(engine).has_table("coins"):
+        return
+    with open(init_sql) as handle:
+        script = handle.read()
+    with engine.begin() as connection:
+        connection.exec_driver_sql(script)
+
+
+def reset(engine: Engine) -> None:
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {', '.join(TABLES)} CASCADE"))
+
+
+def write_images(images_path: str, width: int = 1024, height: int = 1024) -> List[str]:
+    """Write the shared image files; returns their paths relative to images_path."""
+    directory = os.path.join(images_path, "bench")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(IMAGE_FILES):
+        relative = f"bench/coin_{index:02d}.jpg"
+        cv2.imwrite(os.path.join(images_path, relative), coin_frame(width, height, seed=index))
+        paths.append(relative)
+    return paths
+
+
+def _coin(rng: random.Random, user_id: uuid.UUID, prefix: str, number: int) -> Dict[str, Any]:
+    country = rng.choice(COUNTRIES)
+    return {
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "inventory_number": f"{prefix}-{number:07d}",
+        "country": country,
+        "denomination": rng.choice(DENOMINATIONS),
+        "year": rng.randint(1850, 2024),
+        "mint_mark": rng.choice(("", "D", "S", "P", "W")) or None,
+        "composition": rng.choice(COMPOSITIONS),
+        "condition_grade": rng.choice(GRADES),
+        "catalog_number": f"KM#{rng.randint(1, 999)}",
+        "notes": f"Bench coin {number} from {country}",
+        "acquisition_price": round(rng.uniform(0.1, 500), 2),
+        "acquisition_date": datetime(2020, 1, 1) + timedelta(days=rng.randint(0, 1800)),
+        "is_for_sale": rng.random() < 0.1,
+        "location": f"Album {rng.randint(1, 20)}",
+        "created_at": datetime.utcnow() - timedelta(minutes=number),
+    }
+
+
+def _children(rng: random.Random, coin: Dict[str, Any], image_paths: List[str]) -> Dict[str, Dict[str, Any]]:
+    low = round(rng.uniform(0.1, 300), 2)
+    high = round(low * rng.uniform(1.2, 3), 2)
+    return {
+        "image": {
+            "id": uuid.uuid4(),
+            "coin_id": coin["id"],
+            "file_path": rng.choice(image_paths),
+            "file_size": 150000,
+            "image_type": "obverse",
+            "is_primary": True,
+            "width": 1024,
+            "height": 1024,
+            "format": "JPEG",
+        },
+        "analysis": {
+            "id": uuid.uuid4(),
+            "coin_id": coin["id"],
+            "identified_country": coin["country"],
+            "identified_denomination": coin["denomination"],
+            "identified_year": coin["year"],
+            "ai_grade": coin["condition_grade"],
+            "wear_level": "Light",
+            "authenticity_assessment": "Likely Authentic",
+            "authenticity_confidence": 90,
+            "raw_response": {"rarity_estimate": rng.choice(RARITIES)},
+            "model_version": "fake",
+        },
+        "valuation": {
+            "id": uuid.uuid4(),
+            "coin_id": coin["id"],
+            "estimated_value_low": low,
+            "estimated_value_high": high,
+            "estimated_value_avg": round((low + high) / 2, 2),
+            "currency": "USD",
+            "confidence_level": "Medium",
+            "valuation_source": "benchmark",
+        },
+    }
+
+
+def seed(engine: Engine, scale: int, image_paths: List[str], other_users: int = 3, seed_value: int = 1) -> Dict[str, Any]:
+    """Give the default user `scale` coins (other users share as many again); returns their ids."""
+    rng = random.Random(seed_value)
+    db = SessionLocal()
+    try:
+        default_user = _get_or_create_default_user(db)
+        users = [(default_user.id, scale, "BENCH")]
+        for index in range(other_users):
+            user = models.User(username=f"bench{index}", email=f"bench{index}@example.com", hashed_password="!")
+            db.add(user)
+            db.flush()
+            users.append((user.id, scale // max(1, other_users), f"BENCH{index}"))
+        db.commit()
+        default_user_id = default_user.id
+    finally:
+        db.close()
+
+    coin_ids: List[uuid.UUID] = []
+    with engine.begin() as connection:
+        for user_id, count, prefix in users:
+            for start in range(0, count, BATCH):
+                coins = [_coin(rng, user_id, prefix, number) for number in range(start, min(count, start + BATCH))]
+                children = [_children(rng, coin, image_paths) for coin in coins]
+                connection.execute(insert(models.Coin), coins)
+                connection.execute(insert(models.CoinImage), [child["image"] for child in children])
+                # Triggers point coins at their latest analysis and valuation
+                connection.execute(insert(models.AIAnalysis), [child["analysis"] for child in children])
+                connection.execute(insert(models.Valuation), [child["valuation"] for child in children])
+                if user_id == default_user_id:
+                    coin_ids.extend(coin["id"] for coin in coins)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE"))
+    return {"user_id": default_user_id, "coin_ids": coin_ids}
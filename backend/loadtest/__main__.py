@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+
+import httpx
+from sqlalchemy.engine import make_url
+
+from app.metrics import LoopLagMonitor
+from stubs.ebay_trading import FakeTradingServer
+from stubs.gemini import FakeGeminiServer
+
+from . import report
+from .scenario import Recorder, scanner
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(BACKEND)
+
+
+def _users(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+async def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"uvicorn did not become ready within {timeout:.0f}s")
+
+
+async def _poll_workers(base_url: str, windows: Dict[str, List[Dict[str, Any]]], interval: float) -> None:
+    """Drain worker lag windows; a fresh connection each time spreads polls over the workers."""
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0, limits=limits) as client:
+        while True:
+            try:
+                status = (await client.get("/_loadtest/worker")).json()
+                windows[str(status["pid"])].append(status["loop_lag"])
+            except (httpx.HTTPError, ValueError, KeyError):
+                pass
+            await asyncio.sleep(interval)
+
+
+async def drive(base_url: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    stages = []
+    rng = random.Random(args.seed)
+    harness_lag = LoopLagMonitor()
+    harness_lag_task = asyncio.create_task(harness_lag.run())
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+            for users in _users(args.users):
+                recorder = Recorder()
+                windows: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+                harness_lag.drain()
+                poller = asyncio.create_task(_poll_workers(base_url, windows, args.lag_poll_interval))
+                scanners = [
+                    asyncio.create_task(scanner(client, recorder, random.Random(rng.random()), args.framing_seconds, args.review_seconds))
+                    for _ in range(users)
+                ]
+                started = time.perf_counter()
+                await asyncio.sleep(args.stage_seconds)
+                elapsed = time.perf_counter() - started
+                for task in scanners + [poller]:
+                    task.cancel()
+                await asyncio.gather(*scanners, poller, return_exceptions=True)
+
+                stage = {
+                    "users": users,
+                    **recorder.summary(elapsed),
+                    "worker_lag": {pid: report.merge_lag(values) for pid, values in sorted(windows.items())},
+                    "harness_lag": harness_lag.drain(),
+                }
+                stages.append(stage)
+                print(
+                    f"{users:>4} scanners: {stage['sessions']} sessions, {stage['requests_per_second']} req/s, "
+                    f"errors {stage['error_rate']:.1%}, harness lag p99 {stage['harness_lag']['p99_ms']} ms",
+                    file=sys.stderr
+                )
+                for sample in recorder.error_samples[:3]:
+                    print(f"      {sample}", file=sys.stderr)
+    finally:
+        harness_lag_task.cancel()
+    return stages
+
+
+def run(args: argparse.Namespace) -> int:
+    database_url = args.database_url or os.getenv("LOADTEST_DATABASE_URL")
+    if not database_url:
+        print("Pass --database-url or set LOADTEST_DATABASE_URL (a throwaway database)", file=sys.stderr)
+        return 2
+    database = make_url(database_url).database or ""
+    if not args.force and not any(word in database for word in ("load", "bench", "test")):
+        print(f"Refusing to truncate database {database!r}; its name must contain 'load', 'bench' or 'test' (or pass --force)", file=sys.stderr)
+        return 2
+
+    images_path = args.images_path or tempfile.mkdtemp(prefix="nomisma-load-")
+    os.environ.update({"DATABASE_URL": database_url, "IMAGES_PATH": images_path})
+    # Imported late: the app reads its configuration at import time
+    from app.database import engine
+    from benchmarks import seed
+
+    seed.ensure_schema(engine, args.init_sql)
+    seed.reset(engine)
+    engine.dispose()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    with FakeGeminiServer(latency=args.gemini_latency) as gemini, FakeTradingServer(latency=args.ebay_latency) as ebay:
+        env = {
+            **os.environ,
+            "GEMINI_API_KEY": "fake",
+            "GEMINI_MODEL": "gemini-2.5-flash",
+            "GEMINI_API_BASE_URL": gemini.base_url,
+            "EBAY_APP_ID": "fake",
+            "EBAY_DEV_ID": "fake",
+            "EBAY_CERT_ID": "fake",
+            "EBAY_USER_TOKEN": "fake",
+            "EBAY_API_DOMAIN": ebay.domain,
+            "EBAY_API_HTTPS": "false",
+            "METRICS_ENABLED": "true",
+            "WEB_CONCURRENCY": str(args.workers),
+            "LOADTEST_CAMERA_FPS": str(args.camera_fps),
+        }
+        command = [
+            sys.executable, "-m", "uvicorn", "loadtest.app:app",
+            "--host", "127.0.0.1", "--port", str(args.port),
+            "--workers", str(args.workers), "--no-access-log", "--log-level", "warning",
+        ]
+        server = subprocess.Popen(command, cwd=BACKEND, env=env)
+        try:
+            asyncio.run(_wait_ready(base_url, server))
+            print(f"uvicorn ready with {args.workers} worker(s) on {base_url}", file=sys.stderr)
+            stages = asyncio.run(drive(base_url, args))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        gemini_calls, ebay_calls = len(gemini.api.calls), len(ebay.api.calls)
+
+    saturation = report.find_saturation(stages, args.saturation_gain, args.max_error_rate, args.slo_ms)
+    print(report.format_stages(stages))
+    if saturation is None:
+        print("No saturation within the tested range; add stages with more scanners.")
+    else:
+        print(f"Saturates after {saturation['users']} scanner(s) (stage {saturation['tripped_at']}: {'; '.join(saturation['reasons'])})")
+
+    result = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "cpu_count": os.cpu_count(),
+            "options": {key: value for key, value in vars(args).items() if key not in ("handler", "database_url", "init_sql")},
+            "stub_calls": {"gemini": gemini_calls, "ebay": ebay_calls},
+        },
+        "stages": stages,
+        "saturation": saturation,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(result, handle, indent=2)
+    print(f"Report written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Replay ScanCoin sessions against uvicorn and find where it saturates")
+    parser.add_argument("--database-url", help="Throwaway PostgreSQL database (default: LOADTEST_DATABASE_URL); it is truncated")
+    parser.add_argument("--force", action="store_true", help="Allow a database whose name lacks 'load', 'bench' or 'test'")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="Concurrent scanners per stage, comma separated")
+    parser.add_argument("--stage-seconds", type=float, default=60.0)
+    parser.add_argument("--framing-seconds", type=float, default=4.0, help="Preview polling before each capture")
+    parser.add_argument("--review-seconds", type=float, default=5.0, help="Think time between analysis and saving the coin")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--gemini-latency", type=float, default=1.5, help="Seconds per fake Gemini call")
+    parser.add_argument("--ebay-latency", type=float, default=0.3, help="Seconds per fake eBay call")
+    parser.add_argument("--camera-fps", type=float, default=30.0, help="Frame rate of the fake camera")
+    parser.add_argument("--lag-poll-interval", type=float, default=0.25, help="Seconds between worker lag polls")
+    parser.add_argument("--saturation-gain", type=float, default=0.10, help="Session throughput gain below which a stage counts as saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-ms", type=float, help="Session p90 above which a stage counts as saturated")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--init-sql", default=os.path.join(ROOT, "database", "init.sql"), help="Schema applied to an empty database")
+    parser.add_argument("--images-path", help="Image directory shared by the workers (default: a new temporary directory)")
+    parser.add_argument("--output", default="loadtest-report.json")
+    args = parser.parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
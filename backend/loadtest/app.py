@@ -0,0 +1,25 @@
+"""
+ASGI entry point for load tests: the real app with fake cameras and a
+per-worker status endpoint.
+
+    uvicorn loadtest.app:app --workers 4
+"""
+import os
+
+from app.main import app
+from app.metrics import loop_lag_monitor
+from app.services.microscope import microscope_service
+from stubs import camera
+
+camera.install(
+    microscope_service,
+    width=int(os.getenv("LOADTEST_CAMERA_WIDTH", "1920")),
+    height=int(os.getenv("LOADTEST_CAMERA_HEIGHT", "1080")),
+    fps=float(os.getenv("LOADTEST_CAMERA_FPS", "30")),
+)
+
+
+@app.get("/_loadtest/worker", include_in_schema=False)
+async def worker_status():
+    """This worker's pid and event loop lag since the previous call"""
+    return {"pid": os.getpid(), "loop_lag": loop_lag_monitor.drain()}
@@ -0,0 +1,73 @@
+"""Per-stage worker lag aggregation, saturation detection and the summary table."""
+from typing import Any, Dict, List, Optional
+
+
+def merge_lag(windows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the lag windows drained from one worker during a stage.
+
+    Windows only carry percentiles, so the stage p99 is the worst window p99
+    (an upper bound) rather than a recomputed percentile.
+    """
+    windows = [window for window in windows if window.get("samples")]
+    if not windows:
+        return {"samples": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    samples = sum(window["samples"] for window in windows)
+    return {
+        "samples": samples,
+        "p50_ms": round(sum(window["p50_ms"] * window["samples"] for window in windows) / samples, 2),
+        "p99_ms": max(window["p99_ms"] for window in windows),
+        "max_ms": max(window["max_ms"] for window in windows),
+    }
+
+
+def find_saturation(stages: List[Dict[str, Any]], min_gain: float = 0.10, max_error_rate: float = 0.01, slo_p90_ms: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """First stage past which adding scanners stops paying off.
+
+    A stage saturates when its session throughput grew by less than
+    `min_gain` (relative) over the previous stage, when its error rate exceeds
+    `max_error_rate`, or when its p90 session time breaches `slo_p90_ms`.
+    Returns the last healthy stage's user count, the stage that tripped, and
+    why; None when every stage was healthy.
+    """
+    previous = None
+    for stage in stages:
+        reasons = []
+        if stage["error_rate"] > max_error_rate:
+            reasons.append(f"error rate {stage['error_rate']:.1%}")
+        p90 = stage["session"].get("p90_ms")
+        if slo_p90_ms is not None and p90 is not None and p90 > slo_p90_ms:
+            reasons.append(f"session p90 {p90} ms over {slo_p90_ms} ms")
+        if previous is not None and previous["sessions_per_second"]:
+            gain = stage["sessions_per_second"] / previous["sessions_per_second"] - 1
+            if gain < min_gain:
+                reasons.append(f"throughput gain {gain:+.0%} from {previous['users']} to {stage['users']} scanners")
+        if reasons:
+            return {
+                "users": previous["users"] if previous is not None else None,
+                "tripped_at": stage["users"],
+                "reasons": reasons,
+            }
+        previous = stage
+    return None
+
+
+def format_stages(stages: List[Dict[str, Any]]) -> str:
+    header = (
+        f"{'users':>5}  {'sess/s':>7}  {'req/s':>7}  {'errors':>7}  {'sess p50':>9}  {'sess p90':>9}  "
+        f"{'analyze p90':>11}  {'preview p90':>11}  {'loop lag p99 (worst worker)':>27}"
+    )
+    lines = [header, "-" * len(header)]
+    for stage in stages:
+        steps = stage["steps"]
+        worst = max((lag["p99_ms"] for lag in stage["worker_lag"].values() if lag["p99_ms"] is not None), default=None)
+        lines.append(
+            f"{stage['users']:>5}  {stage['sessions_per_second']:>7}  {stage['requests_per_second']:>7}  "
+            f"{stage['error_rate']:>7.1%}  {_ms(stage['session'].get('p50_ms')):>9}  {_ms(stage['session'].get('p90_ms')):>9}  "
+            f"{_ms(steps.get('analyze', {}).get('p90_ms')):>11}  {_ms(steps.get('preview', {}).get('p90_ms')):>11}  "
+            f"{_ms(worst):>27}"
+        )
+    return "\n".join(lines)
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f} ms"
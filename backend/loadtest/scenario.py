@@ -0,0 +1,118 @@
+"""The ScanCoin session replayed by every virtual scanner."""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.report import summarize
+
+STEPS = ("preview", "capture", "analyze", "create", "attach", "reanalyze", "detail")
+
+
+class Recorder:
+    """Latencies and errors per step, plus completed sessions, for one load step"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: List[str] = []
+        self.sessions: List[float] = []
+
+    async def call(self, step: str, request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception as e:
+            self._error(step, f"{type(e).__name__}: {str(e)}")
+            raise
+        if response.status_code >= 400:
+            self._error(step, f"HTTP {response.status_code}: {response.text[:200]}")
+            response.raise_for_status()
+        self.latencies[step].append(time.perf_counter() - started)
+        return response
+
+    def _error(self, step: str, message: str) -> None:
+        self.errors[step] += 1
+        if len(self.error_samples) < 10:
+            self.error_samples.append(f"{step}: {message}")
+
+    def summary(self, seconds: float) -> Dict[str, Any]:
+        steps = {
+            step: summarize(self.latencies.get(step, []), self.errors.get(step, 0), seconds)
+            for step in STEPS
+            if step in self.latencies or step in self.errors
+        }
+        requests = sum(len(values) for values in self.latencies.values())
+        errors = sum(self.errors.values())
+        return {
+            "sessions": len(self.sessions),
+            "sessions_per_second": round(len(self.sessions) / seconds, 3) if seconds > 0 else None,
+            "requests_per_second": round(requests / seconds, 2) if seconds > 0 else None,
+            "error_rate": round(errors / (requests + errors), 4) if requests + errors else 0.0,
+            "session": summarize(self.sessions, 0, seconds),
+            "steps": steps,
+            "error_samples": self.error_samples,
+        }
+
+
+class ScanSession:
+    """One scanner at the ScanCoin page.
+
+    Mirrors the frontend: the preview is polled every 750 ms while the coin is
+    framed, the sharpest frame is captured and analyzed, the user reviews the
+    result, then the coin is created, the capture attached and analyzed again
+    with the coin id, and the coin page opens.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, framing_seconds: float, review_seconds: float, camera_index: str = "0"):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.framing_seconds = framing_seconds
+        self.review_seconds = review_seconds
+        self.camera_index = camera_index
+
+    def _think(self, seconds: float) -> float:
+        # +/- 30% so scanners do not march in lockstep
+        return seconds * self.rng.uniform(0.7, 1.3)
+
+    async def run(self) -> None:
+        call = self.recorder.call
+        started = time.perf_counter()
+
+        framing_until = time.monotonic() + self._think(self.framing_seconds)
+        while time.monotonic() < framing_until:
+            await call("preview", self.client.get("/api/microscope/preview", params={"camera_index": self.camera_index}))
+            await asyncio.sleep(0.75)
+
+        capture = (await call("capture", self.client.post("/api/microscope/capture", params={"camera_index": self.camera_index}))).json()
+        analysis = (await call("analyze", self.client.post("/api/ai/analyze", json={"image_path": capture["file_path"]}))).json()
+        await asyncio.sleep(self._think(self.review_seconds))
+
+        identification = (analysis.get("analysis") or {}).get("identification", {})
+        coin = (await call("create", self.client.post("/api/coins/", json={
+            "country": identification.get("country") or "Unknown",
+            "denomination": identification.get("denomination"),
+            "year": identification.get("year") if isinstance(identification.get("year"), int) else None,
+            "notes": "load test",
+        }))).json()
+        image = (await call("attach", self.client.post(
+            f"/api/coins/{coin['id']}/images/from-capture",
+            json={"file_path": capture["file_path"], "image_type": "obverse", "is_primary": True},
+        ))).json()
+        await call("reanalyze", self.client.post("/api/ai/analyze", json={"image_path": image["file_path"], "coin_id": coin["id"]}))
+        await call("detail", self.client.get(f"/api/coins/{coin['id']}"))
+
+        self.recorder.sessions.append(time.perf_counter() - started)
+
+
+async def scanner(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, framing_seconds: float, review_seconds: float) -> None:
+    """Run sessions back to back until cancelled; a failed session starts over."""
+    while True:
+        try:
+            await ScanSession(client, recorder, rng, framing_seconds, review_seconds).run()
+        except (httpx.HTTPError, KeyError, ValueError):
+            await asyncio.sleep(1.0)
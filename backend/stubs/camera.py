@@ -0,0 +1,116 @@
+"""
+Fake microscope camera.
+
+``FakeCamera`` behaves like an opened ``cv2.VideoCapture``: ``read()`` blocks
+until the next frame is due at the configured frame rate and returns a
+synthetic coin image, or the JPEG bitstream when the caller switched to raw
+MJPEG mode (``CAP_PROP_CONVERT_RGB`` off), as a UVC microscope does.
+
+``install(microscope_service)`` makes a service open fake cameras instead of
+real devices.
+"""
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def coin_frame(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """A textured disc on a dark background, sharp enough to score and compress like a real coin."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(10, 40, size=(height, width, 3), dtype=np.uint8)
+    center = (width // 2, height // 2)
+    radius = int(min(width, height) * 0.4)
+    cv2.circle(frame, center, radius, (150, 160, 170), -1)
+    relief = rng.integers(0, 60, size=(height, width), dtype=np.uint8)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.circle(mask, center, radius, 255, -1)
+    frame[mask > 0] = np.clip(frame[mask > 0].astype(np.int16) + relief[mask > 0, None] - 30, 0, 255).astype(np.uint8)
+    cv2.putText(frame, "1943", (center[0] - radius // 3, center[1]), cv2.FONT_HERSHEY_SIMPLEX, radius / 80, (60, 60, 60), 3)
+    return frame
+
+
+class FakeCamera:
+    """Stand-in for an opened cv2.VideoCapture"""
+
+    def __init__(self, width: int = 1920, height: int = 1080, fps: float = 30.0, mjpeg: bool = True, frames: int = 4):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.mjpeg = mjpeg
+        self._frames = [coin_frame(width, height, seed) for seed in range(frames)]
+        self._jpegs = [np.frombuffer(cv2.imencode(".jpg", frame)[1].tobytes(), dtype=np.uint8) for frame in self._frames]
+        fourcc = cv2.VideoWriter_fourcc(*("MJPG" if mjpeg else "YUYV"))
+        self.props = {
+            cv2.CAP_PROP_FOURCC: fourcc,
+            cv2.CAP_PROP_FRAME_WIDTH: width,
+            cv2.CAP_PROP_FRAME_HEIGHT: height,
+            cv2.CAP_PROP_CONVERT_RGB: 1,
+        }
+        self.opened = True
+        self.reads = 0
+        self._next_frame_at = 0.0
+        self._lock = threading.Lock()
+
+    def isOpened(self) -> bool:
+        return self.opened
+
+    def get(self, prop) -> float:
+        return self.props.get(prop, 0)
+
+    def set(self, prop, value) -> bool:
+        # Like a real camera, resolution and format requests are ignored
+        if prop == cv2.CAP_PROP_CONVERT_RGB:
+            self.props[prop] = value
+        return True
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self.opened:
+            return False, None
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_frame_at - now
+            self._next_frame_at = max(now, self._next_frame_at) + (1.0 / self.fps if self.fps else 0.0)
+            index = self.reads % len(self._frames)
+            self.reads += 1
+        if wait > 0:
+            time.sleep(wait)
+        if self.mjpeg and not self.props[cv2.CAP_PROP_CONVERT_RGB]:
+            return True, self._jpegs[index].copy()
+        return True, self._frames[index].copy()
+
+    def release(self) -> None:
+        self.opened = False
+
+
+class OverlapCamera(FakeCamera):
+    """FakeCamera that records how many threads use it at once, for locking tests"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = self.overlap = 0
+        self._guard = threading.Lock()
+
+    def _use(self, call, *args):
+        with self._guard:
+            self.active += 1
+            self.overlap = max(self.overlap, self.active)
+        try:
+            time.sleep(0.002)
+            return call(*args)
+        finally:
+            with self._guard:
+                self.active -= 1
+
+    def read(self):
+        return self._use(super().read)
+
+    def set(self, prop, value):
+        return self._use(super().set, prop, value)
+
+
+def install(service, width: int = 1920, height: int = 1080, fps: float = 30.0, mjpeg: bool = True) -> None:
+    """Make a MicroscopeService open FakeCameras for every camera index."""
+    service._open_capture = lambda camera_index: FakeCamera(width, height, fps, mjpeg)
@@ -0,0 +1,265 @@
+"""
+Fake eBay Trading API server.
+
+Speaks just enough of the Trading XML protocol for ``ebaysdk`` to talk to it:
+listings created through it are kept in memory and can be read back. Point the
+backend at it with::
+
+    EBAY_API_DOMAIN=localhost:9101 EBAY_API_HTTPS=false
+
+and run it standalone with ``python -m stubs.ebay_trading --port 9101``.
+"""
+import argparse
+import itertools
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+NS = "urn:ebay:apis:eBLBaseComponents"
+
+
+def _find(element: ET.Element, path: str) -> Optional[ET.Element]:
+    return element.find("/".join(f"{{{NS}}}{part}" for part in path.split("/")))
+
+
+def _text(element: ET.Element, path: str, default: str = "") -> str:
+    found = _find(element, path)
+    return found.text if found is not None and found.text is not None else default
+
+
+def _timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class FakeTradingAPI:
+    """In-memory listing store plus the call handlers."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.calls: List[str] = []
+        self.fail_calls: Dict[str, str] = {}
+        self._ids = itertools.count(110000000001)
+        self._lock = threading.Lock()
+
+    def _add_item(self, item: ET.Element) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        with self._lock:
+            item_id = str(next(self._ids))
+            record = {
+                "item_id": item_id,
+                "title": _text(item, "Title"),
+                "price": float(_text(item, "BuyItNowPrice") or _text(item, "StartPrice") or 0),
+                "status": "Active",
+                "quantity_sold": 0,
+                "start_time": now,
+                "end_time": now + timedelta(days=7),
+                "modified_at": now,
+                "buyer": None,
+            }
+            self.items[item_id] = record
+        return record
+
+    def sell(self, item_id: str, price: Optional[float] = None, buyer: str = "fakebuyer") -> None:
+        """Mark an item sold, as a buyer would."""
+        with self._lock:
+            record = self.items[item_id]
+            record["status"] = "Completed"
+            record["quantity_sold"] = 1
+            record["price"] = price if price is not None else record["price"]
+            record["end_time"] = datetime.utcnow()
+            record["modified_at"] = datetime.utcnow()
+            record["buyer"] = buyer
+
+    def _item_xml(self, record: Dict[str, Any]) -> str:
+        buyer = ""
+        if record["buyer"]:
+            buyer = f"<HighBidder><UserID>{escape(record['buyer'])}</UserID></HighBidder>"
+        return (
+            "<Item>"
+            f"<ItemID>{record['item_id']}</ItemID>"
+            f"<Title>{escape(record['title'])}</Title>"
+            "<ListingDetails>"
+            f"<StartTime>{_timestamp(record['start_time'])}</StartTime>"
+            f"<EndTime>{_timestamp(record['end_time'])}</EndTime>"
+            "</ListingDetails>"
+            "<SellingStatus>"
+            f"<CurrentPrice currencyID=\"USD\">{record['price']:.2f}</CurrentPrice>"
+            f"<QuantitySold>{record['quantity_sold']}</QuantitySold>"
+            f"<ListingStatus>{record['status']}</ListingStatus>"
+            f"{buyer}"
+            "</SellingStatus>"
+            "<HitCount>0</HitCount>"
+            "<WatchCount>0</WatchCount>"
+            "</Item>"
+        )
+
+    def handle(self, call_name: str, body: bytes) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls.append(call_name)
+
+        if call_name in self.fail_calls:
+            return self._error(call_name, self.fail_calls[call_name])
+
+        request = ET.fromstring(body)
+        handler = getattr(self, f"_call_{call_name}", None)
+        if handler is None:
+            return self._error(call_name, f"Unsupported call {call_name}")
+        return self._envelope(call_name, handler(request))
+
+    def _call_AddItem(self, request: ET.Element) -> str:
+        record = self._add_item(_find(request, "Item"))
+        return (
+            f"<ItemID>{record['item_id']}</ItemID>"
+            f"<StartTime>{_timestamp(record['start_time'])}</StartTime>"
+            f"<EndTime>{_timestamp(record['end_time'])}</EndTime>"
+            "<Fees><Fee><Name>ListingFee</Name><Fee currencyID=\"USD\">0.35</Fee></Fee></Fees>"
+        )
+
+    _call_AddFixedPriceItem = _call_AddItem
+
+    def _call_AddItems(self, request: ET.Element) -> str:
+        containers = []
+        for container in request.findall(f"{{{NS}}}AddItemRequestContainer"):
+            message_id = _text(container, "MessageID")
+            item = _find(container, "Item")
+            if not _text(item, "Title"):
+                containers.append(
+                    "<AddItemResponseContainer>"
+                    f"<CorrelationID>{escape(message_id)}</CorrelationID>"
+                    "<Errors><ShortMessage>Missing title</ShortMessage>"
+                    "<LongMessage>The item title is missing.</LongMessage>"
+                    "<SeverityCode>Error</SeverityCode></Errors>"
+                    "</AddItemResponseContainer>"
+                )
+                continue
+            record = self._add_item(item)
+            containers.append(
+                "<AddItemResponseContainer>"
+                f"<ItemID>{record['item_id']}</ItemID>"
+                f"<StartTime>{_timestamp(record['start_time'])}</StartTime>"
+                f"<EndTime>{_timestamp(record['end_time'])}</EndTime>"
+                f"<CorrelationID>{escape(message_id)}</CorrelationID>"
+                "</AddItemResponseContainer>"
+            )
+        return "".join(containers)
+
+    def _call_GetItem(self, request: ET.Element) -> str:
+        item_id = _text(request, "ItemID")
+        record = self.items.get(item_id)
+        if record is None:
+            raise KeyError(item_id)
+        return self._item_xml(record)
+
+    def _call_GetSellerEvents(self, request: ET.Element) -> str:
+        def parse(value: str) -> datetime:
+            return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+
+        mod_from = parse(_text(request, "ModTimeFrom"))
+        mod_to = parse(_text(request, "ModTimeTo"))
+        items = [
+            self._item_xml(record)
+            for record in list(self.items.values())
+            if mod_from <= record["modified_at"].replace(microsecond=0) <= mod_to
+        ]
+        return f"<ItemArray>{''.join(items)}</ItemArray>"
+
+    def _envelope(self, call_name: str, body: str) -> str:
+        return (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            f"<{call_name}Response xmlns=\"{NS}\">"
+            f"<Timestamp>{_timestamp(datetime.utcnow())}</Timestamp>"
+            "<Ack>Success</Ack>"
+            f"{body}"
+            f"</{call_name}Response>"
+        )
+
+    def _error(self, call_name: str, message: str) -> str:
+        return (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            f"<{call_name}Response xmlns=\"{NS}\">"
+            "<Ack>Failure</Ack>"
+            "<Errors><ShortMessage>Error</ShortMessage>"
+            f"<LongMessage>{escape(message)}</LongMessage>"
+            "<ErrorCode>10007</ErrorCode><SeverityCode>Error</SeverityCode></Errors>"
+            f"</{call_name}Response>"
+        )
+
+
+class FakeTradingServer:
+    """Run a FakeTradingAPI on a background HTTP server."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.api = FakeTradingAPI(latency=latency)
+        api = self.api
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                body = self.rfile.read(length)
+                call_name = self.headers.get("X-EBAY-API-CALL-NAME", "")
+                try:
+                    payload = api.handle(call_name, body).encode("utf-8")
+                except Exception as e:
+                    payload = api._error(call_name, str(e)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def domain(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "FakeTradingServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeTradingServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake eBay Trading API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every call")
+    args = parser.parse_args()
+
+    server = FakeTradingServer(args.host, args.port, args.latency)
+    print(f"Fake eBay Trading API listening on http://{server.domain}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Fake Gemini API server.
+
+Answers the REST calls ``VisionAIService`` makes (model listing,
+``generateContent`` with inline images or uploaded files, and the resumable
+file upload) with canned coin analyses and valuations after a configurable
+delay. Point the backend at it with::
+
+    GEMINI_API_KEY=fake GEMINI_MODEL=gemini-2.5-flash GEMINI_API_BASE_URL=http://localhost:9102
+
+and run it standalone with ``python -m stubs.gemini --port 9102``.
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+MODELS = ("gemini-2.5-flash-image", "gemini-2.5-flash")
+
+ANALYSIS = {
+    "identification": {
+        "country": "United States",
+        "denomination": "1 Cent",
+        "year": 1943,
+        "mint_mark": "D",
+        "composition": "Steel with zinc coating"
+    },
+    "condition": {
+        "grade": "Very Fine",
+        "wear_level": "Light",
+        "surface_quality": "Good",
+        "strike_quality": "Average",
+        "luster": "Partial"
+    },
+    "defects": {"scratches": "None", "dents": "None", "corrosion": "None", "cleaning": "No", "other": "None"},
+    "errors": {"doubled_die": "No", "off_center": "No", "missing_elements": "None", "other_errors": "None"},
+    "authenticity": {"assessment": "Likely Authentic", "confidence": 90, "concerns": "None"},
+    "notable_features": "Wartime steel penny",
+    "rarity_estimate": "Common"
+}
+
+VALUATION = {
+    "estimated_value_low": 0.5,
+    "estimated_value_high": 2.0,
+    "estimated_value_avg": 1.0,
+    "rarity_score": 3,
+    "condition_multiplier": 1.2,
+    "market_demand": "Moderate",
+    "confidence_level": "Medium",
+    "valuation_notes": "Common wartime steel penny in circulated condition"
+}
+
+VALUATION_TEXT = "Estimated value: $0.50 - $2.00 in Very Fine condition. Demand is moderate."
+
+_GENERATE = re.compile(r"^/(?P<version>[^/]+)/models/(?P<model>[^/:]+):generateContent$")
+_MODELS = re.compile(r"^/(?P<version>[^/]+)/models$")
+_UPLOAD = re.compile(r"^/upload/(?P<version>[^/]+)/files$")
+_SESSION = re.compile(r"^/upload-session/(?P<session>\d+)$")
+
+
+class FakeGeminiAPI:
+    """Canned responses plus the call log and failure switches."""
+
+    def __init__(self, latency: float = 0.0, upload_latency: Optional[float] = None):
+        self.latency = latency
+        self.upload_latency = latency if upload_latency is None else upload_latency
+        self.calls: List[str] = []
+        # Model name -> HTTP status returned for it (e.g. 404, 429, 500)
+        self.fail_models: Dict[str, int] = {}
+        self._sessions = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _log(self, call: str) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def handle(self, method: str, path: str, body: bytes, host: str) -> Tuple[int, Dict[str, str], Dict[str, Any]]:
+        """Return (status, extra headers, JSON body)."""
+        path = path.split("?", 1)[0]
+        if method == "GET" and _MODELS.match(path):
+            self._log("list_models")
+            return 200, {}, {"models": [
+                {"name": f"models/{name}", "supportedGenerationMethods": ["generateContent"]} for name in MODELS
+            ]}
+
+        match = _GENERATE.match(path)
+        if method == "POST" and match:
+            model = match.group("model")
+            self._log(f"generate:{model}")
+            time.sleep(self.latency)
+            if model in self.fail_models:
+                status = self.fail_models[model]
+                return status, {}, {"error": {"code": status, "message": f"Model {model} not found" if status == 404 else "Fake failure", "status": "NOT_FOUND" if status == 404 else "INTERNAL"}}
+            return 200, {}, self._generate(model, body)
+
+        if method == "POST" and _UPLOAD.match(path):
+            self._log("upload_start")
+            session = next(self._sessions)
+            return 200, {"x-goog-upload-url": f"http://{host}/upload-session/{session}"}, {}
+
+        match = _SESSION.match(path)
+        if method == "POST" and match:
+            self._log("upload_finalize")
+            time.sleep(self.upload_latency)
+            name = f"files/fake-{match.group('session')}"
+            return 200, {}, {"file": {"name": name, "uri": f"http://{host}/v1beta/{name}", "mimeType": "image/jpeg"}}
+
+        return 404, {}, {"error": {"code": 404, "message": f"Unknown path {path}", "status": "NOT_FOUND"}}
+
+    def _generate(self, model: str, body: bytes) -> Dict[str, Any]:
+        # Image valuations reference an uploaded file; analyses ask for a rarity estimate
+        if b"fileData" in body or b"file_data" in body:
+            text = VALUATION_TEXT
+        elif b"rarity_estimate" in body and b"estimated_value" not in body:
+            text = json.dumps(ANALYSIS)
+        else:
+            text = json.dumps(VALUATION)
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+            "modelVersion": model,
+        }
+
+
+class FakeGeminiServer:
+    """Run a FakeGeminiAPI on a background HTTP server."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, upload_latency: Optional[float] = None):
+        self.api = FakeGeminiAPI(latency=latency, upload_latency=upload_latency)
+        api = self.api
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                body = self.rfile.read(length)
+                status, headers, payload = api.handle(self.command, self.path, body, self.headers.get("Host", ""))
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGeminiServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeGeminiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Gemini API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9102)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every generateContent call")
+    parser.add_argument("--upload-latency", type=float, help="Seconds added to every file upload (default: --latency)")
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(args.host, args.port, args.latency, args.upload_latency)
+    print(f"Fake Gemini API listening on {server.base_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.auth import get_request_user
+from app.database import get_db
+from app.main import app
+from app.routes import ai
+
+
+def test_analyze_returns_local_valuation_notes_as_text(monkeypatch, tmp_path):
+    (tmp_path / "coin.jpg").write_bytes(b"jpeg")
+    monkeypatch.setattr(ai, "IMAGES_PATH", str(tmp_path))
+    monkeypatch.setattr(ai.vision_ai_service, "analyze_coin", lambda path: {
+        "success": True,
+        "analysis": {"identification": {"country": "United States"}, "condition": {"grade": "VF-20"}},
+    })
+    monkeypatch.setattr(ai.valuation_engine, "estimate", lambda db, coin, analysis: {
+        "success": True,
+        "confident": True,
+        "valuation": {"estimated_value_avg": 12.5, "valuation_notes": "Median of 8 comparable sales"},
+        "model_version": "local-comparables",
+    })
+    app.dependency_overrides[get_request_user] = lambda: SimpleNamespace(id=None)
+    app.dependency_overrides[get_db] = lambda: None
+    try:
+        response = TestClient(app).post("/api/ai/analyze", json={"image_path": "coin.jpg"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.json()["valuation_text"] == "Median of 8 comparable sales"
+    assert response.json()["valuation_model"] == "local-comparables"
@@ -0,0 +1,47 @@
+import uuid
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.analytics import collection_analytics
+
+
+class RecordingSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.sql = None
+
+    def execute(self, query):
+        self.sql = str(query.compile(dialect=postgresql.dialect()))
+        return self.rows
+
+
+def _row(group_set, **values):
+    defaults = {
+        "country": None, "denomination": None, "decade": None, "condition_grade": None,
+        "coins": 0, "valued_coins": 0, "value": 0, "acquisition_cost": 0, "valued_cost": 0, "acquired_value": 0,
+        "for_sale_coins": 0, "for_sale_value": 0, "share": None, "rank": 1,
+    }
+    return SimpleNamespace(group_set=group_set, **{**defaults, **values})
+
+
+def test_analytics_aggregates_in_one_grouping_sets_query():
+    db = RecordingSession([
+        _row(0b1111, coins=3, valued_coins=2, value=150, acquisition_cost=65, valued_cost=40, acquired_value=100,
+             for_sale_coins=1, for_sale_value=50),
+        _row(0b0111, country="United States", coins=2, value=100, share=0.6667, rank=1),
+        _row(0b0111, country=None, coins=1, value=50, share=0.3333, rank=2),
+        _row(0b1101, decade=1920, coins=3, value=150, share=1, rank=1),
+    ])
+
+    result = collection_analytics(db, uuid.uuid4(), top=1)
+
+    assert "GROUPING SETS" in db.sql
+    assert "latest_valuation_id" in db.sql
+    assert result["total_coins"] == 3
+    assert result["total_value"] == 150.0
+    assert result["acquisition"] == {"cost": 40.0, "current_value": 100.0, "gain": 60.0, "unvalued_cost": 25.0}
+    assert "FILTER (WHERE anon_1.value IS NOT NULL)" in db.sql
+    assert result["for_sale"] == {"coins": 1, "value": 50.0}
+    assert [entry["key"] for entry in result["by_country"]] == ["United States"]
+    assert result["by_decade"][0]["key"] == "1920s"
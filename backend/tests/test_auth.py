@@ -0,0 +1,130 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import inspect
+
+from app import auth, models
+
+
+class CountingSession:
+    def __init__(self, user):
+        self.user = user
+        self.queries = 0
+
+    def query(self, model):
+        self.queries += 1
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def first(self):
+        return self.user
+
+    def get(self, model, user_id):
+        self.queries += 1
+        return self.user if self.user.id == user_id else None
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    auth.token_user_cache.clear()
+    yield
+    auth.token_user_cache.clear()
+
+
+def _user(**fields):
+    return models.User(id=uuid.uuid4(), username="alice", email="alice@example.com",
+                       hashed_password="x", is_active=True, token_version=0, **fields)
+
+
+def test_token_user_is_cached_as_detached_snapshot():
+    db = CountingSession(_user())
+    token = auth.create_access_token({"sub": "alice"})
+
+    first = auth._get_user_from_token(token, db)
+    second = auth._get_user_from_token(token, db)
+
+    assert db.queries == 1
+    assert first is second
+    assert inspect(first).detached
+
+
+def test_invalidate_forces_reload_and_inactive_users_are_rejected():
+    user = _user()
+    db = CountingSession(user)
+    token = auth.create_access_token({"sub": "alice"})
+    auth._get_user_from_token(token, db)
+
+    user.is_active = False
+    auth.token_user_cache.invalidate(user.id)
+
+    with pytest.raises(auth.HTTPException) as rejected:
+        auth._get_user_from_token(token, db)
+    assert rejected.value.status_code == 403
+    assert db.queries == 2
+
+
+def test_id_claim_survives_rename_and_version_bump_revokes():
+    user = _user()
+    db = CountingSession(user)
+    token = auth.create_access_token(auth.token_claims(user))
+    # Issued before the id and version claims
+    legacy_token = auth.create_access_token({"sub": "alice2"})
+
+    user.username = "alice2"
+    assert auth._get_user_from_token(token, db).id == user.id
+    assert auth._get_user_from_token(legacy_token, db).id == user.id
+
+    user.token_version = 1
+    auth.token_user_cache.invalidate(user.id)
+    for revoked in (token, legacy_token):
+        with pytest.raises(auth.HTTPException) as rejected:
+            auth._get_user_from_token(revoked, db)
+        assert rejected.value.detail == "Token has been revoked"
+    assert auth._get_user_from_token(auth.create_access_token(auth.token_claims(user)), db).id == user.id
+
+
+def test_password_verify_runs_off_loop_and_upgrades_outdated_hashes():
+    old_hash = auth.CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=1000).hash("secret")
+    hasher = auth.PasswordHasher()
+
+    valid, new_hash = asyncio.run(hasher.verify("secret", old_hash))
+    assert valid
+    assert f"${auth.PASSWORD_HASH_ROUNDS}$" in new_hash
+
+    assert asyncio.run(hasher.verify("wrong", old_hash)) == (False, None)
+
+
+def test_login_throttle_limits_attempts_per_client():
+    throttle = auth.LoginThrottle()
+    throttle.max_attempts = 2
+
+    assert throttle.hit("10.0.0.1") is None
+    assert throttle.hit("10.0.0.1") is None
+    assert throttle.hit("10.0.0.1") > 0
+    assert throttle.hit("10.0.0.2") is None
+
+    throttle.reset("10.0.0.1")
+    assert throttle.hit("10.0.0.1") is None
+
+
+def test_login_attempts_are_counted_per_username(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.database import get_db
+    from app.main import app
+
+    # Every request comes from the same address, as behind a proxy
+    monkeypatch.setattr(auth, "login_throttle", auth.LoginThrottle())
+    auth.login_throttle.max_attempts = 2
+    app.dependency_overrides[get_db] = lambda: CountingSession(None)
+    try:
+        client = TestClient(app)
+        statuses = [client.post("/api/auth/login", data={"username": "alice", "password": "x"}).status_code for _ in range(3)]
+        other = client.post("/api/auth/login", data={"username": "bob", "password": "x"}).status_code
+    finally:
+        app.dependency_overrides.clear()
+
+    assert statuses == [401, 401, 429]
+    assert other == 401
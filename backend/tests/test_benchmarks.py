@@ -0,0 +1,76 @@
+import asyncio
+import random
+
+import cv2
+import httpx
+import numpy as np
+
+from benchmarks import report
+from stubs.gemini import FakeGeminiServer
+
+
+def test_summary_percentiles():
+    summary = report.summarize([i / 1000 for i in range(1, 101)], errors=2, wall_seconds=2.0)
+
+    assert summary["iterations"] == 102
+    assert summary["p50_ms"] == 50.0
+    assert summary["p99_ms"] == 99.0
+    assert summary["throughput_rps"] == 50.0
+
+
+def test_compare_flags_regressions():
+    before = {"results": [
+        {"scale": 100, "operation": "list", "p50_ms": 10.0, "p99_ms": 20.0, "throughput_rps": 100.0},
+        {"scale": 100, "operation": "get", "p50_ms": 5.0, "p99_ms": 9.0, "throughput_rps": 200.0},
+    ]}
+    after = {"results": [
+        {"scale": 100, "operation": "list", "p50_ms": 15.0, "p99_ms": 30.0, "throughput_rps": 66.0},
+        {"scale": 100, "operation": "get", "p50_ms": 5.1, "p99_ms": 9.0, "throughput_rps": 198.0},
+    ]}
+
+    rows = {row["operation"]: row for row in report.compare(before, after)}
+
+    assert rows["list"]["verdict"] == "slower"
+    assert rows["list"]["p50_ms_change"] == 0.5
+    assert rows["get"]["verdict"] == "same"
+
+
+def test_vision_service_talks_to_fake_gemini(monkeypatch, tmp_path):
+    image = tmp_path / "coin.jpg"
+    cv2.imwrite(str(image), np.zeros((32, 32, 3), dtype=np.uint8))
+    with FakeGeminiServer() as gemini:
+        monkeypatch.setenv("GEMINI_API_KEY", "fake")
+        monkeypatch.setenv("GEMINI_MODEL", "gemini-2.5-flash")
+        monkeypatch.setenv("GEMINI_API_BASE_URL", gemini.base_url)
+        from app.services.vision_ai import VisionAIService
+        service = VisionAIService()
+
+        analysis = service.analyze_coin(str(image))
+        valuation = service.estimate_value_from_image(str(image), analysis["analysis"], {})
+        service.estimate_value_from_image(str(image), analysis["analysis"], {})
+
+    assert analysis["success"] and analysis["analysis"]["rarity_estimate"] == "Common"
+    assert valuation["success"] and "$0.50" in valuation["formatted_response"]
+    assert gemini.api.calls.count("upload_finalize") == 1
+
+
+def test_preview_operation_with_fake_camera(monkeypatch):
+    from app.main import app
+    from benchmarks import runner
+    from stubs.camera import FakeCamera
+
+    monkeypatch.setattr(runner.microscope_service, "_open_capture", lambda index: FakeCamera(320, 240, fps=0))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            ctx = runner.Context(client, {"coin_ids": []}, [], b"", random.Random(0))
+            return await runner.measure(runner.op_preview, ctx, iterations=5, concurrency=2, warmup=1)
+
+    try:
+        summary = asyncio.run(scenario())
+    finally:
+        runner.microscope_service.close_camera()
+
+    assert summary["errors"] == 0
+    assert summary["iterations"] == 5
@@ -0,0 +1,58 @@
+import uuid
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.auth import get_request_user
+from app.cache import MemoryBackend, UserCache, user_cache
+from app.database import get_db
+from app.main import app
+
+
+def test_coin_invalidation_keeps_other_coins_and_drops_collection_entries():
+    cache = UserCache(backend=MemoryBackend(max_entries=100))
+    user, coin_a, coin_b = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    for key, coin_id in (("coin", coin_a), ("coin", coin_b), ("analytics", None)):
+        entry_key, _ = cache.lookup(user, key, coin_id)
+        cache.store(entry_key, key)
+
+    cache.invalidate(user, coin_a)
+
+    assert cache.lookup(user, "coin", coin_a)[1] is None
+    assert cache.lookup(user, "coin", coin_b)[1] == "coin"
+    assert cache.lookup(user, "analytics")[1] is None
+
+    cache.invalidate(user)
+    assert cache.lookup(user, "coin", coin_b)[1] is None
+
+
+def test_write_during_read_leaves_stale_value_unreachable():
+    cache = UserCache(backend=MemoryBackend(max_entries=100))
+    user, coin = uuid.uuid4(), uuid.uuid4()
+
+    entry_key, _ = cache.lookup(user, "coin", coin)
+    cache.invalidate(user, coin)  # a write lands while the response is being built
+    cache.store(entry_key, "stale")
+
+    assert cache.lookup(user, "coin", coin)[1] is None
+
+
+def test_get_coin_answers_if_none_match_from_cache():
+    user = SimpleNamespace(id=uuid.uuid4())
+    coin_id = uuid.uuid4()
+    entry_key, _ = user_cache.lookup(user.id, "coin", coin_id)
+    user_cache.store(entry_key, {"etag": '"abc"', "body": {"id": str(coin_id)}})
+
+    app.dependency_overrides[get_request_user] = lambda: user
+    app.dependency_overrides[get_db] = lambda: None
+    try:
+        client = TestClient(app)
+        response = client.get(f"/api/coins/{coin_id}")
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"abc"'
+        assert response.json() == {"id": str(coin_id)}
+
+        response = client.get(f"/api/coins/{coin_id}", headers={"If-None-Match": '"abc"'})
+        assert response.status_code == 304
+    finally:
+        app.dependency_overrides.clear()
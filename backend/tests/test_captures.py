@@ -0,0 +1,91 @@
+import os
+
+import pytest
+from PIL import Image
+
+from app.services.captures import CaptureStore
+
+
+def _store(tmp_path, **overrides):
+    store = CaptureStore()
+    store.images_path = str(tmp_path)
+    store.temp_dir = os.path.join(str(tmp_path), "temp")
+    for key, value in overrides.items():
+        setattr(store, key, value)
+    os.makedirs(store.temp_dir, exist_ok=True)
+    return store
+
+
+def _capture(store, name, mtime=None):
+    path = os.path.join(store.temp_dir, name)
+    Image.new("RGB", (32, 24), "white").save(path, format="JPEG")
+    store.write_metadata(path, {"score": 1.0})
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_promote_moves_capture_and_keeps_metadata(tmp_path):
+    store = _store(tmp_path)
+    capture_path = _capture(store, "capture_1.jpg")
+
+    relative_path, metadata = store.promote("temp/capture_1.jpg", "coin-1", "obverse")
+
+    assert not os.path.exists(capture_path)
+    assert not os.path.exists(capture_path + ".json")
+    assert os.path.isfile(os.path.join(str(tmp_path), relative_path))
+    assert relative_path.startswith("coin-1/obverse_")
+    assert (metadata["width"], metadata["height"], metadata["format"]) == (32, 24, "JPEG")
+    assert metadata["sharpness"] == {"score": 1.0}
+
+    with pytest.raises(FileNotFoundError):
+        store.promote("temp/capture_1.jpg", "coin-1", "obverse")
+
+
+def test_promote_rejects_paths_outside_temp(tmp_path):
+    store = _store(tmp_path)
+    with pytest.raises(ValueError):
+        store.promote("temp/../coin-1/obverse.jpg", "coin-2", "obverse")
+
+
+def test_promote_rejects_image_types_that_are_not_plain_names(tmp_path):
+    from pydantic import ValidationError
+    from app.schemas import CapturePromoteRequest
+
+    store = _store(tmp_path)
+    capture_path = _capture(store, "capture_1.jpg")
+    with pytest.raises(ValueError, match="image type"):
+        store.promote("temp/capture_1.jpg", "coin-1", "../../x")
+    with pytest.raises(ValidationError):
+        CapturePromoteRequest(file_path="temp/capture_1.jpg", image_type="../../x")
+    assert os.path.exists(capture_path)
+    assert os.listdir(str(tmp_path)) == ["temp"]
+
+
+def test_restore_undoes_promote(tmp_path):
+    store = _store(tmp_path)
+    capture_path = _capture(store, "capture_1.jpg")
+    relative_path, metadata = store.promote("temp/capture_1.jpg", "coin-1", "obverse")
+
+    store.restore(relative_path, "temp/capture_1.jpg", metadata)
+
+    assert os.path.isfile(capture_path)
+    assert not os.path.exists(os.path.join(str(tmp_path), relative_path))
+    assert store.read_metadata(capture_path)["sharpness"] == {"score": 1.0}
+
+
+def test_evict_by_age_then_size(tmp_path):
+    now = 1_000_000.0
+    store = _store(tmp_path, max_age_seconds=100)
+    old = _capture(store, "old.jpg", mtime=now - 500)
+    older_fresh = _capture(store, "a.jpg", mtime=now - 20)
+    newest = _capture(store, "b.jpg", mtime=now - 10)
+    store.max_total_bytes = os.path.getsize(newest) + os.path.getsize(newest + ".json")
+
+    result = store.evict(now=now)
+
+    assert result["removed"] == 2
+    assert not os.path.exists(old)
+    assert not os.path.exists(older_fresh)
+    assert os.path.exists(newest)
+    assert sorted(os.listdir(store.temp_dir)) == ["b.jpg", "b.jpg.json"]
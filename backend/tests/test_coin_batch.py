@@ -0,0 +1,73 @@
+import uuid
+
+import pytest
+from sqlalchemy.sql.dml import Delete, Insert, Update
+
+from app.schemas import CoinBatchOperation
+from app.services.coin_batch import BatchRejected, apply_batch
+
+
+class RecordingSession:
+    def __init__(self, owned, image_paths=()):
+        self.owned = owned
+        self.image_paths = list(image_paths)
+        self.statements = []
+        self.committed = self.rolled_back = False
+
+    def scalars(self, statement):
+        if "coin_images" in str(statement):
+            return iter(self.image_paths)
+        return iter(self.owned)
+
+    def execute(self, statement, params=None):
+        self.statements.append((statement, params))
+        if isinstance(statement, Insert):
+            return [(uuid.uuid4(), f"NOM-{i}") for i, _ in enumerate(params)]
+        return None
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def test_batch_groups_identical_updates_and_runs_one_delete():
+    a, b, c, d = (uuid.uuid4() for _ in range(4))
+    db = RecordingSession(owned=[a, b, c, d], image_paths=["x/obverse.jpg"])
+    operations = [
+        CoinBatchOperation(op="update", id=a, data={"location": "Box 2", "is_for_sale": True}),
+        CoinBatchOperation(op="update", id=b, data={"is_for_sale": True, "location": "Box 2"}),
+        CoinBatchOperation(op="update", id=c, data={"location": "Box 3"}),
+        CoinBatchOperation(op="delete", id=d),
+        CoinBatchOperation(op="create", data={"country": "Canada"}),
+    ]
+
+    results, image_paths = apply_batch(db, uuid.uuid4(), operations)
+
+    kinds = [type(statement) for statement, _ in db.statements]
+    assert kinds.count(Insert) == 1
+    assert kinds.count(Update) == 2
+    assert kinds.count(Delete) == 1
+    assert db.committed
+    assert image_paths == ["x/obverse.jpg"]
+    assert all(result["success"] for result in results)
+    assert results[4]["inventory_number"] == "NOM-0"
+
+
+def test_batch_with_an_invalid_operation_writes_nothing():
+    owned = uuid.uuid4()
+    db = RecordingSession(owned=[owned])
+    operations = [
+        CoinBatchOperation(op="update", id=owned, data={"location": "Box 1"}),
+        CoinBatchOperation(op="delete", id=uuid.uuid4()),
+        CoinBatchOperation(op="delete", id=owned),
+    ]
+
+    with pytest.raises(BatchRejected) as rejected:
+        apply_batch(db, uuid.uuid4(), operations)
+
+    errors = [result.get("error") for result in rejected.value.results]
+    assert errors == [None, "Coin not found", "Coin appears in more than one operation"]
+    assert db.statements == []
+    assert db.rolled_back and not db.committed
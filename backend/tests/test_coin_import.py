@@ -0,0 +1,106 @@
+import io
+import uuid
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from app.services.coin_import import CoinImporter, parse_rows
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_parse_and_validate_rows_report_errors_by_row():
+    data = (
+        "Country,Denomination,Year,Mint_Mark,Import_Key\n"
+        "United States,1 Cent,1943,,a\n"
+        "United States,5 Cents,not a year,D,b\n"
+        "Canada,1 Dollar,1967, Philadelphia (no mint mark) ,c\n"
+    ).encode()
+    importer = CoinImporter()
+    inserted_rows = []
+
+    def fake_insert(db, rows):
+        inserted_rows.extend(rows)
+        return [(row["import_key"], None) for row in rows]
+
+    importer._insert = fake_insert
+    report = importer.import_rows(FakeSession(), uuid.uuid4(), parse_rows(io.BytesIO(data), "csv"))
+
+    assert report["rows"] == 3
+    assert report["inserted"] == 2
+    assert report["failed"] == 1
+    assert report["errors"][0]["row"] == 2
+    assert "year" in report["errors"][0]["error"]
+    assert "mint_mark" not in inserted_rows[0]
+    assert inserted_rows[1]["mint_mark"] == "None"
+
+
+def test_rerun_with_idempotency_key_counts_existing_rows_as_duplicates():
+    lines = b'{"country": "United States", "year": 1943}\n\n{"country": "Canada"}\nnot json\n'
+    importer = CoinImporter()
+    existing = {"key-1:1"}
+
+    def fake_insert(db, rows):
+        return [(row["import_key"], None) for row in rows if row["import_key"] not in existing]
+
+    importer._insert = fake_insert
+    report = importer.import_rows(FakeSession(), uuid.uuid4(), parse_rows(io.BytesIO(lines), "jsonl"), "key-1")
+
+    assert (report["inserted"], report["duplicates"], report["failed"]) == (1, 1, 1)
+    assert report["errors"][0]["row"] == 3
+
+
+def test_rejected_batch_is_retried_row_by_row():
+    importer = CoinImporter()
+
+    def fake_insert(db, rows):
+        if any(row.get("year") == 99999 for row in rows):
+            raise Exception("integer out of range")
+        return [(row["import_key"], None) for row in rows]
+
+    importer._insert = fake_insert
+    records = [(1, {"country": "A", "import_key": "1"}), (2, {"year": 99999, "import_key": "2"}), (3, {"country": "C", "import_key": "3"})]
+    report = importer.import_rows(FakeSession(), uuid.uuid4(), iter(records))
+
+    assert report["inserted"] == 2
+    assert report["errors"] == [{"row": 2, "error": "integer out of range"}]
+
+
+def test_taken_inventory_number_is_a_row_error_not_a_duplicate():
+    importer = CoinImporter()
+    statements = []
+
+    class RecordingSession(FakeSession):
+        def execute(self, statement):
+            statements.append(str(statement.compile(dialect=postgresql.dialect())))
+            return []
+
+    # Only re-imported rows are skipped by the insert itself
+    importer._insert(RecordingSession(), [{"country": "A", "inventory_number": "NOM-0001", "user_id": uuid.uuid4(), "import_key": "k"}])
+    assert "ON CONFLICT ON CONSTRAINT uq_coins_user_import_key DO NOTHING" in statements[0]
+
+    taken = {"NOM-0001"}
+    imported = {"key:1"}
+
+    def fake_insert(db, rows):
+        if any(row.get("inventory_number") in taken for row in rows):
+            raise IntegrityError("INSERT", {}, Exception('duplicate key value violates unique constraint "coins_inventory_number_key"'))
+        return [(row["import_key"], row.get("inventory_number")) for row in rows if row["import_key"] not in imported]
+
+    importer._insert = fake_insert
+    records = [
+        (1, {"country": "A", "inventory_number": "NOM-0100", "import_key": "key:1"}),
+        (2, {"country": "B", "inventory_number": "NOM-0001"}),
+        (3, {"country": "C", "inventory_number": "NOM-0002"}),
+    ]
+    report = importer.import_rows(FakeSession(), uuid.uuid4(), iter(records))
+
+    assert (report["inserted"], report["duplicates"], report["failed"]) == (1, 1, 1)
+    assert report["errors"][0]["row"] == 2
+    assert "coins_inventory_number_key" in report["errors"][0]["error"]
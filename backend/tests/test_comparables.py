@@ -0,0 +1,75 @@
+import io
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app.services.comparables import (
+    comparison_key,
+    grade_bucket,
+    grade_to_sheldon,
+    normalize_sale,
+    parse_feed,
+)
+
+
+@pytest.mark.parametrize("grade, expected", [
+    ("MS-65", 65),
+    ("ms65 RD", 65),
+    ("VF 30", 30),
+    ("Very Fine", 20),
+    ("Very Good", 8),
+    ("XF", 40),
+    ("About Uncirculated", 50),
+    ("45", 45),
+    ("cleaned", None),
+])
+def test_grade_to_sheldon(grade, expected):
+    assert grade_to_sheldon(grade) == expected
+
+
+def test_grade_buckets_group_market_ranges():
+    assert [grade_bucket(n) for n in (2, 6, 10, 35, 58, 62, 64, 66, 70)] == [1, 4, 8, 20, 50, 60, 63, 65, 67]
+
+
+def test_comparison_key_normalizes_spelling():
+    assert comparison_key(
+        {"country": "USA", "denomination": "1¢", "year": "1943", "mint_mark": "d"}
+    ) == comparison_key(
+        {"country": "United States", "denomination": "One Cent", "year": 1943, "mint_mark": "D"}
+    ) == ("united states", "1 cent", 1943, "D")
+    assert comparison_key({"country": "USA", "denomination": "Dime"}) is None
+
+
+def test_feed_rows_normalize_with_stable_refs():
+    feed = (
+        "Country,Denomination,Year,Mint_Mark,Grade,Price,Sold_At\n"
+        "USA,Quarter,1932,D,VF-20,\"$1,150.00\",2026-03-01\n"
+        "USA,Quarter,,D,VF-20,10,2026-03-01\n"
+    )
+    records = list(parse_feed(io.BytesIO(feed.encode("utf-8")), "csv"))
+    rows = [normalize_sale(record, "feed:test") for record in records]
+
+    assert rows[1] is None
+    row = rows[0]
+    assert (row["denomination_key"], row["grade_numeric"], row["grade_bucket"]) == ("25 cent", 20, 20)
+    assert row["price"] == Decimal("1150.00")
+    assert row["sold_at"] == datetime(2026, 3, 1)
+    assert normalize_sale(records[0], "feed:test")["source_ref"] == row["source_ref"]
+
+
+def test_json_lines_feed():
+    feed = b'{"id": "a1", "country": "USA", "denomination": "5c", "year": 1937, "price": 12}\n\n'
+    records = list(parse_feed(io.BytesIO(feed), "jsonl"))
+
+    assert normalize_sale(records[0], "feed:x")["source_ref"] == "a1"
+
+
+def test_index_updates_require_sign_in():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    feed = {"file": ("sales.csv", b"country,denomination,year,price\n", "text/csv")}
+    assert client.post("/api/comparables/import", files=feed).status_code == 401
+    assert client.post("/api/comparables/refresh").status_code == 401
@@ -0,0 +1,211 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.services.ebay_client import EbayCallLimitExceeded, EbayCallPool, TokenBucket, worker_share
+from app.services.ebay_service import EbayService
+from app.services.ebay_sync import EbayStatusSync, listing_fields
+from stubs.ebay_trading import FakeTradingServer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_ebay(monkeypatch):
+    with FakeTradingServer() as server:
+        for key, value in {
+            "EBAY_APP_ID": "app",
+            "EBAY_DEV_ID": "dev",
+            "EBAY_CERT_ID": "cert",
+            "EBAY_USER_TOKEN": "token",
+            "EBAY_PAYPAL_EMAIL": "seller@example.com",
+            "EBAY_API_DOMAIN": server.domain,
+            "EBAY_API_HTTPS": "false",
+        }.items():
+            monkeypatch.setenv(key, value)
+        service = EbayService()
+        yield server, service
+        service.shutdown()
+
+
+def test_token_bucket_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0
+
+
+def test_limits_are_shared_between_workers(monkeypatch):
+    assert worker_share(5000, 4) == 1250
+    assert worker_share(3, 4) == 1
+    assert worker_share(0, 4) == 0
+    assert worker_share(None, 4) is None
+    assert worker_share(5.0, 4) == 1.25
+
+    with FakeTradingServer() as server:
+        for key, value in {
+            "EBAY_APP_ID": "app", "EBAY_DEV_ID": "dev", "EBAY_CERT_ID": "cert", "EBAY_USER_TOKEN": "token",
+            "EBAY_API_DOMAIN": server.domain, "EBAY_API_HTTPS": "false",
+            "EBAY_CALL_LIMITS": "AddItem=100:2", "WEB_CONCURRENCY": "2",
+        }.items():
+            monkeypatch.setenv(key, value)
+        service = EbayService()
+        try:
+            assert service.pool.calls_per_second == 2.5
+            assert service.pool.daily_limit == 2500
+            assert service.pool.call_limits == {"AddItem": (50, 1.0)}
+        finally:
+            service.shutdown()
+
+
+def test_listing_round_trip_against_fake_trading_api(fake_ebay):
+    server, service = fake_ebay
+
+    async def scenario():
+        created = await service.create_listing(
+            {"id": "coin"},
+            {"listing_title": "1943 Steel Cent", "listing_description": "VF", "starting_price": 1.0}
+        )
+        status = await service.get_listing_status(created["item_id"])
+        return created, status
+
+    created, status = asyncio.run(scenario())
+
+    assert created["success"], created
+    assert status["status"] == "Active"
+    assert server.api.calls == ["AddItem", "GetItem"]
+    metrics = service.metrics()
+    assert metrics["calls"]["AddItem"]["daily_used"] == 1
+    assert metrics["queued"] == 0 and metrics["in_flight"] == 0
+
+
+def test_pool_rejects_calls_over_daily_limit():
+    class Connection:
+        def execute(self, call_name, data):
+            return call_name
+
+    pool = EbayCallPool(Connection, daily_limit=0, call_limits={"GetItem": (1, 100.0)})
+
+    async def scenario():
+        assert await pool.execute("GetItem") == "GetItem"
+        with pytest.raises(EbayCallLimitExceeded):
+            await pool.execute("GetItem")
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    assert pool.metrics()["rejected"] == 1
+
+
+def test_bulk_listing_batches_add_items(fake_ebay):
+    server, service = fake_ebay
+    entries = [
+        ({"id": f"coin-{n}"}, {"listing_title": f"Coin {n}", "listing_description": "VF", "starting_price": 1.0})
+        for n in range(7)
+    ]
+    entries.insert(3, ({"id": "bad"}, {"listing_title": "", "listing_description": "VF", "starting_price": 1.0}))
+
+    results = asyncio.run(service.create_listings_bulk(entries))
+
+    assert [result["success"] for result in results] == [True, True, True, False, True, True, True, True]
+    assert len({result["item_id"] for result in results if result["success"]}) == 7
+    assert server.api.calls == ["AddItems", "AddItems"]
+
+
+def test_status_sync_picks_up_sold_listing(fake_ebay):
+    server, service = fake_ebay
+    sync = EbayStatusSync(service)
+
+    async def scenario():
+        created = await service.create_listing(
+            {"id": "coin"},
+            {"listing_title": "1909-S VDB Cent", "listing_description": "XF", "starting_price": 500.0}
+        )
+        server.api.sell(created["item_id"], price=725.0, buyer="collector1")
+        now = datetime.utcnow() + timedelta(seconds=1)
+        return created, await sync.fetch_changes(now - timedelta(hours=1), now)
+
+    created, changes = asyncio.run(scenario())
+
+    fields = changes[created["item_id"]]
+    assert fields["status"] == "sold"
+    assert fields["sold_price"] == Decimal("725.00")
+    assert fields["buyer_username"] == "collector1"
+    assert server.api.calls == ["AddItem", "GetSellerEvents"]
+
+
+def test_listing_fields_maps_trading_status():
+    active = listing_fields({"SellingStatus": {"ListingStatus": "Active", "QuantitySold": "0",
+                                               "CurrentPrice": {"value": "12.50"}}})
+    ended = listing_fields({"SellingStatus": {"ListingStatus": "Completed", "QuantitySold": "0"},
+                            "ListingDetails": {"EndTime": "2026-01-02T03:04:05.000Z"}})
+
+    assert active == {"status": "active", "current_price": Decimal("12.50")}
+    assert ended["status"] == "ended"
+    assert ended["ended_at"] == datetime(2026, 1, 2, 3, 4, 5)
+
+
+def test_status_sync_fetches_listings_the_window_does_not_cover(fake_ebay, monkeypatch):
+    server, service = fake_ebay
+    sync = EbayStatusSync(service)
+    applied, listed = [], []
+
+    def apply_changes(changes, synced_at, covered_from=None):
+        applied.append((changes, covered_from))
+        # The first pass reports the listing as last confirmed before the window
+        return [], (listed if covered_from is not None else [])
+
+    async def scenario():
+        created = await service.create_listing(
+            {"id": "coin"},
+            {"listing_title": "1916-D Dime", "listing_description": "VG", "starting_price": 900.0}
+        )
+        listed.append(created["item_id"])
+        server.api.sell(created["item_id"], price=1100.0)
+        result = await sync.sync_once()
+        return created, result
+
+    monkeypatch.setattr(sync, "window_start", lambda now: now - timedelta(minutes=5))
+    monkeypatch.setattr(sync, "apply_changes", apply_changes)
+    monkeypatch.setattr("app.services.ebay_sync.comparables_service.ingest_new_sales", lambda: {})
+    created, result = asyncio.run(scenario())
+    item_id = created["item_id"]
+
+    assert server.api.calls == ["AddItem", "GetSellerEvents", "GetItem"]
+    assert applied[0][1] is not None
+    assert applied[1][0][item_id]["status"] == "sold" and applied[1][1] is None
+    assert result["refreshed"] == 1
+
+
+def test_status_sync_skips_ebay_without_open_listings(fake_ebay, monkeypatch):
+    server, service = fake_ebay
+    sync = EbayStatusSync(service)
+    monkeypatch.setattr(sync, "window_start", lambda now: None)
+
+    result = asyncio.run(sync.sync_once())
+
+    assert result["modified"] == 0
+    assert server.api.calls == []
+
+
+def test_account_wide_endpoints_require_sign_in():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    assert client.post("/api/ebay/sync").status_code == 401
+    assert client.get("/api/ebay/metrics").status_code == 401
@@ -0,0 +1,59 @@
+import csv
+import io
+import uuid
+import zipfile
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.auth import get_request_user
+from app.main import app
+from app.services.export import COLUMN_NAMES, CollectionExporter
+
+
+def _exporter(tmp_path, monkeypatch):
+    exporter = CollectionExporter()
+    exporter.images_path = str(tmp_path)
+    (tmp_path / "coin-1").mkdir()
+    (tmp_path / "coin-1" / "obverse.jpg").write_bytes(b"\xff\xd8" * 1000)
+
+    def row(inventory_number, value, image):
+        values = dict.fromkeys(COLUMN_NAMES)
+        values.update(id=inventory_number.lower(), inventory_number=inventory_number,
+                      estimated_value_avg=value, primary_image=image)
+        return tuple(values[name] for name in COLUMN_NAMES)
+
+    batches = [[row("NOM-0001", 12.5, "coin-1/obverse.jpg")], [row("NOM-0002", None, None)]]
+    monkeypatch.setattr(exporter, "batches", lambda user_id: iter(batches))
+    monkeypatch.setattr(exporter, "_image_paths", lambda user_id: iter(["coin-1/obverse.jpg", "../outside.jpg"]))
+    return exporter
+
+
+def test_csv_export_streams_one_chunk_per_batch(tmp_path, monkeypatch):
+    exporter = _exporter(tmp_path, monkeypatch)
+
+    chunks = list(exporter.stream(uuid.uuid4(), "csv"))
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+
+    assert len(chunks) == 2
+    assert [row["inventory_number"] for row in rows] == ["NOM-0001", "NOM-0002"]
+    assert rows[0]["estimated_value_avg"] == "12.5"
+
+
+def test_bundle_contains_data_file_and_images_inside_images_root(tmp_path, monkeypatch):
+    exporter = _exporter(tmp_path, monkeypatch)
+
+    data = b"".join(exporter.stream_bundle(uuid.uuid4(), "jsonl"))
+    bundle = zipfile.ZipFile(io.BytesIO(data))
+
+    assert bundle.namelist() == ["coins.jsonl", "images/coin-1/obverse.jpg"]
+    assert bundle.read("coins.jsonl").count(b"\n") == 2
+
+
+def test_export_rejects_unknown_format():
+    app.dependency_overrides[get_request_user] = lambda: SimpleNamespace(id=uuid.uuid4())
+    try:
+        response = TestClient(app).get("/api/coins/export?format=xlsx")
+        assert response.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app import auth
+from app.cache import MemoryBackend
+from app.lifecycle import ServiceContainer
+from app.services.lazy import LazyService
+
+
+def test_failed_and_slow_warmup_steps_are_reported_not_raised(monkeypatch):
+    container = ServiceContainer()
+    container.timeout = 0.2
+
+    def broken():
+        raise RuntimeError("no route to host")
+
+    monkeypatch.setattr(container, "_steps", lambda: [
+        ("broken", broken), ("slow", lambda: time.sleep(1)), ("fine", lambda: 3),
+    ])
+    report = asyncio.run(container.start({}, primary=True))
+
+    assert report["broken"] == {"ok": False, "error": "no route to host", "seconds": report["broken"]["seconds"]}
+    assert report["slow"]["ok"] is False and "timed out" in report["slow"]["error"]
+    assert report["slow"]["seconds"] < 0.9
+    assert report["fine"]["ok"] and report["fine"]["detail"] == 3
+
+
+def test_password_hasher_restarts_after_shutdown():
+    hasher = auth.PasswordHasher()
+    hasher.shutdown()  # Never used: nothing to stop
+    hashed = asyncio.run(hasher.hash("secret"))
+    hasher.shutdown()
+    hasher.shutdown()
+
+    valid, _ = asyncio.run(hasher.verify("secret", hashed))
+    assert valid
+    hasher.shutdown()
+
+
+def test_lazy_service_reset_builds_a_new_instance():
+    service = LazyService(lambda: MemoryBackend(4))
+    first = service.resolve()
+    service.reset()
+
+    assert not service.is_built
+    assert service.resolve() is not first
+
+
+def test_lifespan_runs_twice(monkeypatch):
+    from app.lifecycle import service_container
+    from app.main import app
+
+    # No database here: warm-up only has to fail gracefully
+    monkeypatch.setattr(service_container, "timeout", 2.0)
+    for _ in range(2):
+        with TestClient(app) as client:
+            assert client.get("/health").status_code == 200
+        assert service_container.warmup["gemini"]["ok"]
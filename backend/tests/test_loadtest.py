@@ -0,0 +1,100 @@
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from app.metrics import LoopLagMonitor
+from loadtest import report
+from loadtest.scenario import Recorder, ScanSession
+
+
+def _stage(users, sessions_per_second, error_rate=0.0, p90=10000.0):
+    return {"users": users, "sessions_per_second": sessions_per_second, "error_rate": error_rate, "session": {"p90_ms": p90}}
+
+
+def test_saturation_at_throughput_plateau():
+    stages = [_stage(1, 0.1), _stage(2, 0.2), _stage(4, 0.38), _stage(8, 0.40)]
+
+    saturation = report.find_saturation(stages)
+
+    assert saturation["users"] == 4
+    assert saturation["tripped_at"] == 8
+    assert report.find_saturation(stages[:3]) is None
+
+
+def test_saturation_on_errors_and_slo():
+    assert report.find_saturation([_stage(1, 0.1), _stage(2, 0.2, error_rate=0.05)])["tripped_at"] == 2
+    assert report.find_saturation([_stage(1, 0.1, p90=30000.0)], slo_p90_ms=20000.0) == {
+        "users": None, "tripped_at": 1, "reasons": ["session p90 30000.0 ms over 20000.0 ms"]
+    }
+
+
+def test_merge_lag_windows():
+    merged = report.merge_lag([
+        {"samples": 10, "p50_ms": 1.0, "p99_ms": 5.0, "max_ms": 6.0},
+        {"samples": 0, "p50_ms": None, "p99_ms": None, "max_ms": None},
+        {"samples": 30, "p50_ms": 3.0, "p99_ms": 40.0, "max_ms": 80.0},
+    ])
+
+    assert merged == {"samples": 40, "p50_ms": 2.5, "p99_ms": 40.0, "max_ms": 80.0}
+
+
+def test_loop_lag_monitor_sees_blocking():
+    monitor = LoopLagMonitor()
+    monitor.interval = 0.01
+
+    async def block():
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.05)
+        time.sleep(0.1)
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(block())
+    lag = monitor.drain()
+
+    assert lag["samples"] > 3
+    assert lag["max_ms"] >= 80
+    assert monitor.drain()["samples"] == 0
+
+
+def test_scan_session_replays_the_scan_page():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(f"{request.method} {request.url.path}")
+        path = request.url.path
+        if path == "/api/microscope/capture":
+            return httpx.Response(200, json={"success": True, "file_path": "temp/capture.jpg"})
+        if path == "/api/ai/analyze":
+            body = json.loads(request.content)
+            return httpx.Response(200, json={"success": True, "analysis": {"identification": {"country": "Canada", "year": 1967}}, "image": body["image_path"]})
+        if path == "/api/coins/":
+            assert json.loads(request.content)["country"] == "Canada"
+            return httpx.Response(201, json={"id": "c1"})
+        if path == "/api/coins/c1/images/from-capture":
+            return httpx.Response(201, json={"id": "i1", "file_path": "c1/obverse.jpg"})
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        recorder = Recorder()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://load") as client:
+            await ScanSession(client, recorder, random.Random(1), framing_seconds=0.0, review_seconds=0.0).run()
+        return recorder
+
+    recorder = asyncio.run(scenario())
+
+    assert calls == [
+        "POST /api/microscope/capture",
+        "POST /api/ai/analyze",
+        "POST /api/coins/",
+        "POST /api/coins/c1/images/from-capture",
+        "POST /api/ai/analyze",
+        "GET /api/coins/c1",
+    ]
+    summary = recorder.summary(1.0)
+    assert summary["sessions"] == 1
+    assert summary["error_rate"] == 0.0
+    assert set(summary["steps"]) == {"capture", "analyze", "create", "attach", "reanalyze", "detail"}
@@ -0,0 +1,122 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app import metrics
+from app.main import app
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.MetricsRegistry()
+    latency = registry.histogram("test_latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, route="/a")
+
+    rendered = registry.render()
+
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in rendered
+    assert 'test_latency_seconds_bucket{route="/a",le="1"} 2' in rendered
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in rendered
+    assert 'test_latency_seconds_count{route="/a"} 3' in rendered
+    assert "# TYPE test_latency_seconds histogram" in rendered
+
+
+def _worker_registry():
+    registry = metrics.MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests", ("route",))
+    in_flight = registry.gauge("test_in_flight", "In flight", ())
+    latency = registry.histogram("test_latency_seconds", "Latency", (), buckets=(1.0,))
+    lookups = registry.counter("test_cache_requests_total", "Lookups", ("cache", "result"))
+    registry.gauge_function("test_cache_hit_ratio", "Hit ratio", ("cache",), metrics._cache_hit_ratios, lookups)
+    return registry, requests, in_flight, latency, lookups
+
+
+def test_workers_are_merged_and_exited_workers_keep_their_counts(tmp_path):
+    exited, requests, in_flight, latency, lookups = _worker_registry()
+    requests.inc(3, route="/a")
+    in_flight.set(5)
+    latency.observe(0.5)
+    lookups.inc(cache="coin", result="hit")
+    exited_pid = subprocess.Popen([sys.executable, "-c", ""]).pid
+    os.waitpid(exited_pid, 0)
+    (tmp_path / f"{exited_pid}.json").write_text(json.dumps(exited.snapshot()))
+
+    live, requests, in_flight, latency, lookups = _worker_registry()
+    requests.inc(route="/a")
+    requests.inc(route="/b")
+    in_flight.set(1)
+    latency.observe(2.0)
+    lookups.inc(cache="coin", result="miss")
+
+    rendered = metrics.MultiprocessMetrics(live, str(tmp_path)).render()
+
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
+    assert 'test_requests_total{route="/a"} 4' in rendered
+    assert 'test_requests_total{route="/b"} 1' in rendered
+    assert "test_in_flight 1" in rendered  # the exited worker's gauge is gone
+    assert 'test_latency_seconds_bucket{le="1"} 1' in rendered
+    assert "test_latency_seconds_count 2" in rendered
+    assert 'test_cache_hit_ratio{cache="coin"} 0.5' in rendered
+
+
+def test_requests_are_labelled_by_route_template():
+    client = TestClient(app)
+    before = metrics.http_requests.value(method="GET", route="/health", status="200")
+
+    client.get("/health")
+    client.get("/no/such/path")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert metrics.http_requests.value(method="GET", route="/health", status="200") == before + 1
+    assert 'route="unmatched",status="404"' in response.text
+    assert "/no/such/path" not in response.text
+    assert 'nomisma_http_requests_in_flight{method="GET"} 1' in response.text  # the scrape itself
+    assert metrics.http_in_flight.value(method="GET") == 0
+
+
+def test_observe_call_counts_errors_per_model():
+    labels = {"service": "gemini", "operation": "test_op", "model": "test-model"}
+    with metrics.observe_call("gemini", "test_op", "test-model"):
+        pass
+    with pytest.raises(TimeoutError):
+        with metrics.observe_call("gemini", "test_op", "test-model"):
+            raise TimeoutError()
+
+    assert metrics.external_call_duration.count(**labels) == 2
+    assert metrics.external_call_errors.value(error="TimeoutError", **labels) == 1
+
+
+def test_database_statements_are_attributed_to_the_request():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+
+    with metrics.track_db() as stats, engine.connect() as connection:
+        connection.execute(text("select 1"))
+        connection.execute(text("select 2"))
+    with engine.connect() as connection:
+        connection.execute(text("select 3"))
+
+    assert stats[0] == 2
+    assert stats[1] > 0
+
+
+def test_cache_hit_ratio():
+    for hit in (True, True, True, False):
+        metrics.record_cache("test_cache", hit)
+
+    assert 'nomisma_cache_hit_ratio{cache="test_cache"} 0.75' in metrics.registry.render()
+
+
+def test_frame_rate_meter_ignores_idle_gaps():
+    meter = metrics.FrameRateMeter(smoothing=0.5, idle_seconds=5.0)
+    meter.tick(0.0)
+    assert meter.tick(0.1) == pytest.approx(10.0)
+    assert meter.tick(0.3) == pytest.approx(7.5)
+    assert meter.tick(60.0) == pytest.approx(7.5)
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.services.image_encoder import image_encoder
+from app.services.microscope import MicroscopeService
+from stubs.camera import OverlapCamera
+
+
+class FakeCapture:
+    def __init__(self, frames, fourcc="XVID"):
+        self.frames = list(frames)
+        self.props = {cv2.CAP_PROP_FOURCC: cv2.VideoWriter_fourcc(*fourcc)}
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+
+def _checkerboard(size=256, square=16):
+    tiles = (np.indices((size, size)) // square).sum(axis=0) % 2
+    return np.dstack([(tiles * 255).astype(np.uint8)] * 3)
+
+
+def test_sharpness_metrics_prefer_focused_frame():
+    service = MicroscopeService()
+    sharp = _checkerboard()
+    blurred = cv2.GaussianBlur(sharp, (15, 15), 5)
+
+    sharp_lap, sharp_ten = service._sharpness_metrics(sharp)
+    blur_lap, blur_ten = service._sharpness_metrics(blurred)
+
+    assert sharp_lap > blur_lap
+    assert sharp_ten > blur_ten
+
+
+def test_read_sharpest_frame_picks_best_in_window():
+    service = MicroscopeService()
+    sharp = _checkerboard()
+    frames = [
+        cv2.GaussianBlur(sharp, (21, 21), 8),
+        sharp,
+        cv2.GaussianBlur(sharp, (9, 9), 3),
+    ]
+    service.current_camera = FakeCapture(frames)
+
+    frame, sharpness = service._read_sharpest_frame(window_seconds=5, max_frames=3)
+
+    assert np.array_equal(frame, sharp)
+    assert sharpness["frames_scored"] == 3
+    assert sharpness["score"] == 1.0
+
+
+def test_capture_passes_mjpeg_bitstream_through(tmp_path):
+    service = MicroscopeService()
+    sharp = _checkerboard()
+    blurred_jpeg = image_encoder.encode_jpeg(cv2.GaussianBlur(sharp, (21, 21), 8))
+    sharp_jpeg = image_encoder.encode_jpeg(sharp)
+    buffers = [np.frombuffer(data, dtype=np.uint8) for data in (blurred_jpeg, sharp_jpeg)]
+    service.current_camera = FakeCapture(buffers, fourcc="MJPG")
+
+    save_path = tmp_path / "capture.jpg"
+    success, result, sharpness = service.capture_image(str(save_path), focus_window=5)
+
+    assert success
+    assert save_path.read_bytes() == sharp_jpeg
+    assert sharpness["frames_scored"] == 2
+
+
+def test_encoder_round_trips_lossless_formats():
+    frame = _checkerboard(64, 8)
+    for image_format in ("png", "tiff"):
+        data, _ = image_encoder.encode(frame, image_format)
+        decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        assert np.array_equal(decoded, frame)
+
+
+def test_preview_during_capture_waits_for_the_camera(tmp_path):
+    service = MicroscopeService()
+    cameras = []
+
+    def open_capture(camera_index):
+        cameras.append(OverlapCamera(320, 240, fps=200))
+        return cameras[-1]
+
+    service._open_capture = open_capture
+    assert service.open_camera(0)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        captures = [pool.submit(service.capture_image, str(tmp_path / f"{i}.jpg"), 0.1) for i in range(2)]
+        previews = [pool.submit(service.get_preview_jpeg) for _ in range(20)]
+        reopened = pool.submit(service.ensure_camera, 1)
+        results = [future.result() for future in captures + previews + [reopened]]
+
+    assert all(result[0] is True for result in results[:2])
+    assert all(preview[:2] == b"\xff\xd8" for preview in results[2:-1])
+    assert max(camera.overlap for camera in cameras) == 1
+    # No read saw another thread's raw-mode switch, so passthrough was never ruled out
+    assert service._passthrough_supported is not False
+
+
+def test_quality_only_applies_to_jpeg():
+    frame = _checkerboard(64, 8)
+    assert image_encoder.encode(frame, "png", 5) == image_encoder.encode(frame, "png")
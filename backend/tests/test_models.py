@@ -0,0 +1,19 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import configure_mappers, joinedload
+from sqlalchemy.orm.interfaces import MANYTOONE, ONETOMANY
+
+from app.models import Coin
+
+
+def test_latest_pointers_are_separate_from_history():
+    configure_mappers()
+
+    assert Coin.valuations.property.direction is ONETOMANY
+    assert Coin.latest_valuation.property.direction is MANYTOONE
+    assert Coin.latest_analysis.property.viewonly
+
+    sql = str(
+        select(Coin).options(joinedload(Coin.latest_valuation)).compile(dialect=postgresql.dialect())
+    )
+    assert "valuations_1.id = coins.latest_valuation_id" in sql
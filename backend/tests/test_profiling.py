@@ -0,0 +1,76 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app import profiling
+from app.main import app as main_app
+
+
+def _profiled_app(monkeypatch, **env):
+    monkeypatch.setenv("PROFILING_ENABLED", "true")
+    monkeypatch.setenv("PROFILING_ADMIN_TOKEN", "secret")
+    monkeypatch.setenv("PROFILING_INTERVAL_MS", "1")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    profiler = profiling.RequestProfiler()
+    engine = create_engine("sqlite://")
+    profiling.instrument_engine(engine)
+
+    app = FastAPI()
+    app.add_middleware(profiling.ProfilingMiddleware, profiler=profiler)
+
+    @app.get("/slow")
+    def slow():
+        with engine.connect() as connection:
+            connection.execute(text("select 1"))
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {"ok": True}
+
+    return TestClient(app), profiler
+
+
+def test_header_needs_the_admin_token(monkeypatch):
+    client, profiler = _profiled_app(monkeypatch)
+
+    response = client.get("/slow", headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+
+    assert "x-profile-id" not in response.headers
+    assert profiler.list() == []
+
+
+def test_profile_captures_stacks_and_sql(monkeypatch):
+    client, profiler = _profiled_app(monkeypatch)
+
+    response = client.get("/slow", headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+
+    profile = profiler.get(response.headers["x-profile-id"])
+    assert profile["route"] == "/slow"
+    assert profile["trigger"] == "header"
+    assert [statement["sql"] for statement in profile["sql"]] == ["select 1"]
+    assert profile["profile"]["engine"] == "sampling"
+    assert any("slow" in entry["function"] for entry in profile["profile"]["total"])
+
+
+def test_sampled_profiles_are_kept_in_a_bounded_buffer(monkeypatch):
+    client, profiler = _profiled_app(monkeypatch, PROFILING_SAMPLE_RATE="1", PROFILING_BUFFER_SIZE="2")
+
+    ids = [client.get("/slow").headers["x-profile-id"] for _ in range(3)]
+
+    assert [profile["id"] for profile in profiler.list()] == ids[:0:-1]
+    assert all(profile["trigger"] == "sample" for profile in profiler.list())
+
+
+def test_admin_endpoint_requires_token(monkeypatch):
+    client = TestClient(main_app)
+    monkeypatch.setattr(profiling.request_profiler, "admin_token", None)
+    assert client.get("/api/admin/profiles").status_code == 404
+
+    monkeypatch.setattr(profiling.request_profiler, "admin_token", "secret")
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Token": "nope"}).status_code == 403
+    response = client.get("/api/admin/profiles", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "profiles" in response.json()
@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+from app.services.lazy import LazyService
+from benchmarks import imports
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Service:
+    built = 0
+
+    def __init__(self):
+        Service.built += 1
+        self.value = 1
+
+    def double(self):
+        return self.value * 2
+
+
+def test_lazy_service_builds_once_on_first_use():
+    Service.built = 0
+    service = LazyService(Service)
+
+    assert not service.is_built and Service.built == 0
+    service.value = 5
+    assert service.double() == 10
+    assert service.is_built and Service.built == 1
+
+
+def test_parse_importtime_output():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |     encodings.idna\n"
+        "import time:       300 |       1200 |   fastapi\n"
+        "import time:       500 |       2000 | app.main\n"
+    )
+
+    assert imports.parse(output) == [
+        ("encodings.idna", 100, 100, 2),
+        ("fastapi", 300, 1200, 1),
+        ("app.main", 500, 2000, 0),
+    ]
+
+
+def test_disabled_features_are_not_imported_or_mounted():
+    script = (
+        "import json, sys\n"
+        "from app.main import app\n"
+        "paths = sorted({path.split('/')[2] for path in app.openapi()['paths'] if path.startswith('/api/')})\n"
+        "heavy = [name for name in ('ebaysdk', 'cv2', 'google.genai') if name in sys.modules]\n"
+        "print(json.dumps({'paths': paths, 'heavy': heavy}))\n"
+    )
+    env = {
+        **os.environ,
+        "DATABASE_URL": "postgresql+psycopg2://u:p@localhost/x",
+        "FEATURE_MICROSCOPE": "false",
+        "FEATURE_EBAY": "false",
+    }
+    completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, cwd=BACKEND, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert "microscope" not in result["paths"] and "ebay" not in result["paths"]
+    assert {"coins", "ai", "comparables"} <= set(result["paths"])
+    assert result["heavy"] == []
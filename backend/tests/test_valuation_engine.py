@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import valuation_engine as engine_module
+from app.services.comparables import comparison_key
+from app.services.valuation_engine import ValuationEngine
+
+
+def price_row(bucket, count, median, p25=None, p75=None, grade_mean=None):
+    return SimpleNamespace(
+        grade_bucket=bucket, sample_count=count, price_median=median,
+        price_p10=None, price_p25=p25, price_p75=p75, price_p90=None,
+        price_mean=median, grade_mean=grade_mean, last_sold_at=None,
+    )
+
+
+@pytest.fixture
+def index(monkeypatch):
+    rows = {}
+
+    def lookup_many(db, coins):
+        found = []
+        for coin in coins:
+            key = comparison_key(coin)
+            found.append({
+                "key": key,
+                "grade_bucket": None,
+                "exact": rows.get((key, coin.get("condition_grade"))),
+                "all_grades": rows.get((key, "all")),
+            })
+        return found
+
+    monkeypatch.setattr(engine_module.comparables_service, "lookup_many", lookup_many)
+    return rows
+
+
+def test_exact_comparables_use_median_and_iqr(index):
+    coin = {"country": "USA", "denomination": "Quarter", "year": 1932, "mint_mark": "D", "condition_grade": "VF-20"}
+    index[(comparison_key(coin), "VF-20")] = price_row(20, 12, 1150, p25=1050, p75=1240)
+
+    result = ValuationEngine().estimate_many(None, [coin])[0]
+
+    assert result["method"] == "comparables" and result["confident"]
+    assert result["valuation"]["estimated_value_avg"] == 1150
+    assert (result["valuation"]["estimated_value_low"], result["valuation"]["estimated_value_high"]) == (1050, 1240)
+
+
+def test_all_grade_comparables_follow_grade_curve(index):
+    coin = {"country": "USA", "denomination": "Dime", "year": 1950, "condition_grade": "MS-65"}
+    index[(comparison_key(coin), "all")] = price_row(0, 40, 10, grade_mean=20)
+
+    result = ValuationEngine().estimate_many(None, [coin])[0]
+
+    assert result["method"] == "grade-adjusted comparables"
+    assert result["valuation"]["estimated_value_avg"] == pytest.approx(70.0)
+    assert result["valuation"]["condition_multiplier"] == pytest.approx(7.0)
+    assert result["valuation"]["confidence_level"] == "Medium"
+
+
+def test_intrinsic_value_is_low_confidence(index):
+    coin = {"country": "USA", "denomination": "Quarter", "year": 1950, "condition_grade": "VF",
+            "composition": "90% silver, 10% copper", "weight_grams": 6.25}
+    analysis = {"rarity": "Common", "defects": "{'cleaning': 'Yes'}"}
+
+    result = ValuationEngine().estimate_many(None, [coin], [analysis])[0]
+
+    assert result["method"] == "intrinsic" and not result["confident"]
+    assert result["valuation"]["rarity_score"] == 2
+    # 6.25 g * 0.9 * $1.00/g melt, halved for cleaning
+    assert result["valuation"]["estimated_value_avg"] == pytest.approx(2.81, abs=0.01)
+
+
+def test_collection_is_valued_in_one_pass(index):
+    coins = [
+        {"country": "USA", "denomination": "1 cent", "year": 1900 + n % 100, "condition_grade": "F-12"}
+        for n in range(2000)
+    ]
+    for coin in coins[:100]:
+        index[(comparison_key(coin), "F-12")] = price_row(12, 5, 3, p25=2, p75=4)
+
+    results = ValuationEngine().estimate_many(None, coins)
+
+    assert len(results) == 2000
+    assert all(result["method"] == "comparables" for result in results)
+    assert {result["valuation"]["estimated_value_avg"] for result in results} == {3.0}
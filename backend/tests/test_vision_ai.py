@@ -0,0 +1,38 @@
+import os
+
+from app.services.vision_ai import VisionAIService
+
+
+def test_uploads_are_reused_until_the_file_changes(tmp_path, monkeypatch):
+    service = VisionAIService()
+    uploads = []
+
+    def upload(image_path):
+        uploads.append(image_path)
+        return f"files/{len(uploads)}", "image/jpeg"
+
+    monkeypatch.setattr(service, "_upload_image", upload)
+    image = tmp_path / "coin.jpg"
+    image.write_bytes(b"\xff\xd8first\xff\xd9")
+
+    assert service._cached_upload(str(image)) == ("files/1", "image/jpeg")
+    assert service._cached_upload(str(image)) == ("files/1", "image/jpeg")
+
+    image.write_bytes(b"\xff\xd8second!\xff\xd9")
+    os.utime(image, ns=(0, 10**9))
+    assert service._cached_upload(str(image)) == ("files/2", "image/jpeg")
+    assert len(uploads) == 2
+
+
+def test_http_pool_is_shared_and_closed():
+    service = VisionAIService()
+    client = service._http_client()
+    assert service._http_client() is client
+
+    service._upload_cache[("coin.jpg", 1, 1)] = ("files/1", "image/jpeg", 0.0)
+    service.close()
+    service.close()
+
+    assert client.is_closed
+    assert not service._upload_cache
+    assert service._http_client() is not client
@@ -0,0 +1,94 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import workers
+from app.services.microscope import MicroscopeService, microscope_service
+from stubs.camera import FakeCamera, OverlapCamera
+
+pytest.importorskip("fcntl")
+
+
+def test_one_primary_per_lock(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKER_LOCK_PATH", str(tmp_path / "primary.lock"))
+    first, second = workers.WorkerRole(), workers.WorkerRole()
+
+    assert first.acquire() is True
+    assert second.acquire() is False
+    assert second.microscope() is second._remote
+    assert first.microscope() is microscope_service
+
+    first.release()
+    assert second.acquire() is True
+    second.release()
+
+
+def test_secondary_workers_use_the_primary_camera(tmp_path):
+    service = MicroscopeService()
+    service._open_capture = lambda camera_index: FakeCamera(320, 240, fps=0)
+    host = workers.CameraHost(str(tmp_path / "camera.sock"), service)
+    remote = workers.RemoteMicroscope(host.path, timeout=10)
+
+    async def scenario():
+        await host.start()
+        try:
+            opened = await asyncio.to_thread(remote.ensure_camera, "0")
+            preview = await asyncio.to_thread(remote.get_preview_jpeg)
+            capture = await asyncio.to_thread(remote.capture_image, str(tmp_path / "capture.jpg"), 0.0)
+            await asyncio.to_thread(remote.close_camera)
+            return opened, preview, capture
+        finally:
+            await host.stop()
+
+    opened, preview, capture = asyncio.run(scenario())
+
+    assert opened is True
+    assert preview[:2] == b"\xff\xd8"
+    assert capture[0] is True and (tmp_path / "capture.jpg").exists()
+    assert service.current_camera is None
+
+    with pytest.raises(RuntimeError, match="unavailable"):
+        remote.ensure_camera("0")
+
+
+def test_relayed_preview_and_capture_do_not_overlap(tmp_path):
+    service = MicroscopeService()
+    camera = OverlapCamera(320, 240, fps=200)
+    service._open_capture = lambda camera_index: camera
+    host = workers.CameraHost(str(tmp_path / "camera.sock"), service)
+    remote = workers.RemoteMicroscope(host.path, timeout=10)
+
+    async def scenario():
+        await host.start()
+        loop = asyncio.get_running_loop()
+        # Own threads for the clients: the host needs the default executor
+        with ThreadPoolExecutor(max_workers=14) as clients:
+            try:
+                await loop.run_in_executor(clients, remote.ensure_camera, "0")
+                # Capturing locally in the primary while other workers poll previews
+                calls = [loop.run_in_executor(clients, service.capture_image, str(tmp_path / "local.jpg"), 0.1)]
+                calls += [loop.run_in_executor(clients, remote.capture_image, str(tmp_path / "remote.jpg"), 0.1)]
+                calls += [loop.run_in_executor(clients, remote.get_preview_jpeg) for _ in range(12)]
+                return await asyncio.gather(*calls)
+            finally:
+                await host.stop()
+
+    results = asyncio.run(scenario())
+
+    assert results[0][0] is True and results[1][0] is True
+    assert all(preview[:2] == b"\xff\xd8" for preview in results[2:])
+    assert camera.overlap == 1
+
+
+def test_default_workers_need_the_shared_cache(monkeypatch):
+    from app import server
+
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setenv("RESPONSE_CACHE_BACKEND", "memory")
+    assert server.default_workers() == 1
+
+    monkeypatch.setenv("RESPONSE_CACHE_BACKEND", "redis")
+    assert server.default_workers() >= 1
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert server.default_workers() == 3
@@ -9,6 +9,8 @@ CREATE TABLE users (
     email VARCHAR(255) UNIQUE NOT NULL,
     hashed_password VARCHAR(255) NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
+    -- Bumped to revoke every token issued so far
+    token_version INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -152,6 +154,8 @@ CREATE TABLE ebay_listings (
     status VARCHAR(50), -- 'draft', 'active', 'sold', 'ended', 'cancelled'
     listed_at TIMESTAMP WITH TIME ZONE,
     ended_at TIMESTAMP WITH TIME ZONE,
+    current_price DECIMAL(10, 2),
+    last_synced_at TIMESTAMP,
     
     -- Sale information
     sold_price DECIMAL(10, 2),
@@ -162,6 +166,99 @@ CREATE TABLE ebay_listings (
     ebay_response JSONB
 );
 
+-- Pointers to each coin's newest analysis and valuation (maintained by triggers below)
+ALTER TABLE coins
+    ADD COLUMN latest_analysis_id UUID,
+    ADD COLUMN latest_valuation_id UUID,
+    ADD CONSTRAINT fk_coins_latest_analysis FOREIGN KEY (latest_analysis_id) REFERENCES ai_analyses(id) ON DELETE SET NULL,
+    ADD CONSTRAINT fk_coins_latest_valuation FOREIGN KEY (latest_valuation_id) REFERENCES valuations(id) ON DELETE SET NULL;
+
+-- Row identity from bulk imports (NULL for coins created one by one)
+ALTER TABLE coins
+    ADD COLUMN import_key VARCHAR(100),
+    ADD CONSTRAINT uq_coins_user_import_key UNIQUE (user_id, import_key);
+
+-- Comparable sales: sold prices from our eBay listings and imported feeds
+CREATE TABLE comparable_sales (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    
+    -- Provenance: 'ebay' for our own sold listings, 'feed:<name>' for imports
+    source VARCHAR(100) NOT NULL,
+    source_ref VARCHAR(255) NOT NULL,
+    title VARCHAR(255),
+    
+    -- Coin as described by the source
+    country VARCHAR(100),
+    denomination VARCHAR(100),
+    mint_mark VARCHAR(20),
+    grade VARCHAR(50),
+    
+    -- Normalized comparison key
+    country_key VARCHAR(100) NOT NULL,
+    denomination_key VARCHAR(100) NOT NULL,
+    year INTEGER NOT NULL,
+    mint_key VARCHAR(20) NOT NULL DEFAULT '',
+    grade_numeric INTEGER, -- Sheldon scale, 1-70
+    grade_bucket INTEGER,
+    
+    -- Sale
+    price DECIMAL(10, 2) NOT NULL,
+    currency VARCHAR(3) DEFAULT 'USD',
+    sold_at TIMESTAMP NOT NULL,
+    
+    CONSTRAINT uq_comparable_sales_source_ref UNIQUE (source, source_ref)
+);
+
+-- Price quantiles per comparison key over a rolling window (grade_bucket 0 = all grades)
+CREATE TABLE comparable_price_index (
+    id SERIAL PRIMARY KEY,
+    country_key VARCHAR(100) NOT NULL,
+    denomination_key VARCHAR(100) NOT NULL,
+    year INTEGER NOT NULL,
+    mint_key VARCHAR(20) NOT NULL,
+    grade_bucket INTEGER NOT NULL,
+    
+    sample_count INTEGER NOT NULL,
+    price_p10 DECIMAL(10, 2),
+    price_p25 DECIMAL(10, 2),
+    price_median DECIMAL(10, 2),
+    price_p75 DECIMAL(10, 2),
+    price_p90 DECIMAL(10, 2),
+    price_mean DECIMAL(10, 2),
+    grade_mean DECIMAL(4, 1), -- average Sheldon grade of the graded samples
+    last_sold_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    CONSTRAINT uq_comparable_price_index_key UNIQUE (country_key, denomination_key, year, mint_key, grade_bucket)
+);
+
+-- Collection revaluation jobs (resumable from checkpoint_coin_id)
+CREATE TABLE revaluation_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- 'pending', 'running', 'completed', 'cancelled', 'failed'
+    error TEXT,
+    use_ai BOOLEAN DEFAULT TRUE,
+    
+    -- Progress; coins are processed in id order and the checkpoint is the last finished id
+    total_coins INTEGER DEFAULT 0,
+    processed_coins INTEGER DEFAULT 0,
+    local_valuations INTEGER DEFAULT 0,
+    ai_valuations INTEGER DEFAULT 0,
+    skipped_coins INTEGER DEFAULT 0,
+    checkpoint_coin_id UUID,
+    
+    -- Gemini spend
+    budget_usd DECIMAL(10, 4) DEFAULT 0,
+    spent_usd DECIMAL(10, 4) DEFAULT 0
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_coins_inventory_number ON coins(inventory_number);
 CREATE INDEX IF NOT EXISTS idx_coins_country ON coins(country);
@@ -169,10 +266,13 @@ CREATE INDEX IF NOT EXISTS idx_coins_year ON coins(year);
 CREATE INDEX IF NOT EXISTS idx_coins_denomination ON coins(denomination);
 CREATE INDEX IF NOT EXISTS idx_coins_condition_grade ON coins(condition_grade);
 CREATE INDEX IF NOT EXISTS idx_coins_user_id ON coins(user_id);
-CREATE INDEX IF NOT EXISTS idx_ai_analyses_coin_id ON ai_analyses(coin_id);
-CREATE INDEX IF NOT EXISTS idx_valuations_coin_id ON valuations(coin_id);
+CREATE INDEX IF NOT EXISTS idx_ai_analyses_coin_id_created_at ON ai_analyses(coin_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_valuations_coin_id_created_at ON valuations(coin_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_ebay_listings_coin_id ON ebay_listings(coin_id);
 CREATE INDEX IF NOT EXISTS idx_ebay_listings_status ON ebay_listings(status);
+CREATE INDEX IF NOT EXISTS idx_ebay_listings_last_synced_at ON ebay_listings(last_synced_at);
+CREATE INDEX IF NOT EXISTS idx_revaluation_jobs_user_id ON revaluation_jobs(user_id);
+CREATE INDEX IF NOT EXISTS idx_comparable_sales_key ON comparable_sales(country_key, denomination_key, year, mint_key, sold_at);
 
 -- Full-text search indexes
 CREATE INDEX IF NOT EXISTS idx_coins_notes_gin ON coins USING gin(to_tsvector('english', notes));
@@ -191,6 +291,65 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
--- Apply trigger to coins table
+-- Apply trigger to coins table (not for the latest_* pointer updates made by the triggers below)
 CREATE TRIGGER update_coins_updated_at BEFORE UPDATE ON coins
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+    FOR EACH ROW WHEN (pg_trigger_depth() < 1) EXECUTE FUNCTION update_updated_at_column();
+
+-- Keep coins.latest_analysis_id / latest_valuation_id pointing at the newest row
+CREATE OR REPLACE FUNCTION set_coin_latest_analysis()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE coins SET latest_analysis_id = (
+            SELECT id FROM ai_analyses
+            WHERE coin_id = OLD.coin_id
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        )
+        WHERE id = OLD.coin_id AND (latest_analysis_id = OLD.id OR latest_analysis_id IS NULL);
+        RETURN OLD;
+    END IF;
+
+    UPDATE coins c SET latest_analysis_id = NEW.id
+    WHERE c.id = NEW.coin_id
+      AND NOT EXISTS (
+          SELECT 1 FROM ai_analyses a
+          WHERE a.id = c.latest_analysis_id
+            AND a.id <> NEW.id
+            AND (a.created_at, a.id) > (NEW.created_at, NEW.id)
+      );
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER set_coin_latest_analysis AFTER INSERT OR DELETE ON ai_analyses
+    FOR EACH ROW EXECUTE FUNCTION set_coin_latest_analysis();
+
+CREATE OR REPLACE FUNCTION set_coin_latest_valuation()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE coins SET latest_valuation_id = (
+            SELECT id FROM valuations
+            WHERE coin_id = OLD.coin_id
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        )
+        WHERE id = OLD.coin_id AND (latest_valuation_id = OLD.id OR latest_valuation_id IS NULL);
+        RETURN OLD;
+    END IF;
+
+    UPDATE coins c SET latest_valuation_id = NEW.id
+    WHERE c.id = NEW.coin_id
+      AND NOT EXISTS (
+          SELECT 1 FROM valuations v
+          WHERE v.id = c.latest_valuation_id
+            AND v.id <> NEW.id
+            AND (v.created_at, v.id) > (NEW.created_at, NEW.id)
+      );
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER set_coin_latest_valuation AFTER INSERT OR DELETE ON valuations
+    FOR EACH ROW EXECUTE FUNCTION set_coin_latest_valuation();
@@ -6,6 +6,7 @@ import App from '../App.jsx';
 vi.mock('../api', () => ({
     coinsAPI: {
         list: vi.fn(() => Promise.resolve({ data: [] })),
+        analytics: vi.fn(() => Promise.resolve({ data: { total_coins: 0, total_value: 0, for_sale: { coins: 0 } } })),
     },
 }));
 
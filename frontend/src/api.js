@@ -12,13 +12,16 @@ const api = axios.create({
 // Coins API
 export const coinsAPI = {
     list: (params) => api.get('/api/coins/', { params }),
+    analytics: (params) => api.get('/api/coins/analytics', { params }),
     get: (id) => api.get(`/api/coins/${id}`),
     create: (data) => api.post('/api/coins/', data),
     update: (id, data) => api.put(`/api/coins/${id}`, data),
     delete: (id) => api.delete(`/api/coins/${id}`),
+    batch: (operations) => api.post('/api/coins/batch', { operations }),
     uploadImage: (id, formData) => api.post(`/api/coins/${id}/images`, formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
     }),
+    attachCapture: (id, data) => api.post(`/api/coins/${id}/images/from-capture`, data),
     stats: (id) => api.get(`/api/coins/${id}/stats`),
 };
 
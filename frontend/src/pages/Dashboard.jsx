@@ -9,12 +9,17 @@ export default function Dashboard() {
         queryFn: () => coinsAPI.list({ limit: 6, sort_by: 'created_at', sort_order: 'desc' }),
     });
 
+    const { data: analytics } = useQuery({
+        queryKey: ['coins', 'analytics'],
+        queryFn: () => coinsAPI.analytics(),
+    });
+
     const recentCoins = coins?.data || [];
 
-    // Calculate stats
-    const totalCoins = recentCoins.length; // This would come from a stats endpoint in production
-    const totalValue = recentCoins.reduce((sum, coin) => sum + (coin.estimated_value || 0), 0);
-    const forSale = recentCoins.filter(c => c.is_for_sale).length;
+    // Collection-wide stats are aggregated by the backend
+    const totalCoins = analytics?.data?.total_coins ?? 0;
+    const totalValue = analytics?.data?.total_value ?? 0;
+    const forSale = analytics?.data?.for_sale?.coins ?? 0;
 
     return (
         <div className="space-y-8">
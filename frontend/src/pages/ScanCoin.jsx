@@ -90,19 +90,17 @@ export default function ScanCoin() {
             const coinResponse = await coinsAPI.create(data);
             const coinId = coinResponse.data.id;
 
-            // Upload image if we have one
+            // Move the capture into the coin on the server (no re-upload)
             if (capturedImage) {
-                const formData = new FormData();
-                const imageResponse = await fetch(`http://localhost:8000/images/${capturedImage.file_path}`);
-                const blob = await imageResponse.blob();
-                formData.append('file', blob, 'coin.jpg');
-                formData.append('image_type', 'obverse');
-                formData.append('is_primary', 'true');
-                await coinsAPI.uploadImage(coinId, formData);
+                const imageResponse = await coinsAPI.attachCapture(coinId, {
+                    file_path: capturedImage.file_path,
+                    image_type: 'obverse',
+                    is_primary: true,
+                });
 
                 // Trigger AI analysis with coin_id
                 await aiAPI.analyze({
-                    image_path: capturedImage.file_path,
+                    image_path: imageResponse.data.file_path,
                     coin_id: coinId,
                 });
             }